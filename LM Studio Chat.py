@@ -2,34 +2,1169 @@ import sys
 import json
 import time
 import os
-import requests
+import html as html_lib
+import itertools
+import threading
+import tempfile
+from array import array
+from collections import deque
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QComboBox, QTextEdit, QPushButton,
                              QLabel, QLineEdit, QSplitter, QFileDialog,
-                             QMessageBox, QTabWidget)
-from PyQt5.QtCore import Qt, QTimer, QObject, QThread, pyqtSignal, pyqtSlot
-from PyQt5.QtGui import QColor, QTextCharFormat, QFont
+                             QMessageBox, QTabWidget, QCheckBox, QSpinBox, QListView,
+                             QAbstractItemView, QStyledItemDelegate, QStyle, QCompleter, QDialog,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QProgressDialog)
+from PyQt5.QtCore import (Qt, QTimer, QObject, QThread, pyqtSignal, pyqtSlot, QAbstractListModel,
+                          QModelIndex, QSize, QRectF, QStringListModel)
+from PyQt5.QtGui import QColor, QTextCharFormat, QFont, QTextDocument, QKeySequence
+from chat_core import (ContextWindow, PayloadBuilder, TurnScheduler, ResponseCache, SessionJournal,
+                       FigureDictionary, FigureSearchIndex, RequestMetrics, BackendPool, RequestPolicy, FairQueue,
+                       MessageStore, ConversationMemory, DEFAULT_CATEGORIES, INTRO_PROMPT, new_dual_histories,
+                       commit_dual_turn, summary_payload, summary_chunk_tokens, summary_due, open_session,
+                       normalize_base_url)
+from chat_export import (ExportCancelled, FILE_FILTERS, EXTENSIONS, export_transcripts, export_prompts,
+                         format_for)
 
-# Worker thread for API calls to prevent UI freezing
+# Server used until others are configured, and how often and how patiently backends are probed
+DEFAULT_SERVER_URL = "http://localhost:1234/v1"
+HEALTH_CHECK_INTERVAL_MS = 10000
+HEALTH_CHECK_TIMEOUT = 3
+
+# Model warm-up: a one-token request that makes the server load a model before the first real turn.
+# With keep-alive on, models are pinged again after this long without traffic, inside the common
+# idle-unload windows (Ollama unloads after 5 minutes by default).
+WARM_UP_TIMEOUT = 600
+KEEP_ALIVE_IDLE_S = 240
+
+# Long-term memory: turns embedded per request, and how much of a recalled turn is sent
+EMBED_BATCH_SIZE = 32
+RECALL_MAX_CHARS = 1000
+
+# Queue priorities: conversations first, then background summaries, then speculative introductions
+PRIORITY_CHAT = 0
+PRIORITY_SUMMARY = 1
+PRIORITY_PREFETCH = 2
+
+# First entry of the Dual Chat model pickers: the speaker uses the model picked in the settings row
+SAME_AS_CHAT_MODEL = "Same as chat model"
+
+# How often queued and running requests are checked against their deadlines, and running ones for hedging
+DEADLINE_CHECK_MS = 250
+HEDGE_CHECK_MS = 100
+# Recent chat latencies the hedge delay is taken from
+HEDGE_SAMPLES = 200
+
+# Minimum interval between partial-token signals so the GUI thread isn't flooded
+STREAM_EMIT_INTERVAL = 0.05
+
+# Introduction pre-generation: how often to check for an idle executor, and how many to keep ready
+PREFETCH_INTERVAL_MS = 1000
+PREFETCH_LIMIT = 30
+
+# Combo boxes are filled this many items per event loop pass
+COMBO_CHUNK_SIZE = 2000
+
+# Figure search: results shown per query, and figures indexed per event loop pass
+SEARCH_RESULT_LIMIT = 20
+SEARCH_BUILD_CHUNK = 2000
+
+# How often pending journal writes are checked for a batched fsync
+JOURNAL_SYNC_CHECK_MS = 1000
+
+# Quiet time after which evicted turns are summarized even if there are too few for a batch
+SUMMARY_IDLE_MS = 15000
+
+# Transcript views: rows kept laid out, rows paged in per scroll step, and the append batching window.
+# Only the newest rows stay in memory; older ones move to a scrollback file and are read back on scroll.
+TRANSCRIPT_MAX_ROWS = 500
+TRANSCRIPT_PAGE_SIZE = 100
+TRANSCRIPT_MEMORY_ROWS = 1000
+TRANSCRIPT_FRAME_MS = 16
+
+# Long-lived worker for API calls; each one owns a keep-alive HTTP session
 class ApiWorker(QObject):
-    finished = pyqtSignal(dict)
-    error = pyqtSignal(str)
+    finished = pyqtSignal(int, object)
+    error = pyqtSignal(int, str)
+    partial = pyqtSignal(int, str)
+    # Worker-side timings of a request, emitted just before finished or error
+    measured = pyqtSignal(int, object)
+    job_ready = pyqtSignal(int, str, object, bool)
     
-    def __init__(self, url, payload):
+    def __init__(self, policy=None):
         super().__init__()
-        self.url = url
-        self.payload = payload
+        self.policy = policy or RequestPolicy()
+        self.session = None
+        self.started = 0.0
+        self.first_token = None
+        self.job_id = None
+        self.aborted = None
+        self.thread_ident = None
+        self.job_ready.connect(self.run)
         
-    @pyqtSlot()
-    def run(self):
+    @pyqtSlot(int, str, object, bool)
+    def run(self, job_id, url, payload, stream):
+        # Imported here rather than at startup: the first request pays for loading requests, not the window
+        import chat_client
+        # The session is created lazily so it belongs to the worker's thread
+        if self.session is None:
+            self.session = chat_client.new_session()
+        self.thread_ident = threading.get_ident()
+        self.job_id = job_id
+        self.started = time.monotonic()
+        self.first_token = None
+        chat_client.connection_timing.seconds = 0.0
         try:
-            response = requests.post(self.url, json=self.payload)
+            if self.aborted == job_id:
+                raise ConnectionAbortedError("Request cancelled")
+            if stream:
+                self._run_streaming(job_id, url, payload)
+                return
+            response = chat_client.post(self.session, url, payload, timeout=self.policy.timeout)
             if response.status_code == 200:
-                self.finished.emit(response.json())
+                self._finish(job_id, response.json())
             else:
-                self.error.emit(f"Error: {response.status_code} - {response.text}")
+                self._fail(job_id, f"Error: {response.status_code} - {response.text}",
+                           chat_client.retriable(response.status_code))
         except Exception as e:
-            self.error.emit(f"Request failed: {str(e)}")
+            self._fail(job_id, f"Request failed: {str(e)}", True)
+        finally:
+            self.job_id = None
+            chat_client.release_connection()
+
+    def abort(self, job_id):
+        # Called from the GUI thread; a running job's connection is closed under it
+        self.aborted = job_id
+        if self.job_id == job_id:
+            import chat_client
+            chat_client.abort_connection(self.thread_ident)
+
+    def _measure(self, job_id, status, retriable=False):
+        import chat_client
+        self.measured.emit(job_id, {"status": status, "retriable": retriable,
+                                    "connect": chat_client.connection_timing.seconds,
+                                    "ttft": self.first_token - self.started if self.first_token else None,
+                                    "total": time.monotonic() - self.started})
+
+    def _finish(self, job_id, result):
+        self._measure(job_id, "ok")
+        self.finished.emit(job_id, result)
+
+    def _fail(self, job_id, message, retriable=False):
+        self._measure(job_id, "error", retriable)
+        self.error.emit(job_id, message)
+
+    def _run_streaming(self, job_id, url, payload):
+        import chat_client
+        with chat_client.post(self.session, url, payload, stream=True, timeout=self.policy.timeout) as response:
+            if response.status_code != 200:
+                self._fail(job_id, f"Error: {response.status_code} - {response.text}",
+                           chat_client.retriable(response.status_code))
+                return
+
+            accumulator = chat_client.StreamAccumulator()
+            pending = []
+            last_emit = time.monotonic()
+            for chunk in chat_client.iter_chunks(response):
+                if self.aborted == job_id:
+                    raise ConnectionAbortedError("Request cancelled")
+                token = accumulator.feed(chunk)
+                if not token:
+                    continue
+                if self.first_token is None:
+                    self.first_token = time.monotonic()
+                pending.append(token)
+
+                # Coalesce tokens into one signal per interval
+                now = time.monotonic()
+                if now - last_emit >= STREAM_EMIT_INTERVAL:
+                    self.partial.emit(job_id, "".join(pending))
+                    pending = []
+                    last_emit = now
+
+            if pending:
+                self.partial.emit(job_id, "".join(pending))
+
+        self._finish(job_id, accumulator.result())
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+# Probes each backend's /v1/models endpoint on its own thread; the listed model ids come back with the result
+class HealthChecker(QObject):
+    check = pyqtSignal(list)
+    checked = pyqtSignal(str, bool, str, list)
+
+    def __init__(self):
+        super().__init__()
+        self.session = None
+        self.check.connect(self.run)
+
+    @pyqtSlot(list)
+    def run(self, backends):
+        import chat_client
+        if self.session is None:
+            self.session = chat_client.new_session(timed=False)
+        for base_url, models_url in backends:
+            self.checked.emit(base_url, *chat_client.probe_models(self.session, models_url, HEALTH_CHECK_TIMEOUT))
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+# Sends warm-up requests on its own thread, so a model that takes a minute to load holds up neither
+# the workers nor the health probes
+class ModelWarmer(QObject):
+    warm = pyqtSignal(list)
+    # Backend, model, seconds the request took and an error message (empty on success)
+    warmed = pyqtSignal(str, str, float, str)
+
+    def __init__(self):
+        super().__init__()
+        self.session = None
+        self.stopped = False
+        self.thread_ident = None
+        self.warm.connect(self.run)
+
+    @pyqtSlot(list)
+    def run(self, targets):
+        import chat_client
+        if self.session is None:
+            # Timed connections register themselves, so stop() can abort a long model load
+            self.session = chat_client.new_session()
+        self.thread_ident = threading.get_ident()
+        for base_url, chat_url, model in targets:
+            if self.stopped:
+                return
+            started = time.monotonic()
+            error = chat_client.warm_up(self.session, chat_url, model, WARM_UP_TIMEOUT)
+            self.warmed.emit(base_url, model, time.monotonic() - started, error)
+
+    def stop(self):
+        # Called from the GUI thread
+        self.stopped = True
+        if self.thread_ident is not None:
+            import chat_client
+            chat_client.abort_connection(self.thread_ident)
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+# Runs one export on its own thread. export(on_progress, should_stop) does the work, streaming from
+# files on disk, and returns the number of items written; the GUI only hears about progress.
+class ExportWorker(QObject):
+    start = pyqtSignal()
+    progress = pyqtSignal(int, int, int)
+    finished = pyqtSignal(int)
+    # Error message, empty when the export was cancelled
+    failed = pyqtSignal(str)
+
+    def __init__(self, export):
+        super().__init__()
+        self.export = export
+        self.cancelled = False
+        self.start.connect(self.run)
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            self.finished.emit(self.export(self.progress.emit, lambda: self.cancelled))
+        except ExportCancelled:
+            self.failed.emit("")
+        except Exception as e:
+            self.failed.emit(str(e))
+
+# Fixed-size pool of ApiWorker threads that both tabs submit jobs to
+class RequestExecutor(QObject):
+    queue_changed = pyqtSignal(int, int)
+    cache_changed = pyqtSignal()
+    # One RequestMetrics sample per completed request
+    request_measured = pyqtSignal(object)
+    backends_changed = pyqtSignal()
+    # Emitted when the set of models listed by the backends changes, and after each warm-up
+    models_changed = pyqtSignal()
+    model_warmed = pyqtSignal(str, str, float, str)
+
+    def __init__(self, max_workers=2, max_queue=32, urls=(DEFAULT_SERVER_URL,)):
+        super().__init__()
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.workers = {}
+        self.idle = []
+        self.active = {}
+        # Queued jobs by priority, taking turns across conversations; job_flows remembers each job's place
+        self.pending = FairQueue()
+        self.job_flows = {}
+        self.callbacks = {}
+        self.job_ids = itertools.count(1)
+        # Optional ResponseCache consulted before any request reaches a worker
+        self.cache = None
+        self.cache_reads = True
+        self.cache_keys = {}
+        # Per-job timing: submit and dispatch times, worker timings and time spent in callbacks
+        self.metrics = RequestMetrics()
+        self.timings = {}
+        # Backends each job is routed to; jobs remember their request so they can be retried
+        self.backends = BackendPool(urls)
+        self.jobs = {}
+        self.job_backends = {}
+        self.streamed = set()
+        self.health_thread = None
+        self.health_checker = None
+        self.health_timer = QTimer(self)
+        self.health_timer.timeout.connect(self.check_health)
+        self.health_timer.start(HEALTH_CHECK_INTERVAL_MS)
+        # Cancellation: jobs tagged with a group can be cancelled together; expired deadlines cancel a job
+        self.groups = {}
+        self.deadlines = {}
+        self.cancelled = set()
+        self.deadline_timer = QTimer(self)
+        self.deadline_timer.timeout.connect(self._check_deadlines)
+        # Timeouts, retries and hedging. Failed attempts are counted per job and the backends a
+        # job has tried are avoided on retry; jobs backing off sit in waiting until requeued.
+        self.policy = RequestPolicy()
+        self.attempts = {}
+        self.tried = {}
+        self.waiting = set()
+        # A hedge is a duplicate attempt with its own job id; partners maps each to the other.
+        # Hedges are timed against chat requests only: embeddings and summaries are much quicker.
+        self.partners = {}
+        self.chat_latency = {"ttft": deque(maxlen=HEDGE_SAMPLES), "total": deque(maxlen=HEDGE_SAMPLES)}
+        self.hedge_timer = QTimer(self)
+        self.hedge_timer.timeout.connect(self._check_hedges)
+        # Warm-up and keep-alive of the models in use; idle time is measured from the last request
+        self.warm_thread = None
+        self.model_warmer = None
+        self.warm_models = []
+        self.keep_alive = False
+        self.last_activity = time.monotonic()
+        self.last_warm = 0.0
+
+    def set_backends(self, urls):
+        # In-flight jobs keep their old backend; only new dispatches use the new pool
+        self.backends = BackendPool(urls)
+        self.job_backends = {}
+        self.tried = {}
+        self.backends_changed.emit()
+        self.check_health()
+
+    def set_hedging(self, enabled):
+        self.policy.hedge = enabled
+        if not enabled:
+            self.hedge_timer.stop()
+
+    def check_health(self):
+        self._keep_alive()
+        if self.health_checker is None:
+            self.health_thread = QThread()
+            self.health_checker = HealthChecker()
+            self.health_checker.moveToThread(self.health_thread)
+            self.health_checker.checked.connect(self._on_health_checked)
+            self.health_thread.start()
+        self.health_checker.check.emit([(backend.base_url, backend.models_url) for backend in self.backends])
+
+    @pyqtSlot(str, bool, str, list)
+    def _on_health_checked(self, base_url, ok, error, models):
+        known = self.backends.models()
+        # A failed probe says nothing about which models are installed
+        self.backends.mark_health(base_url, ok, error, models if ok else None)
+        self.backends_changed.emit()
+        if self.backends.models() != known:
+            self.models_changed.emit()
+        if ok:
+            self._dispatch()
+
+    def warm_up(self, models):
+        # One tiny request per model on every backend that is up and lists it
+        if self.model_warmer is None:
+            self.warm_thread = QThread()
+            self.model_warmer = ModelWarmer()
+            self.model_warmer.moveToThread(self.warm_thread)
+            self.model_warmer.warmed.connect(self.model_warmed)
+            self.warm_thread.start()
+        # Backends not probed yet are skipped rather than asked to load a model they may not have
+        targets = [(backend.base_url, backend.chat_url, model) for backend in self.backends
+                   if backend.state != "open" and backend.models
+                   for model in dict.fromkeys(models) if backend.serves(model)]
+        self.last_warm = time.monotonic()
+        if targets:
+            self.model_warmer.warm.emit(targets)
+        return len(targets)
+
+    def set_keep_alive(self, enabled):
+        self.keep_alive = enabled
+
+    def _keep_alive(self):
+        # Pings only while idle: real traffic keeps the models loaded on its own
+        if not self.keep_alive or not self.warm_models or self.pending or self.active:
+            return
+        now = time.monotonic()
+        if now - self.last_activity >= KEEP_ALIVE_IDLE_S and now - self.last_warm >= KEEP_ALIVE_IDLE_S:
+            self.warm_up(self.warm_models)
+
+    def submit(self, payload, stream=False, on_finished=None, on_error=None, on_partial=None,
+               cache_key=None, pin=None, group=None, deadline=None, model=None, priority=0,
+               endpoint="chat/completions"):
+        use_cache = self.cache is not None and cache_key is not None
+        if use_cache and self.cache_reads:
+            cached = self.cache.get(cache_key)
+            self.cache_changed.emit()
+            if cached is not None:
+                # Deliver on the next event loop pass, like a real response
+                cached["from_cache"] = True
+                if on_finished:
+                    QTimer.singleShot(0, lambda: on_finished(cached))
+                return next(self.job_ids)
+
+        if self.queue_full():
+            return None
+
+        job_id = next(self.job_ids)
+        self.callbacks[job_id] = (on_finished, on_error, on_partial)
+        self.timings[job_id] = {"submitted": time.monotonic(), "stream": stream, "render": 0.0,
+                                "chat": endpoint == "chat/completions" and priority != PRIORITY_SUMMARY}
+        if use_cache:
+            self.cache_keys[job_id] = cache_key
+        self.jobs[job_id] = (payload, stream, pin, model, endpoint)
+        self.last_activity = time.monotonic()
+        if group is not None:
+            self.groups[job_id] = group
+        if deadline:
+            # Covers time spent queued as well as running
+            self.deadlines[job_id] = (time.monotonic() + deadline, deadline)
+            if not self.deadline_timer.isActive():
+                self.deadline_timer.start(DEADLINE_CHECK_MS)
+        # Jobs of one group (a conversation) share a turn in the queue
+        self.job_flows[job_id] = (group, priority)
+        self.pending.push(job_id, group, priority)
+        self._dispatch()
+        return job_id
+
+    def queue_full(self):
+        return len(self.pending) >= self.max_queue
+
+    def cancel(self, job_id, reason=None):
+        # Drops the job's callbacks at once; a running request has its connection closed.
+        # With a reason, the job's error callback is told why.
+        callbacks = self.callbacks.pop(job_id, None)
+        if callbacks is None:
+            return False
+        self.cache_keys.pop(job_id, None)
+        self.groups.pop(job_id, None)
+        self.deadlines.pop(job_id, None)
+        partner = self.partners.pop(job_id, None)
+        if partner is not None:
+            self.partners.pop(partner, None)
+            self._abort(partner)
+        self._abort(job_id)
+        if reason and callbacks[1]:
+            callbacks[1](reason)
+        return True
+
+    def cancel_group(self, group):
+        for job_id in [job_id for job_id, job_group in self.groups.items() if job_group == group]:
+            self.cancel(job_id)
+
+    def _abort(self, job_id):
+        if job_id in self.active:
+            self.cancelled.add(job_id)
+            self.active[job_id].abort(job_id)
+            return
+        if job_id in self.pending:
+            self.pending.remove(job_id)
+            self.queue_changed.emit(len(self.pending), len(self.active))
+        self.waiting.discard(job_id)
+        self._forget(job_id)
+        self.timings.pop(job_id, None)
+
+    def _forget(self, job_id):
+        self.jobs.pop(job_id, None)
+        self.job_flows.pop(job_id, None)
+        self.streamed.discard(job_id)
+        self.groups.pop(job_id, None)
+        self.deadlines.pop(job_id, None)
+        self.attempts.pop(job_id, None)
+        self.tried.pop(job_id, None)
+
+    def _check_deadlines(self):
+        now = time.monotonic()
+        for job_id, (expires, seconds) in list(self.deadlines.items()):
+            if now >= expires:
+                self.cancel(job_id, f"Request timed out after {seconds:g} seconds.")
+        if not self.deadlines:
+            self.deadline_timer.stop()
+
+    def set_max_workers(self, count):
+        self.max_workers = count
+        # Shrink by retiring idle workers; busy ones retire when they finish
+        while self.idle and len(self.workers) > self.max_workers:
+            self._retire(self.idle.pop())
+        self._dispatch()
+
+    def set_max_queue(self, depth):
+        self.max_queue = depth
+
+    def _dispatch(self):
+        while self.pending and (self.idle or len(self.workers) < self.max_workers):
+            self._start(self.pending.pop())
+        self.queue_changed.emit(len(self.pending), len(self.active))
+        if self.policy.hedge and self.active and not self.hedge_timer.isActive():
+            self.hedge_timer.start(HEDGE_CHECK_MS)
+
+    def _start(self, job_id, exclude=()):
+        worker = self.idle.pop() if self.idle else self._spawn_worker()
+        payload, stream, pin, model, endpoint = self.jobs[job_id]
+        tried = self.tried.get(job_id, set())
+        # Retries avoid backends this job already failed on, unless it has tried them all
+        avoid = set(exclude) | (tried if len(tried) < len(self.backends) else set())
+        timing = self.timings[job_id]
+        # A hedge leaves the conversation's pin alone; it is moved only if the hedge wins
+        backend = self.backends.acquire(None if timing.get("hedge") else pin, avoid, model)
+        self.job_backends[job_id] = backend
+        self.active[job_id] = worker
+        timing["dispatched"] = time.monotonic()
+        timing["queue_wait"] = timing["dispatched"] - timing.pop("submitted")
+        timing["backend"] = backend.base_url
+        worker.job_ready.emit(job_id, backend.url(endpoint), payload, stream)
+        self.backends_changed.emit()
+
+    def _spawn_worker(self):
+        thread = QThread()
+        worker = ApiWorker(self.policy)
+        worker.moveToThread(thread)
+        worker.finished.connect(self._on_finished)
+        worker.error.connect(self._on_error)
+        worker.partial.connect(self._on_partial)
+        worker.measured.connect(self._on_measured)
+        self.workers[worker] = thread
+        thread.start()
+        return worker
+
+    def _retire(self, worker):
+        thread = self.workers.pop(worker)
+        thread.quit()
+        thread.wait()
+        worker.close()
+
+    def _release_backend(self, job_id):
+        backend = self.job_backends.pop(job_id, None)
+        if backend is not None:
+            timing = self.timings.get(job_id, {})
+            if timing.get("status") == "ok":
+                self.backends.release(backend, True, timing.get("total"))
+            elif timing.get("status") == "error":
+                self.backends.release(backend, False, error=timing.get("error", ""))
+            else:
+                # Cancelled requests say nothing about the backend's health
+                self.backends.release(backend)
+            self.backends_changed.emit()
+        return backend
+
+    def _release_worker(self, job_id):
+        worker = self.active.pop(job_id, None)
+        if worker is not None:
+            if len(self.workers) > self.max_workers:
+                self._retire(worker)
+            else:
+                self.idle.append(worker)
+
+    def _release(self, job_id):
+        self.last_activity = time.monotonic()
+        self._release_backend(job_id)
+        self._forget(job_id)
+        self._release_worker(job_id)
+        self._dispatch()
+        return self.callbacks.pop(job_id, (None, None, None))
+
+    def _timed_callback(self, job_id, callback, value):
+        # Time spent in callbacks is the cost of rendering the reply into the display
+        started = time.monotonic()
+        callback(value)
+        timing = self.timings.get(job_id)
+        if timing is not None:
+            timing["render"] += time.monotonic() - started
+
+    def _record_metrics(self, job_id, result=None):
+        timing = self.timings.pop(job_id, None)
+        if timing is None or "status" not in timing:
+            return
+        timing.pop("submitted", None)
+        timing.pop("dispatched", None)
+        usage = (result or {}).get("usage") or {}
+        timing["prompt_tokens"] = usage.get("prompt_tokens")
+        timing["completion_tokens"] = usage.get("completion_tokens")
+        if timing.get("chat") and timing["status"] == "ok":
+            for field, samples in self.chat_latency.items():
+                if timing.get(field) is not None:
+                    samples.append(timing[field])
+        self.request_measured.emit(self.metrics.record(timing))
+
+    def _claim(self, job_id):
+        # The first attempt of a hedged pair to produce output wins; the other is aborted
+        partner = self.partners.pop(job_id, None)
+        if partner is None:
+            return
+        self.partners.pop(partner, None)
+        if partner in self.callbacks:
+            self._adopt(job_id, partner)
+        self._abort(partner)
+
+    def _adopt(self, job_id, original):
+        # Moves the logical job (callbacks, cache key, group, deadline) from one attempt to another
+        self.callbacks[job_id] = self.callbacks.pop(original)
+        for mapping in (self.cache_keys, self.groups, self.deadlines, self.job_flows):
+            if original in mapping:
+                mapping[job_id] = mapping.pop(original)
+        # A winning hedge takes over the conversation's pin
+        pin = self.jobs[job_id][2]
+        if self.timings[job_id].get("hedge") and pin is not None and job_id in self.job_backends:
+            self.backends.pin(pin, self.job_backends[job_id])
+
+    def _check_hedges(self):
+        # Duplicate a request on another backend once it has gone without output for longer
+        # than the recent p95; only when nothing is queued and a worker is free
+        if not self.policy.hedge or not self.active:
+            self.hedge_timer.stop()
+            return
+        if self.pending or not (self.idle or len(self.workers) < self.max_workers):
+            return
+        now = time.monotonic()
+        for job_id in list(self.active):
+            if job_id in self.partners or job_id in self.streamed or job_id in self.cancelled:
+                continue
+            if job_id not in self.callbacks:
+                continue
+            backend = self.job_backends.get(job_id)
+            if not any(b.healthy and b is not backend for b in self.backends):
+                continue
+            timing = self.timings[job_id]
+            delay = self.policy.hedge_delay(self.chat_latency["ttft" if timing["stream"] else "total"])
+            if delay is None or now - timing["dispatched"] < delay:
+                continue
+            hedge_id = next(self.job_ids)
+            self.jobs[hedge_id] = self.jobs[job_id]
+            self.timings[hedge_id] = {"submitted": now, "stream": timing["stream"], "render": 0.0,
+                                      "chat": timing.get("chat"), "hedge": True}
+            self.partners[job_id] = hedge_id
+            self.partners[hedge_id] = job_id
+            self._start(hedge_id, exclude={backend})
+            return
+
+    def _should_retry(self, job_id):
+        # Only retriable failures, before any tokens reached the display, within the retry budget
+        timing = self.timings.get(job_id, {})
+        return (timing.get("retriable") and job_id not in self.streamed and job_id in self.callbacks
+                and self.attempts.get(job_id, 0) < self.policy.max_retries)
+
+    def _retry(self, job_id):
+        chat = self.timings.get(job_id, {}).get("chat")
+        backend = self._release_backend(job_id)
+        self._record_metrics(job_id)
+        self._release_worker(job_id)
+        attempt = self.attempts.get(job_id, 0)
+        self.attempts[job_id] = attempt + 1
+        if backend is not None:
+            self.tried.setdefault(job_id, set()).add(backend)
+        # The failed attempt is recorded on its own; the retry gets fresh timings
+        self.timings[job_id] = {"submitted": time.monotonic(), "stream": self.jobs[job_id][1], "render": 0.0,
+                                "chat": chat}
+        # Another healthy backend is tried at once; the same one only after a backoff
+        if any(b.healthy and b not in self.tried.get(job_id, ()) for b in self.backends):
+            self.pending.push(job_id, *self.job_flows.get(job_id, (None, 0)), front=True)
+        else:
+            self.waiting.add(job_id)
+            QTimer.singleShot(int(self.policy.backoff(attempt) * 1000), lambda: self._requeue(job_id))
+        self._dispatch()
+
+    def _requeue(self, job_id):
+        if job_id in self.waiting:
+            self.waiting.discard(job_id)
+            self.pending.push(job_id, *self.job_flows.get(job_id, (None, 0)), front=True)
+            self._dispatch()
+
+    def _finish_cancelled(self, job_id):
+        # The worker has come back from a cancelled job; only the worker and backend need releasing
+        self.cancelled.discard(job_id)
+        timing = self.timings.get(job_id)
+        if timing is not None:
+            timing["status"] = "cancelled"
+            timing["error"] = ""
+        self._release(job_id)
+        self._record_metrics(job_id)
+
+    @pyqtSlot(int, object)
+    def _on_measured(self, job_id, measurement):
+        timing = self.timings.get(job_id)
+        if timing is not None:
+            timing.update(measurement)
+
+    @pyqtSlot(int, object)
+    def _on_finished(self, job_id, result):
+        if job_id in self.cancelled:
+            self._finish_cancelled(job_id)
+            return
+        self._claim(job_id)
+        cache_key = self.cache_keys.pop(job_id, None)
+        if cache_key is not None and self.cache is not None:
+            self.cache.put(cache_key, result)
+            self.cache_changed.emit()
+        on_finished, _, _ = self._release(job_id)
+        if on_finished:
+            self._timed_callback(job_id, on_finished, result)
+        self._record_metrics(job_id, result)
+
+    @pyqtSlot(int, str)
+    def _on_error(self, job_id, message):
+        if job_id in self.cancelled:
+            self._finish_cancelled(job_id)
+            return
+        timing = self.timings.get(job_id)
+        if timing is not None:
+            timing["error"] = message
+        partner = self.partners.pop(job_id, None)
+        if partner is not None:
+            # The other attempt of a hedged pair carries on alone
+            self.partners.pop(partner, None)
+            if job_id in self.callbacks:
+                self._adopt(partner, job_id)
+            self._release(job_id)
+            self._record_metrics(job_id)
+            return
+        if self._should_retry(job_id):
+            self._retry(job_id)
+            return
+        self.cache_keys.pop(job_id, None)
+        _, on_error, _ = self._release(job_id)
+        if on_error:
+            self._timed_callback(job_id, on_error, message)
+        self._record_metrics(job_id)
+
+    @pyqtSlot(int, str)
+    def _on_partial(self, job_id, text):
+        if job_id in self.cancelled:
+            return
+        if job_id not in self.streamed:
+            self.streamed.add(job_id)
+            self._claim(job_id)
+        callbacks = self.callbacks.get(job_id)
+        if callbacks and callbacks[2]:
+            self._timed_callback(job_id, callbacks[2], text)
+
+    def shutdown(self):
+        self.pending.clear()
+        self.callbacks.clear()
+        self.cache_keys.clear()
+        self.timings.clear()
+        self.jobs.clear()
+        self.job_flows.clear()
+        self.job_backends.clear()
+        self.streamed.clear()
+        self.groups.clear()
+        self.deadlines.clear()
+        self.waiting.clear()
+        self.partners.clear()
+        self.health_timer.stop()
+        self.deadline_timer.stop()
+        self.hedge_timer.stop()
+        # Close running requests so retiring their threads doesn't wait for the server
+        for job_id, worker in self.active.items():
+            worker.abort(job_id)
+        if self.health_checker is not None:
+            self.health_thread.quit()
+            self.health_thread.wait()
+            self.health_checker.close()
+            self.health_checker = None
+        if self.model_warmer is not None:
+            self.model_warmer.stop()
+            self.warm_thread.quit()
+            self.warm_thread.wait()
+            self.model_warmer.close()
+            self.model_warmer = None
+        for worker in list(self.workers):
+            self._retire(worker)
+        self.idle = []
+        self.active = {}
+
+# Message list backing TranscriptView; rows are a window [start, end) over the view's rows
+class TranscriptModel(QAbstractListModel):
+    def __init__(self, row):
+        super().__init__()
+        self.row = row
+        self.start = 0
+        self.end = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.end - self.start
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self.row(self.start + index.row())
+        return None
+
+# Renders each entry as rich text and remembers its laid-out height per width
+class TranscriptDelegate(QStyledItemDelegate):
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self.heights = {}
+        self.document = QTextDocument()
+        self.document.setDocumentMargin(4)
+
+    def _layout(self, html, font, width):
+        self.document.setDefaultFont(font)
+        self.document.setHtml(html)
+        self.document.setTextWidth(width)
+        return self.document
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        document = self._layout(index.data(), option.font, option.rect.width())
+        painter.translate(option.rect.topLeft())
+        document.drawContents(painter, QRectF(0, 0, option.rect.width(), option.rect.height()))
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        width = max(self.view.viewport().width(), 100)
+        key = self.view.model.start + index.row()
+        height = self.heights.get(key)
+        if height is None:
+            height = int(self._layout(index.data(), option.font, width).size().height())
+            self.heights[key] = height
+        return QSize(width, height)
+
+    def forget(self, first, last):
+        for key in range(first, last):
+            self.heights.pop(key, None)
+
+# Transcript display that only lays out a bounded window of messages. Appends
+# arriving within one frame are inserted together, older messages beyond the
+# window are dropped from the model and paged back in when scrolled to.
+# Only the newest memory_rows entries are held in memory; older ones are spilled
+# to a scrollback file and read back a page at a time.
+class TranscriptView(QListView):
+    def __init__(self, max_rows=TRANSCRIPT_MAX_ROWS, page_size=TRANSCRIPT_PAGE_SIZE,
+                 memory_rows=TRANSCRIPT_MEMORY_ROWS):
+        super().__init__()
+        self.max_rows = max_rows
+        self.page_size = page_size
+        self.memory_rows = memory_rows
+        # entries[0] is row `first`; rows before it live in the scrollback file
+        self.entries = []
+        self.first = 0
+        # Spilled rows currently inside the model window, read back from the scrollback file
+        self.paged = {}
+        self.scrollback = None
+        self.offsets = array('q')
+        self.model = TranscriptModel(self.row)
+        self.delegate = TranscriptDelegate(self)
+        self.dirty_last = False
+        # Whether new entries should keep the view pinned to the bottom
+        self.following = True
+        self.user_scrolling = False
+        self.setModel(self.model)
+        self.setItemDelegate(self.delegate)
+        self.setWordWrap(True)
+        self.setUniformItemSizes(False)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(50)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.Adjust)
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(TRANSCRIPT_FRAME_MS)
+        self.flush_timer.timeout.connect(self.flush)
+        self.verticalScrollBar().actionTriggered.connect(self._user_scrolled)
+        self.verticalScrollBar().valueChanged.connect(self._page_on_scroll)
+
+    def append(self, html):
+        self.entries.append(html)
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def append_text(self, text):
+        self.append(html_lib.escape(text).replace("\n", "<br>"))
+
+    def append_to_last(self, text):
+        # Streamed tokens extend the newest entry in place
+        if not self.entries:
+            self.append_text(text)
+            return
+        self.entries[-1] += html_lib.escape(text).replace("\n", "<br>")
+        self.delegate.forget(self.count() - 1, self.count())
+        self.dirty_last = True
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def clear(self):
+        self.flush_timer.stop()
+        self.model.beginResetModel()
+        self.entries.clear()
+        self.first = 0
+        self.paged.clear()
+        self.offsets = array('q')
+        if self.scrollback is not None:
+            self.scrollback.close()
+            self.scrollback = None
+        self.model.start = self.model.end = 0
+        self.model.endResetModel()
+        self.delegate.heights.clear()
+        self.dirty_last = False
+        self.following = True
+
+    def count(self):
+        return self.first + len(self.entries)
+
+    def row(self, number):
+        if number >= self.first:
+            return self.entries[number - self.first]
+        return self.paged[number]
+
+    def _spill(self):
+        # Move the oldest in-memory entries to the scrollback file, a page at a time
+        excess = len(self.entries) - self.memory_rows
+        if excess < self.page_size:
+            return
+        if self.scrollback is None:
+            self.scrollback = tempfile.TemporaryFile()
+        self.scrollback.seek(0, os.SEEK_END)
+        model = self.model
+        for number, entry in enumerate(self.entries[:excess], self.first):
+            if model.start <= number < model.end:
+                self.paged[number] = entry
+            data = entry.encode('utf-8')
+            self.offsets.append(self.scrollback.tell())
+            self.scrollback.write(data)
+        del self.entries[:excess]
+        self.first += excess
+
+    def _read_spilled(self, first, last):
+        # Spilled rows [first, last) in one read; each row runs to the next one's offset
+        last = min(last, self.first)
+        if first >= last:
+            return []
+        self.scrollback.seek(self.offsets[first])
+        end = self.offsets[last] if last < len(self.offsets) else None
+        data = self.scrollback.read() if end is None else self.scrollback.read(end - self.offsets[first])
+        bounds = [offset - self.offsets[first] for offset in self.offsets[first:last]] + [len(data)]
+        return [data[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(last - first)]
+
+    def _page_in(self, first, last):
+        for number, entry in enumerate(self._read_spilled(first, last), first):
+            self.paged[number] = entry
+
+    def _forget_paged(self, first, last):
+        for number in range(first, min(last, self.first)):
+            self.paged.pop(number, None)
+
+    def toPlainText(self):
+        document = QTextDocument()
+        lines = []
+        for first in range(0, self.first, self.page_size):
+            for entry in self._read_spilled(first, first + self.page_size):
+                document.setHtml(entry)
+                lines.append(document.toPlainText())
+        for entry in self.entries:
+            document.setHtml(entry)
+            lines.append(document.toPlainText())
+        return "\n".join(lines)
+
+    def at_bottom(self):
+        scroll_bar = self.verticalScrollBar()
+        return scroll_bar.value() >= scroll_bar.maximum() - 4
+
+    def flush(self):
+        model = self.model
+        follow = self.following
+        # Only grow the window at the tail if it is already showing the tail
+        if model.end < self.count() and (follow or model.end - model.start < self.max_rows):
+            model.beginInsertRows(QModelIndex(), model.end - model.start, self.count() - model.start - 1)
+            model.end = self.count()
+            model.endInsertRows()
+            self._trim_head()
+        self._spill()
+        if self.dirty_last and model.end == self.count() and model.end > model.start:
+            index = model.index(model.end - model.start - 1)
+            model.dataChanged.emit(index, index)
+            self.scheduleDelayedItemsLayout()
+        self.dirty_last = False
+        if follow:
+            self.scrollToBottom()
+
+    def _trim_head(self):
+        model = self.model
+        excess = (model.end - model.start) - self.max_rows
+        if excess > 0:
+            model.beginRemoveRows(QModelIndex(), 0, excess - 1)
+            self.delegate.forget(model.start, model.start + excess)
+            self._forget_paged(model.start, model.start + excess)
+            model.start += excess
+            model.endRemoveRows()
+
+    def _trim_tail(self):
+        model = self.model
+        excess = (model.end - model.start) - self.max_rows
+        if excess > 0:
+            count = model.end - model.start
+            model.beginRemoveRows(QModelIndex(), count - excess, count - 1)
+            self.delegate.forget(model.end - excess, model.end)
+            self._forget_paged(model.end - excess, model.end)
+            model.end -= excess
+            model.endRemoveRows()
+
+    def _user_scrolled(self, action):
+        scroll_bar = self.verticalScrollBar()
+        if scroll_bar.sliderPosition() == scroll_bar.value():
+            # Already pinned at an end; no valueChanged will follow, so page from here
+            self._page_on_scroll(scroll_bar.value())
+            return
+        self.user_scrolling = True
+
+    def _page_on_scroll(self, value):
+        model = self.model
+        scroll_bar = self.verticalScrollBar()
+        if self.user_scrolling:
+            # Scrolling away from the bottom stops auto-follow; scrolling back resumes it
+            self.user_scrolling = False
+            self.following = self.at_bottom() and model.end == self.count()
+        if value == scroll_bar.minimum() and model.start > 0:
+            # Page older entries in above the current top row
+            anchor = model.start
+            count = min(self.page_size, model.start)
+            self._page_in(model.start - count, model.start)
+            model.beginInsertRows(QModelIndex(), 0, count - 1)
+            model.start -= count
+            model.endInsertRows()
+            self._trim_tail()
+            self.scrollTo(model.index(anchor - model.start), QAbstractItemView.PositionAtTop)
+        elif value == scroll_bar.maximum() and model.end < self.count():
+            count = min(self.page_size, self.count() - model.end)
+            self._page_in(model.end, model.end + count)
+            model.beginInsertRows(QModelIndex(), model.end - model.start, model.end - model.start + count - 1)
+            model.end += count
+            model.endInsertRows()
+            self._trim_head()
+            self.following = model.end == self.count()
+
+    def wheelEvent(self, event):
+        # At either end of the window the scroll bar can't move, so page from the wheel instead
+        scroll_bar = self.verticalScrollBar()
+        if event.angleDelta().y() > 0 and scroll_bar.value() == scroll_bar.minimum():
+            self._page_on_scroll(scroll_bar.value())
+        elif event.angleDelta().y() < 0 and scroll_bar.value() == scroll_bar.maximum():
+            self._page_on_scroll(scroll_bar.value())
+        super().wheelEvent(event)
+
+    def resizeEvent(self, event):
+        # Cached heights are only valid for the width they were measured at
+        if event.size().width() != event.oldSize().width():
+            self.delegate.heights.clear()
+        super().resizeEvent(event)
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.Copy):
+            rows = sorted(index.row() for index in self.selectedIndexes())
+            document = QTextDocument()
+            lines = []
+            for row in rows:
+                document.setHtml(self.row(self.model.start + row))
+                lines.append(document.toPlainText())
+            QApplication.clipboard().setText("\n".join(lines))
+            return
+        super().keyPressEvent(event)
+
+# Rolling percentiles of the executor's request metrics, with CSV and Prometheus export
+class MetricsDialog(QDialog):
+    ROWS = (("queue_wait", "Queue wait (s)"), ("connect", "Connect (s)"), ("ttft", "Time to first token (s)"),
+            ("total", "Total latency (s)"), ("tokens_per_second", "Tokens/sec"), ("render", "Render (s)"))
+
+    def __init__(self, metrics, parent=None):
+        super().__init__(parent)
+        self.metrics = metrics
+        self.setWindowTitle("Request Metrics")
+        self.setMinimumSize(520, 320)
+        layout = QVBoxLayout(self)
+
+        self.summary_label = QLabel("")
+        layout.addWidget(self.summary_label)
+
+        self.table = QTableWidget(len(self.ROWS), len(RequestMetrics.QUANTILES))
+        self.table.setVerticalHeaderLabels([label for _, label in self.ROWS])
+        self.table.setHorizontalHeaderLabels([f"p{round(q * 100)}" for q in RequestMetrics.QUANTILES])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        buttons_layout = QHBoxLayout()
+        export_csv_button = QPushButton("Export CSV")
+        export_csv_button.clicked.connect(self.export_csv)
+        buttons_layout.addWidget(export_csv_button)
+        export_prometheus_button = QPushButton("Export Prometheus")
+        export_prometheus_button.clicked.connect(self.export_prometheus)
+        buttons_layout.addWidget(export_prometheus_button)
+        buttons_layout.addStretch()
+        layout.addLayout(buttons_layout)
+        self.refresh()
+
+    def refresh(self):
+        metrics = self.metrics
+        self.summary_label.setText(f"Last {len(metrics.samples)} requests | {metrics.requests} total, "
+                                   f"{metrics.errors} failed, {metrics.cancelled} cancelled | "
+                                   f"Tokens: {metrics.prompt_tokens} prompt, {metrics.completion_tokens} completion")
+        for row, (field, _) in enumerate(self.ROWS):
+            for column, value in enumerate(metrics.percentiles(field)):
+                text = "-" if value is None else (f"{value:.1f}" if field == "tokens_per_second" else f"{value:.3f}")
+                self.table.setItem(row, column, QTableWidgetItem(text))
+
+    def export_csv(self):
+        file_name, _ = QFileDialog.getSaveFileName(self, "Export Metrics", "", "CSV Files (*.csv)")
+        if file_name:
+            try:
+                with open(file_name, 'w', newline='', encoding='utf-8') as f:
+                    self.metrics.write_csv(f)
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to save file: {str(e)}")
+
+    def export_prometheus(self):
+        file_name, _ = QFileDialog.getSaveFileName(self, "Export Metrics", "", "Prometheus Text (*.prom)")
+        if file_name:
+            try:
+                with open(file_name, 'w', encoding='utf-8') as f:
+                    f.write(self.metrics.prometheus_text())
+            except Exception as e:
+                QMessageBox.critical(self, "Error", f"Failed to save file: {str(e)}")
+
+# One Single Chat conversation with its own history, transcript and journal. Sessions run side by
+# side: each has its own request group, so one session's requests never cancel another's.
+class ChatSession:
+    ids = itertools.count(1)
+
+    def __init__(self, figure, history, display, journal=None, memory=None):
+        self.id = next(ChatSession.ids)
+        self.figure = figure
+        self.history = history
+        self.display = display
+        self.journal = journal
+        self.memory = memory if memory is not None else ConversationMemory()
+        # Bumped when the session is closed; replies tagged with an older generation are dropped
+        self.generation = 0
+        self.in_flight = 0
+
+    @property
+    def group(self):
+        return f"single:{self.id}"
+
 
 class LMStudioChat(QMainWindow):
     def __init__(self):
@@ -37,61 +1172,14 @@ class LMStudioChat(QMainWindow):
         self.setWindowTitle("LM Studio Chat")
         self.setMinimumSize(1000, 700)
 
-        # Default dictionary (valid JSON)
-        self.default_categories = {
-            "Presidents": ["George Washington", "Abraham Lincoln", "Thomas Jefferson", "Franklin D. Roosevelt",
-                            "John F. Kennedy", "Theodore Roosevelt", "Ronald Reagan", "Barack Obama",
-                            "Dwight D. Eisenhower", "Harry S. Truman"],
-            "Scientists": ["Albert Einstein", "Isaac Newton", "Marie Curie", "Nikola Tesla", "Charles Darwin",
-                            "Richard Feynman", "Galileo Galilei", "Stephen Hawking", "Neil deGrasse Tyson",
-                            "Carl Sagan", "Alan Turing", "Rachel Carson", "Rosalind Franklin", "Katherine Johnson",
-                            "James Watson", "Francis Crick", "Jane Goodall"],
-            "Artists": ["Leonardo da Vinci", "Vincent van Gogh", "Frida Kahlo", "Pablo Picasso", "Michelangelo",
-                        "Claude Monet", "Salvador Dalí", "Georgia O'Keeffe", "Andy Warhol", "Rembrandt", "Banksy",
-                        "Jean-Michel Basquiat"],
-            "Writers": ["William Shakespeare", "Jane Austen", "Mark Twain", "Ernest Hemingway", "Virginia Woolf",
-                        "Leo Tolstoy", "Oscar Wilde", "Maya Angelou", "Gabriel García Márquez", "Franz Kafka",
-                        "Emily Dickinson", "Edgar Allan Poe", "Toni Morrison", "George Orwell", "J.K. Rowling",
-                        "Haruki Murakami"],
-            "Philosophers": ["Socrates", "Plato", "Aristotle", "Confucius", "Friedrich Nietzsche", "René Descartes",
-                            "Immanuel Kant", "Jean-Jacques Rousseau", "John Locke", "Simone de Beauvoir",
-                            "Jean-Paul Sartre", "Karl Marx", "Hannah Arendt", "Bertrand Russell",
-                            "Michel Foucault"],
-            "Inventors": ["Thomas Edison", "Alexander Graham Bell", "Steve Jobs", "Ada Lovelace",
-                        "Johannes Gutenberg", "Leonardo da Vinci", "James Watt", "Grace Hopper", "Hedy Lamarr",
-                        "Wright Brothers", "Marie Van Brittan Brown"],
-            "Musicians": ["Wolfgang Amadeus Mozart", "Ludwig van Beethoven", "Johann Sebastian Bach",
-                        "Freddie Mercury", "John Lennon", "Elvis Presley", "David Bowie", "Bob Dylan",
-                        "Michael Jackson", "Prince", "Madonna", "Aretha Franklin", "Nina Simone",
-                        "Louis Armstrong", "Bob Marley", "Jimi Hendrix"],
-            "Athletes": ["Muhammad Ali", "Michael Jordan", "Pelé", "Serena Williams", "Babe Ruth", "Usain Bolt",
-                        "Wayne Gretzky", "Jesse Owens", "Billie Jean King", "Michael Phelps", "Tiger Woods",
-                        "Simone Biles", "Kobe Bryant", "Jackie Robinson", "Wilma Rudolph"],
-            "Political Leaders": ["Mahatma Gandhi", "Winston Churchill", "Nelson Mandela", "Margaret Thatcher",
-                                    "Martin Luther King Jr.", "Cleopatra", "Queen Elizabeth I", "Queen Victoria",
-                                    "Catherine the Great", "Angela Merkel", "Benazir Bhutto", "Indira Gandhi",
-                                    "Golda Meir", "Eleanor Roosevelt"],
-            "Activists": ["Malcolm X", "Rosa Parks", "Emmeline Pankhurst", "Harvey Milk", "Gloria Steinem",
-                        "Malala Yousafzai", "Cesar Chavez", "Greta Thunberg", "Susan B. Anthony", "Harriet Tubman",
-                        "Helen Keller", "Desmond Tutu", "Rigoberta Menchú", "Betty Friedan"],
-            "Military": ["Napoleon Bonaparte", "Alexander the Great", "Sun Tzu", "Genghis Khan", "Julius Caesar",
-                        "Hannibal Barca", "Joan of Arc", "George S. Patton", "Erwin Rommel",
-                        "Dwight D. Eisenhower", "Admiral Yi Sun-sin", "Spartacus", "Boudicca", "Sitting Bull"],
-            "Entrepreneurs": ["Henry Ford", "Elon Musk", "Bill Gates", "Andrew Carnegie", "Oprah Winfrey",
-                            "Jeff Bezos", "Warren Buffett", "Steve Jobs", "Richard Branson", "Arianna Huffington",
-                            "Mark Zuckerberg", "Coco Chanel", "Walt Disney", "John D. Rockefeller",
-                            "Madam C.J. Walker"],
-            "Explorers": ["Christopher Columbus", "Marco Polo", "Amelia Earhart", "Neil Armstrong",
-                        "Jacques Cousteau", "Roald Amundsen", "Edmund Hillary", "Tenzing Norgay", "Sacagawea",
-                        "Ibn Battuta", "Captain James Cook", "Lewis and Clark", "David Livingstone", "Zheng He",
-                        "Matthew Henson", "Ernest Shackleton"]
-        }
-
         self.current_dict_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "FamousPeople.dict")
-        if not os.path.exists(self.current_dict_path):
-            self.save_dictionary(self.current_dict_path, self.default_categories)
-        self.categories = self.load_dictionary(self.current_dict_path)
-        self.update_all_figures()
+        self.combo_fillers = {}
+        # The dictionary is written and loaded by finish_startup(), once the window is up
+        self.dictionary = FigureDictionary.from_categories({})
+        self.search_index = FigureSearchIndex()
+        self.search_builder = None
+        self.search_timer = QTimer(self)
+        self.search_timer.timeout.connect(self._build_search_step)
 
         # Main layout
         central_widget = QWidget()
@@ -108,26 +1196,86 @@ class LMStudioChat(QMainWindow):
         self.tabs.addTab(self.tab1, "Single Chat")
         self.setup_single_chat_tab()
 
-        # Second tab: Dual Chat
+        # Second tab: Dual Chat, filled in by finish_startup()
         self.tab2 = QWidget()
         self.tab2_layout = QVBoxLayout(self.tab2)
         self.tabs.addTab(self.tab2, "Dual Chat")
-        self.setup_dual_chat_tab()
 
-        # Initialize current figure
-        self.current_figure = None
-        self.conversation_history = []
-        self.figure_prompts = {}
-        self.update_figure_prompts()
+        # Shared request executor and its settings row
+        self.executor = RequestExecutor()
+        self.response_cache = None
+        self.response_cache_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                "response_cache.sqlite3")
+        # Context budgets set for particular figures; the rest use the one in the settings row
+        self.figure_budgets = {}
+        self.figure_budgets_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "context_budgets.json")
+        # One payload builder per model, since each caches its request header
+        self.payload_builders = {}
+        self.models_warmed = False
+        self.prompt_cache_stats = {"cached": 0, "evaluated": 0}
+        main_layout.addLayout(self.setup_request_settings())
+
+        self.figure1 = ""
+        self.figure2 = ""
+        self.history1 = ContextWindow("")
+        self.history2 = ContextWindow("")
+        self.summary_timer = QTimer(self)
+        self.summary_timer.setSingleShot(True)
+        self.summary_timer.setInterval(SUMMARY_IDLE_MS)
+        self.summary_timer.timeout.connect(self._flush_summaries)
+        self.turn_scheduler = TurnScheduler()
+        self.pending_reveals = deque()
+        self.reveal_timer = QTimer(self)
+        self.reveal_timer.setSingleShot(True)
+        self.reveal_timer.timeout.connect(self._reveal_next_turn)
+        self.dual_next_pair = None
         self.conversation_active = False
-        self.api_url = "http://localhost:1234/v1/chat/completions"
+        # Bumped whenever a dual conversation starts or stops; replies tagged with an older generation are dropped
+        self.dual_generation = 0
         
-        # Initialize threads list to keep references
-        self.threads = []
-        self.workers = []
-        
-        # Initialize dual chat conversation record
-        self.dual_conversation_log = []
+        # Dual chat conversation record: the message store both speakers' histories are views of
+        self.dual_messages = MessageStore()
+        self.dual_memory = ConversationMemory()
+
+        # Background pre-generation of introductions; only runs while the executor is idle
+        self.prefetched_intros = {}
+        self.prefetch_queue = deque()
+        self.prefetch_in_flight = set()
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setInterval(PREFETCH_INTERVAL_MS)
+        self.prefetch_timer.timeout.connect(self._prefetch_next_intro)
+        self.category_combo.currentTextChanged.connect(self.start_intro_prefetch)
+        self.user_input.textChanged.connect(self.cancel_intro_prefetch)
+        self.custom_figure.textEdited.connect(self.cancel_intro_prefetch)
+        self.tabs.currentChanged.connect(self._tab_changed)
+
+        # Crash-safe session journals, one per conversation
+        self.sessions_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions")
+        self.dual_journal = None
+        self.journal_timer = QTimer(self)
+        self.journal_timer.timeout.connect(self.sync_journals)
+        self.journal_timer.start(JOURNAL_SYNC_CHECK_MS)
+        # Running export: its thread, worker and progress dialog
+        self.export_job = None
+
+        # Everything the first paint doesn't need is done on the first event loop pass
+        self.startup_finished = False
+        QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        # Loads the dictionary, builds the Dual Chat tab and starts probing the servers. Runs once,
+        # right after the window first appears; call it directly to use the window without an event loop.
+        if self.startup_finished:
+            return
+        self.startup_finished = True
+        if not os.path.exists(self.current_dict_path):
+            self.save_dictionary(self.current_dict_path, DEFAULT_CATEGORIES)
+        self.dictionary = self.load_dictionary(self.current_dict_path)
+        self.populate_combo(self.category_combo, self.dictionary.category_names())
+        self.load_figure_budgets()
+        self.setup_dual_chat_tab()
+        self.rebuild_search_index()
+        self.executor.check_health()
 
     def setup_single_chat_tab(self):
         # Splitter for left and right panes
@@ -157,14 +1305,16 @@ class LMStudioChat(QMainWindow):
         # Category selection
         left_layout.addWidget(QLabel("Select Category:"))
         self.category_combo = QComboBox()
-        self.category_combo.addItems(sorted(self.categories.keys()))
         self.category_combo.currentTextChanged.connect(self.update_figure_combo)
-        left_layout.addWidget(self.category_combo)
 
         # Figure selection
-        left_layout.addWidget(QLabel("Select a figure:"))
         self.figure_combo = QComboBox()
-        self.update_figure_combo(self.category_combo.currentText())
+
+        # Search across every category
+        self.figure_search = self.create_figure_search(self.category_combo, self.figure_combo)
+        left_layout.addWidget(self.figure_search)
+        left_layout.addWidget(self.category_combo)
+        left_layout.addWidget(QLabel("Select a figure:"))
         left_layout.addWidget(self.figure_combo)
 
         # Custom figure input
@@ -172,20 +1322,64 @@ class LMStudioChat(QMainWindow):
         self.custom_figure = QLineEdit()
         left_layout.addWidget(self.custom_figure)
 
+        # Context budget of the selected figure, in both tabs
+        figure_budget_layout = QHBoxLayout()
+        figure_budget_layout.addWidget(QLabel("Context budget for this figure:"))
+        self.figure_budget_spin = QSpinBox()
+        self.figure_budget_spin.setRange(0, 131072)
+        self.figure_budget_spin.setSingleStep(256)
+        self.figure_budget_spin.setSpecialValueText("Default")
+        self.figure_budget_spin.setToolTip("Tokens of history kept for this figure; \"Default\" uses the "
+                                           "context budget in the settings row")
+        self.figure_budget_spin.valueChanged.connect(self.set_figure_budget)
+        figure_budget_layout.addWidget(self.figure_budget_spin)
+        left_layout.addLayout(figure_budget_layout)
+        self.figure_combo.currentTextChanged.connect(self.show_figure_budget)
+        self.custom_figure.textChanged.connect(self.show_figure_budget)
+
         # Selection button
         self.select_button = QPushButton("Start Conversation")
         self.select_button.clicked.connect(self.start_conversation)
         left_layout.addWidget(self.select_button)
+
+        self.resume_button = QPushButton("Resume Session")
+        self.resume_button.clicked.connect(self.resume_session)
+        left_layout.addWidget(self.resume_button)
+
+        export_layout = QHBoxLayout()
+        self.export_button = QPushButton("Export Conversation")
+        self.export_button.clicked.connect(self.export_conversation)
+        export_layout.addWidget(self.export_button)
+
+        self.export_sessions_button = QPushButton("Export Sessions...")
+        self.export_sessions_button.setToolTip("Export every saved session in a folder to one file")
+        self.export_sessions_button.clicked.connect(self.export_sessions)
+        export_layout.addWidget(self.export_sessions_button)
+        left_layout.addLayout(export_layout)
+
+        # Streaming toggle
+        self.stream_checkbox = QCheckBox("Stream responses")
+        self.stream_checkbox.setChecked(True)
+        left_layout.addWidget(self.stream_checkbox)
+
+        self.prefetch_checkbox = QCheckBox("Pre-generate introductions")
+        self.prefetch_checkbox.setChecked(True)
+        self.prefetch_checkbox.toggled.connect(self.start_intro_prefetch)
+        left_layout.addWidget(self.prefetch_checkbox)
         left_layout.addStretch()
 
         # Right pane for chat interface
         right_pane = QWidget()
         right_layout = QVBoxLayout(right_pane)
 
-        # Chat display area
-        self.chat_display = QTextEdit()
-        self.chat_display.setReadOnly(True)
-        right_layout.addWidget(self.chat_display)
+        # One tab per conversation; each keeps its own history and can have a reply in flight
+        self.sessions = {}
+        self.session_tabs = QTabWidget()
+        self.session_tabs.setTabsClosable(True)
+        self.session_tabs.setMovable(True)
+        self.session_tabs.setDocumentMode(True)
+        self.session_tabs.tabCloseRequested.connect(self.close_session)
+        right_layout.addWidget(self.session_tabs)
 
         # User input area
         self.user_input = QTextEdit()
@@ -197,6 +1391,7 @@ class LMStudioChat(QMainWindow):
         self.send_button = QPushButton("Send")
         self.send_button.clicked.connect(self.send_message)
         right_layout.addWidget(self.send_button)
+        self.session_tabs.currentChanged.connect(self._update_send_button)
 
         # Add both panes to the splitter
         splitter.addWidget(left_pane)
@@ -220,34 +1415,48 @@ class LMStudioChat(QMainWindow):
         first_figure_layout = QVBoxLayout()
         category_label1 = QLabel("Select Category 1:")
         self.category_combo1 = QComboBox()
-        self.category_combo1.addItems(sorted(self.categories.keys()))
+        self.populate_combo(self.category_combo1, self.dictionary.category_names())
         self.category_combo1.currentTextChanged.connect(self.update_figure_combo1)
         
         figure_label1 = QLabel("Select Figure 1:")
         self.figure_combo1 = QComboBox()
         self.update_figure_combo1(self.category_combo1.currentText())
+        self.figure_search1 = self.create_figure_search(self.category_combo1, self.figure_combo1)
         
+        first_figure_layout.addWidget(self.figure_search1)
         first_figure_layout.addWidget(category_label1)
         first_figure_layout.addWidget(self.category_combo1)
         first_figure_layout.addWidget(figure_label1)
         first_figure_layout.addWidget(self.figure_combo1)
+        first_figure_layout.addWidget(QLabel("Model 1:"))
+        self.model_combo1 = QComboBox()
+        self.model_combo1.addItem(SAME_AS_CHAT_MODEL)
+        self.model_combo1.currentTextChanged.connect(self.warm_up_models)
+        first_figure_layout.addWidget(self.model_combo1)
         dropdown_layout.addLayout(first_figure_layout)
         
         # Second figure selection
         second_figure_layout = QVBoxLayout()
         category_label2 = QLabel("Select Category 2:")
         self.category_combo2 = QComboBox()
-        self.category_combo2.addItems(sorted(self.categories.keys()))
+        self.populate_combo(self.category_combo2, self.dictionary.category_names())
         self.category_combo2.currentTextChanged.connect(self.update_figure_combo2)
         
         figure_label2 = QLabel("Select Figure 2:")
         self.figure_combo2 = QComboBox()
         self.update_figure_combo2(self.category_combo2.currentText())
+        self.figure_search2 = self.create_figure_search(self.category_combo2, self.figure_combo2)
         
+        second_figure_layout.addWidget(self.figure_search2)
         second_figure_layout.addWidget(category_label2)
         second_figure_layout.addWidget(self.category_combo2)
         second_figure_layout.addWidget(figure_label2)
         second_figure_layout.addWidget(self.figure_combo2)
+        second_figure_layout.addWidget(QLabel("Model 2:"))
+        self.model_combo2 = QComboBox()
+        self.model_combo2.addItem(SAME_AS_CHAT_MODEL)
+        self.model_combo2.currentTextChanged.connect(self.warm_up_models)
+        second_figure_layout.addWidget(self.model_combo2)
         dropdown_layout.addLayout(second_figure_layout)
         
         control_layout.addLayout(dropdown_layout)
@@ -275,9 +1484,41 @@ class LMStudioChat(QMainWindow):
         self.save_dual_chat_button = QPushButton("Save Conversation")
         self.save_dual_chat_button.clicked.connect(self.save_dual_conversation)
         button_layout.addWidget(self.save_dual_chat_button)
+
+        self.dual_resume_button = QPushButton("Resume Session")
+        self.dual_resume_button.clicked.connect(self.resume_session)
+        button_layout.addWidget(self.dual_resume_button)
+
+        self.dual_export_sessions_button = QPushButton("Export Sessions...")
+        self.dual_export_sessions_button.setToolTip("Export every saved session in a folder to one file")
+        self.dual_export_sessions_button.clicked.connect(self.export_sessions)
+        button_layout.addWidget(self.dual_export_sessions_button)
+
+        self.dual_stream_checkbox = QCheckBox("Stream responses")
+        self.dual_stream_checkbox.setChecked(True)
+        button_layout.addWidget(self.dual_stream_checkbox)
         
         control_layout.addLayout(button_layout)
-        
+
+        # Turn pacing: next request goes out immediately, display is paced by reading speed
+        pacing_layout = QHBoxLayout()
+        self.fast_mode_checkbox = QCheckBox("Fast mode (no pacing)")
+        self.fast_mode_checkbox.toggled.connect(self.update_turn_pacing)
+        pacing_layout.addWidget(self.fast_mode_checkbox)
+
+        pacing_layout.addWidget(QLabel("Reading speed (wpm):"))
+        self.reading_speed_spin = QSpinBox()
+        self.reading_speed_spin.setRange(50, 5000)
+        self.reading_speed_spin.setSingleStep(50)
+        self.reading_speed_spin.setValue(400)
+        self.reading_speed_spin.valueChanged.connect(self.update_turn_pacing)
+        pacing_layout.addWidget(self.reading_speed_spin)
+
+        self.pacing_saved_label = QLabel("")
+        pacing_layout.addWidget(self.pacing_saved_label)
+        pacing_layout.addStretch()
+        control_layout.addLayout(pacing_layout)
+
         # Main dual chat split layout
         splitter = QSplitter(Qt.Vertical)
         splitter.addWidget(control_panel)
@@ -287,8 +1528,7 @@ class LMStudioChat(QMainWindow):
         chat_layout = QVBoxLayout(chat_panel)
         
         # Single conversation window
-        self.dual_chat_display = QTextEdit()
-        self.dual_chat_display.setReadOnly(True)
+        self.dual_chat_display = TranscriptView()
         self.dual_chat_display.setStyleSheet("font-family: Arial; font-size: 10pt; line-height: 150%;")
         chat_layout.addWidget(self.dual_chat_display)
         
@@ -300,63 +1540,953 @@ class LMStudioChat(QMainWindow):
         # Add splitter to tab layout
         self.tab2_layout.addWidget(splitter)
 
+    def setup_request_settings(self):
+        settings_layout = QVBoxLayout()
+
+        # Request executor
+        executor_layout = QHBoxLayout()
+        executor_layout.addWidget(QLabel("Parallel requests:"))
+        self.max_workers_spin = QSpinBox()
+        self.max_workers_spin.setRange(1, 16)
+        self.max_workers_spin.setValue(self.executor.max_workers)
+        self.max_workers_spin.setToolTip("Requests sent at once across all conversations; "
+                                         "match the parallel slots of your servers")
+        self.max_workers_spin.valueChanged.connect(self.executor.set_max_workers)
+        executor_layout.addWidget(self.max_workers_spin)
+
+        executor_layout.addWidget(QLabel("Queue depth:"))
+        self.max_queue_spin = QSpinBox()
+        self.max_queue_spin.setRange(1, 1024)
+        self.max_queue_spin.setValue(self.executor.max_queue)
+        self.max_queue_spin.valueChanged.connect(self.executor.set_max_queue)
+        executor_layout.addWidget(self.max_queue_spin)
+
+        self.queue_status_label = QLabel("Queued: 0 | Active: 0")
+        self.executor.queue_changed.connect(
+            lambda queued, active: self.queue_status_label.setText(f"Queued: {queued} | Active: {active}"))
+        executor_layout.addWidget(self.queue_status_label)
+
+        executor_layout.addWidget(QLabel("Deadline (s):"))
+        self.deadline_spin = QSpinBox()
+        self.deadline_spin.setRange(0, 3600)
+        self.deadline_spin.setValue(300)
+        self.deadline_spin.setSpecialValueText("None")
+        self.deadline_spin.setToolTip("Requests still queued or running after this long are cancelled")
+        executor_layout.addWidget(self.deadline_spin)
+
+        self.metrics_button = QPushButton("Metrics...")
+        self.metrics_button.clicked.connect(self.show_metrics)
+        executor_layout.addWidget(self.metrics_button)
+        self.metrics_dialog = None
+        self.metrics_label = QLabel("No requests yet")
+        self.statusBar().addPermanentWidget(self.metrics_label)
+        self.executor.request_measured.connect(self.update_metrics)
+        executor_layout.addStretch()
+        settings_layout.addLayout(executor_layout)
+
+        # Inference servers
+        servers_layout = QHBoxLayout()
+        servers_layout.addWidget(QLabel("Servers:"))
+        self.servers_input = QLineEdit(DEFAULT_SERVER_URL)
+        self.servers_input.setToolTip("Comma-separated OpenAI-compatible server URLs; "
+                                      "requests go to the least busy healthy server")
+        self.servers_input.editingFinished.connect(self.update_backends)
+        servers_layout.addWidget(self.servers_input)
+
+        self.pin_checkbox = QCheckBox("Keep each conversation on one server")
+        self.pin_checkbox.setChecked(True)
+        self.pin_checkbox.setToolTip("Reuses the server's prompt cache for the conversation's history")
+        servers_layout.addWidget(self.pin_checkbox)
+
+        self.backend_status_label = QLabel("")
+        self.executor.backends_changed.connect(self.update_backend_status)
+        servers_layout.addWidget(self.backend_status_label)
+        settings_layout.addLayout(servers_layout)
+
+        # Models listed by the servers; the picked ones are warmed up so the first turn doesn't pay for loading
+        model_layout = QHBoxLayout()
+        model_layout.addWidget(QLabel("Model:"))
+        self.model_combo = QComboBox()
+        self.model_combo.addItem("default")
+        self.model_combo.setSizeAdjustPolicy(QComboBox.AdjustToContents)
+        self.model_combo.currentTextChanged.connect(self._chat_model_changed)
+        self.executor.models_changed.connect(self.update_model_choices)
+        model_layout.addWidget(self.model_combo)
+
+        self.keep_alive_checkbox = QCheckBox("Keep models loaded")
+        self.keep_alive_checkbox.setToolTip(f"Ping the models in use after {KEEP_ALIVE_IDLE_S // 60} minutes "
+                                            "without requests so the server doesn't unload them")
+        self.keep_alive_checkbox.toggled.connect(self.executor.set_keep_alive)
+        model_layout.addWidget(self.keep_alive_checkbox)
+
+        self.model_status_label = QLabel("")
+        self.executor.model_warmed.connect(self._on_model_warmed)
+        model_layout.addWidget(self.model_status_label)
+        model_layout.addStretch()
+        settings_layout.addLayout(model_layout)
+
+        # Long-term memory through the servers' embeddings endpoint
+        memory_layout = QHBoxLayout()
+        self.memory_checkbox = QCheckBox("Long-term memory")
+        self.memory_checkbox.setToolTip("Embed every turn and send the earlier turns most relevant to the latest "
+                                        "message along with it, so turns trimmed from the context aren't forgotten")
+        memory_layout.addWidget(self.memory_checkbox)
+        memory_layout.addWidget(QLabel("Embedding model:"))
+        self.embedding_model_combo = QComboBox()
+        self.embedding_model_combo.addItem("default")
+        self.embedding_model_combo.setSizeAdjustPolicy(QComboBox.AdjustToContents)
+        memory_layout.addWidget(self.embedding_model_combo)
+        memory_layout.addWidget(QLabel("Recalled turns:"))
+        self.recall_spin = QSpinBox()
+        self.recall_spin.setRange(1, 20)
+        self.recall_spin.setValue(4)
+        memory_layout.addWidget(self.recall_spin)
+        self.memory_status_label = QLabel("")
+        memory_layout.addWidget(self.memory_status_label)
+        memory_layout.addStretch()
+        settings_layout.addLayout(memory_layout)
+
+        # Timeouts, retries and hedging
+        policy = self.executor.policy
+        policy_layout = QHBoxLayout()
+        policy_layout.addWidget(QLabel("Connect timeout (s):"))
+        self.connect_timeout_spin = QSpinBox()
+        self.connect_timeout_spin.setRange(1, 300)
+        self.connect_timeout_spin.setValue(int(policy.connect_timeout))
+        self.connect_timeout_spin.valueChanged.connect(lambda value: setattr(policy, "connect_timeout", value))
+        policy_layout.addWidget(self.connect_timeout_spin)
+
+        policy_layout.addWidget(QLabel("Read timeout (s):"))
+        self.read_timeout_spin = QSpinBox()
+        self.read_timeout_spin.setRange(1, 3600)
+        self.read_timeout_spin.setValue(int(policy.read_timeout))
+        self.read_timeout_spin.setToolTip("Longest wait for the next bytes of a reply")
+        self.read_timeout_spin.valueChanged.connect(lambda value: setattr(policy, "read_timeout", value))
+        policy_layout.addWidget(self.read_timeout_spin)
+
+        policy_layout.addWidget(QLabel("Retries:"))
+        self.retries_spin = QSpinBox()
+        self.retries_spin.setRange(0, 10)
+        self.retries_spin.setValue(policy.max_retries)
+        self.retries_spin.setToolTip("Failed requests are retried on another server, or on the same one "
+                                     "after a randomized exponential backoff")
+        self.retries_spin.valueChanged.connect(lambda value: setattr(policy, "max_retries", value))
+        policy_layout.addWidget(self.retries_spin)
+
+        self.hedge_checkbox = QCheckBox("Hedge slow requests")
+        self.hedge_checkbox.setToolTip("Send a duplicate to another server when a request is slower than "
+                                       "95% of recent ones, and keep whichever answers first")
+        self.hedge_checkbox.toggled.connect(self.executor.set_hedging)
+        policy_layout.addWidget(self.hedge_checkbox)
+        policy_layout.addStretch()
+        settings_layout.addLayout(policy_layout)
+
+        # Context window
+        context_layout = QHBoxLayout()
+        context_layout.addWidget(QLabel("Default context budget (tokens):"))
+        self.context_budget_spin = QSpinBox()
+        self.context_budget_spin.setRange(256, 131072)
+        self.context_budget_spin.setSingleStep(256)
+        self.context_budget_spin.setValue(4096)
+        self.context_budget_spin.valueChanged.connect(lambda _: self.update_context_budget())
+        context_layout.addWidget(self.context_budget_spin)
+
+        self.summarize_checkbox = QCheckBox("Summarize trimmed turns")
+        self.summarize_checkbox.setChecked(True)
+        context_layout.addWidget(self.summarize_checkbox)
+
+        self.prompt_cache_label = QLabel("Prompt cache: n/a")
+        context_layout.addWidget(self.prompt_cache_label)
+        context_layout.addStretch()
+        settings_layout.addLayout(context_layout)
+
+        # Response cache
+        cache_layout = QHBoxLayout()
+        self.response_cache_checkbox = QCheckBox("Cache responses")
+        self.response_cache_checkbox.toggled.connect(self.update_response_cache)
+        cache_layout.addWidget(self.response_cache_checkbox)
+
+        self.bypass_cache_checkbox = QCheckBox("Fresh sampling (bypass cache)")
+        self.bypass_cache_checkbox.toggled.connect(self.update_response_cache)
+        cache_layout.addWidget(self.bypass_cache_checkbox)
+
+        self.response_cache_label = QLabel("")
+        self.executor.cache_changed.connect(self.update_response_cache_label)
+        cache_layout.addWidget(self.response_cache_label)
+        cache_layout.addStretch()
+        settings_layout.addLayout(cache_layout)
+
+        return settings_layout
+
+    def update_response_cache(self):
+        # The cache file is only created once caching is switched on
+        if self.response_cache_checkbox.isChecked():
+            if self.response_cache is None:
+                self.response_cache = ResponseCache(self.response_cache_path)
+            self.executor.cache = self.response_cache
+        else:
+            self.executor.cache = None
+        self.executor.cache_reads = not self.bypass_cache_checkbox.isChecked()
+        self.update_response_cache_label()
+
+    def update_backends(self):
+        urls = list(dict.fromkeys(normalize_base_url(url) for url in self.servers_input.text().split(",")
+                                  if url.strip()))
+        if not urls:
+            self.servers_input.setText(", ".join(backend.base_url for backend in self.executor.backends))
+            return
+        if urls != [backend.base_url for backend in self.executor.backends]:
+            self.executor.set_backends(urls)
+
+    def update_backend_status(self):
+        backends = self.executor.backends
+        parts = []
+        for backend in backends:
+            backend.healthy  # Moves open circuits whose cooldown has passed to half-open
+            state = {"closed": f"{backend.in_flight} active", "half-open": "trial", "open": "down"}[backend.state]
+            parts.append(f"{backend.base_url.split('//', 1)[-1].rsplit('/v1', 1)[0]}: {state}")
+        up = sum(backend.state != "open" for backend in backends)
+        self.backend_status_label.setText(f"{up}/{len(backends)} healthy | " + ", ".join(parts))
+        failed = [f"{backend.base_url}: {backend.last_error}" for backend in backends if backend.last_error]
+        self.backend_status_label.setToolTip("\n".join(failed))
+
+    def update_model_choices(self):
+        # Selections that are still listed are kept; otherwise the first listed model is picked
+        models = self.executor.backends.models()
+        if not models:
+            return
+        chat_model = self.chat_model()
+        # Embedding models are told apart by name, the only hint /v1/models gives
+        embedding_models = [model for model in models if "embed" in model.lower()]
+        chat_models = [model for model in models if model not in embedding_models]
+        for combo, fixed, preferred in ((self.model_combo, [], chat_models),
+                                        (self.model_combo1, [SAME_AS_CHAT_MODEL], []),
+                                        (self.model_combo2, [SAME_AS_CHAT_MODEL], []),
+                                        (self.embedding_model_combo, [], embedding_models)):
+            current = combo.currentText()
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItems(fixed + models)
+            index = combo.findText(current)
+            if index < 0 and preferred:
+                index = combo.findText(preferred[0])
+            combo.setCurrentIndex(max(0, index))
+            combo.blockSignals(False)
+        if self.chat_model() != chat_model:
+            self._chat_model_changed()
+        elif not self.models_warmed:
+            self.warm_up_models()
+
+    def chat_model(self):
+        return self.model_combo.currentText() or "default"
+
+    def speaker_model(self, combo):
+        model = combo.currentText()
+        return self.chat_model() if not model or model == SAME_AS_CHAT_MODEL else model
+
+    def models_in_use(self):
+        return list(dict.fromkeys([self.chat_model(), self.speaker_model(self.model_combo1),
+                                   self.speaker_model(self.model_combo2)]))
+
+    def payload_builder_for(self, model):
+        if model not in self.payload_builders:
+            self.payload_builders[model] = PayloadBuilder(model)
+        return self.payload_builders[model]
+
+    def _chat_model_changed(self):
+        # Introductions generated by the previous model are dropped and generated again
+        self.cancel_intro_prefetch()
+        self.prefetched_intros = {}
+        if self.tabs.currentWidget() is self.tab1:
+            self.start_intro_prefetch()
+        self.warm_up_models()
+
+    def warm_up_models(self):
+        # Only newly picked models need loading; keep-alive pings cover the rest
+        models = self.models_in_use()
+        fresh = [model for model in models if model not in self.executor.warm_models or not self.models_warmed]
+        self.executor.warm_models = models
+        if fresh and self.executor.warm_up(fresh):
+            self.models_warmed = True
+            self.model_status_label.setText(f"Loading {', '.join(fresh)}...")
+
+    def _on_model_warmed(self, base_url, model, seconds, error):
+        if error:
+            self.model_status_label.setText(f"Warm-up of {model} failed")
+            self.model_status_label.setToolTip(f"{base_url}: {error}")
+        else:
+            self.model_status_label.setText(f"{model} ready (warm-up {seconds:.1f}s)")
+            self.model_status_label.setToolTip(base_url)
+
+    def _recall(self, memory, query, query_key, before, group, on_ready):
+        # Embeds turns not embedded yet, and the query if needed, then calls on_ready with the
+        # recalled turns. Without memory, or before any turn has left the window, on_ready runs at once.
+        if not self.memory_checkbox.isChecked() or before <= 0:
+            on_ready(None)
+            return
+        model = self.embedding_model_combo.currentText() or "default"
+        memory.use_model(model)
+        limit = self.recall_spin.value()
+        vector = memory.index.vector(query_key) if query_key is not None and query_key in memory.index else None
+        keys = memory.take_pending(EMBED_BATCH_SIZE)
+        if vector is not None and not keys:
+            on_ready(memory.recall(vector, limit, before, RECALL_MAX_CHARS))
+            return
+        embed_query = vector is None and query_key not in keys
+
+        def embedded(response):
+            vectors = [item["embedding"] for item in sorted(response["data"], key=lambda item: item["index"])]
+            memory.set_vectors(keys, vectors)
+            query_vector = vector
+            if embed_query:
+                query_vector = vectors[-1]
+                memory.remember_query(query, query_vector)
+            elif query_vector is None:
+                query_vector = vectors[keys.index(query_key)]
+            self.memory_status_label.setText(f"{len(memory.index)} turns embedded")
+            self.memory_status_label.setToolTip("")
+            on_ready(memory.recall(query_vector, limit, before, RECALL_MAX_CHARS))
+            self._embed_pending(memory, group)
+
+        def failed(error):
+            # Carry on without recall rather than holding the conversation up
+            memory.restore(keys)
+            self.memory_status_label.setText("Embedding failed")
+            self.memory_status_label.setToolTip(error)
+            on_ready(None)
+
+        inputs = [memory.texts[key] for key in keys] + ([query] if embed_query else [])
+        job_id = self.executor.submit({"model": model, "input": inputs}, on_finished=embedded, on_error=failed,
+                                      group=group, deadline=self.request_deadline(), model=model,
+                                      priority=PRIORITY_CHAT, endpoint="embeddings")
+        if job_id is None:
+            failed("Request queue is full.")
+
+    def _embed_pending(self, memory, group):
+        # Works through a backlog of unembedded turns (a resumed session, or memory turned on late)
+        # in the background, one batch at a time
+        if not self.memory_checkbox.isChecked() or not memory.pending or memory.in_flight:
+            return
+        model = self.embedding_model_combo.currentText() or "default"
+        memory.use_model(model)
+        keys = memory.take_pending(EMBED_BATCH_SIZE)
+
+        def embedded(response):
+            memory.set_vectors(keys, [item["embedding"] for item in
+                                      sorted(response["data"], key=lambda item: item["index"])])
+            self._embed_pending(memory, group)
+
+        job_id = self.executor.submit({"model": model, "input": [memory.texts[key] for key in keys]},
+                                      on_finished=embedded, on_error=lambda error: memory.restore(keys),
+                                      group=group, deadline=self.request_deadline(), model=model,
+                                      priority=PRIORITY_SUMMARY, endpoint="embeddings")
+        if job_id is None:
+            memory.restore(keys)
+
+    def request_deadline(self):
+        return self.deadline_spin.value() or None
+
+    def conversation_pin(self, conversation):
+        return conversation if self.pin_checkbox.isChecked() else None
+
+    def update_metrics(self, sample):
+        metrics = self.executor.metrics
+        total_p50, total_p90, _ = metrics.percentiles("total")
+        text = f"Requests: {metrics.requests} | Latency p50/p90: {total_p50:.2f}s/{total_p90:.2f}s"
+        ttft_p50 = metrics.percentiles("ttft")[0]
+        if ttft_p50 is not None:
+            text += f" | TTFT p50: {ttft_p50:.2f}s"
+        rate_p50 = metrics.percentiles("tokens_per_second")[0]
+        if rate_p50 is not None:
+            text += f" | {rate_p50:.1f} tok/s"
+        self.metrics_label.setText(text)
+        if self.metrics_dialog is not None and self.metrics_dialog.isVisible():
+            self.metrics_dialog.refresh()
+
+    def show_metrics(self):
+        if self.metrics_dialog is None:
+            self.metrics_dialog = MetricsDialog(self.executor.metrics, self)
+        self.metrics_dialog.refresh()
+        self.metrics_dialog.show()
+        self.metrics_dialog.raise_()
+
+    def update_response_cache_label(self):
+        cache = self.executor.cache
+        if cache is None:
+            self.response_cache_label.setText("")
+            return
+        self.response_cache_label.setText(f"Cache: {cache.hits} hits / {cache.misses} misses, "
+                                          f"{cache.total_bytes / 1024:.0f} KB")
+
+    def record_prompt_cache(self, response_data):
+        # OpenAI-style servers report cached prompt tokens in usage, llama.cpp-style ones in timings
+        if response_data.get("from_cache"):
+            return
+        usage = response_data.get("usage") or {}
+        timings = response_data.get("timings") or {}
+        details = usage.get("prompt_tokens_details") or {}
+        if "cached_tokens" in details:
+            cached = details["cached_tokens"]
+            evaluated = usage.get("prompt_tokens", 0) - cached
+        elif "cache_n" in timings:
+            cached = timings["cache_n"]
+            evaluated = timings.get("prompt_n", 0)
+        else:
+            return
+
+        self.prompt_cache_stats["cached"] += cached
+        self.prompt_cache_stats["evaluated"] += evaluated
+        self.prompt_cache_label.setText(f"Prompt cache: {self.prompt_cache_stats['cached']} cached / "
+                                        f"{self.prompt_cache_stats['evaluated']} evaluated tokens")
+
+    def selected_figure(self):
+        return self.custom_figure.text().strip() or self.figure_combo.currentText()
+
+    def context_budget(self, figure):
+        return self.figure_budgets.get(figure) or self.context_budget_spin.value()
+
+    def load_figure_budgets(self):
+        try:
+            with open(self.figure_budgets_path, 'r', encoding='utf-8') as f:
+                self.figure_budgets = {figure: int(budget) for figure, budget in json.load(f).items()}
+        except FileNotFoundError:
+            self.figure_budgets = {}
+        except (OSError, ValueError, AttributeError) as e:
+            self.figure_budgets = {}
+            QMessageBox.warning(self, "Context Budgets", f"Failed to load figure context budgets: {str(e)}")
+        self.show_figure_budget()
+
+    def show_figure_budget(self):
+        self.figure_budget_spin.blockSignals(True)
+        self.figure_budget_spin.setValue(self.figure_budgets.get(self.selected_figure(), 0))
+        self.figure_budget_spin.blockSignals(False)
+
+    def set_figure_budget(self, budget):
+        figure = self.selected_figure()
+        if not figure:
+            return
+        if budget:
+            self.figure_budgets[figure] = budget
+        else:
+            self.figure_budgets.pop(figure, None)
+        try:
+            with open(self.figure_budgets_path, 'w', encoding='utf-8') as f:
+                json.dump(self.figure_budgets, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            QMessageBox.warning(self, "Context Budgets", f"Failed to save figure context budgets: {str(e)}")
+        self.update_context_budget()
+
+    def _context_windows(self):
+        # Every open history with the figure whose budget it follows
+        windows = [(session.figure, session.history) for session in self.sessions.values()]
+        return windows + [(self.figure1, self.history1), (self.figure2, self.history2)]
+
+    def update_context_budget(self):
+        for figure, window in self._context_windows():
+            budget = self.context_budget(figure)
+            if window.budget != budget:
+                window.set_budget(budget)
+                self._summarize_context(window)
+
+    def _flush_summaries(self):
+        # The conversations have gone quiet: summarize whatever evicted turns are left
+        if self.executor.pending or self.executor.active:
+            self.summary_timer.start()
+            return
+        for _, window in self._context_windows():
+            self._summarize_context(window, flush=True)
+
+    def _summarize_context(self, window, flush=False):
+        # Roll turns evicted from the window into a running summary in the background. Evicted
+        # turns are batched: a request goes out once there are enough of them, or with flush.
+        # A long backlog (a resumed session, a lowered budget) goes a budget-sized chunk at a time.
+        if window.summary_pending or not window.evicted:
+            return
+        if not self.summarize_checkbox.isChecked():
+            window.take_evicted()
+            return
+        if not flush and not summary_due(window):
+            self.summary_timer.start()
+            return
+        evicted = window.take_evicted(summary_chunk_tokens(window))
+        if not evicted:
+            return
+        covered = window.evictions - len(window.evicted)
+        window.summary_pending = True
+
+        def apply_summary(response):
+            window.summary_pending = False
+            summary = response["choices"][0]["message"]["content"].strip()
+            window.set_summary(summary, covered)
+            self._journal_summary(window, summary, covered)
+            self._summarize_context(window, flush)
+
+        def summary_failed(error):
+            window.summary_pending = False
+
+        model = self.chat_model()
+        job_id = self.executor.submit(summary_payload(model, window, evicted), on_finished=apply_summary,
+                                      on_error=summary_failed, deadline=self.request_deadline(), model=model,
+                                      priority=PRIORITY_SUMMARY)
+        if job_id is None:
+            window.summary_pending = False
+
+    def _journal_summary(self, window, summary, covered):
+        # Resuming then starts from the summary instead of summarizing every old turn again
+        if window is self.history1 or window is self.history2:
+            journal = self.dual_journal
+            figure = self.figure1 if window is self.history1 else self.figure2
+        else:
+            session = next((session for session in self.sessions.values() if session.history is window), None)
+            if session is None:
+                return
+            journal, figure = session.journal, session.figure
+        if journal is not None:
+            journal.append({"type": "summary", "figure": figure, "summary": summary, "covered": covered})
+
+    def _create_journal(self, kind, header):
+        try:
+            return SessionJournal.create(self.sessions_dir, kind, header)
+        except OSError as e:
+            QMessageBox.warning(self, "Journal Error", f"Session will not be journaled: {str(e)}")
+            return None
+
+    def _memory_for(self, path):
+        # Turn embeddings are kept next to the session's journal, so a resumed session needn't re-embed
+        if path is None:
+            return ConversationMemory()
+        memory = ConversationMemory(os.path.splitext(path)[0] + ".memory")
+        try:
+            memory.load()
+        except (OSError, ValueError, KeyError):
+            pass
+        return memory
+
+    def journals(self):
+        journals = [session.journal for session in self.sessions.values()] + [self.dual_journal]
+        return [journal for journal in journals if journal is not None]
+
+    def sync_journals(self):
+        for journal in self.journals():
+            journal.sync_if_due()
+
+    def resume_session(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Resume Session", self.sessions_dir,
+                                                   "Session Journals (*.jsonl)")
+        if not file_path:
+            return
+        session = self._session_for_journal(file_path)
+        if session is not None:
+            # Already open: a second journal on the same file would interleave the two tabs' turns
+            self.session_tabs.setCurrentWidget(session.display)
+            self.tabs.setCurrentWidget(self.tab1)
+            return
+        try:
+            header, turns = open_session(file_path, ("turn", "summary"))
+            if header.get("kind") == "dual":
+                self._resume_dual_session(file_path, header, turns)
+            else:
+                self._resume_single_session(file_path, header, turns)
+        except (OSError, ValueError, KeyError) as e:
+            QMessageBox.critical(self, "Error", f"Failed to resume session: {str(e)}")
+
+    def _session_for_journal(self, path):
+        for session in self.sessions.values():
+            if session.journal is not None and os.path.samefile(session.journal.path, path):
+                return session
+        return None
+
+    def _resume_single_session(self, path, header, turns):
+        figure = header["figure"]
+        history = ContextWindow(header["system"], self.context_budget(figure),
+                                {"user": "User", "assistant": figure})
+        session = self.open_session_tab(figure, history, SessionJournal(path))
+        session.display.append_text(f"Resumed conversation with {figure}")
+        summary = None
+        for turn in turns:
+            if turn["type"] == "summary":
+                summary = turn
+                continue
+            history.append(turn["role"], turn["content"], turn.get("timestamp"))
+            speaker = "You" if turn["role"] == "user" else figure
+            session.memory.add("User" if turn["role"] == "user" else figure, turn["content"])
+            session.display.append_text(f"{speaker}: {turn['content']}")
+        if summary is not None:
+            history.set_summary(summary["summary"], summary["covered"])
+        self._summarize_context(history)
+        self.tabs.setCurrentWidget(self.tab1)
+
+    def _resume_dual_session(self, path, header, turns):
+        if self.conversation_active:
+            self.stop_dual_conversation()
+        self._begin_dual_conversation(header["figure1"], header["figure2"], header["context"], None)
+        self.dual_memory = self._memory_for(path)
+        self.context_input.setPlainText(self.context)
+
+        # Replay committed turns without pacing
+        last_speaker = None
+        summaries = {}
+        for turn in turns:
+            if turn["type"] == "summary":
+                summaries[turn["figure"]] = turn
+                continue
+            speaker = turn["speaker"]
+            history = self.history1 if speaker == self.figure1 else self.history2
+            commit_dual_turn(history, turn["content"], turn.get("timestamp"))
+            self.dual_memory.add(speaker, turn["content"])
+            self._display_dual_message(speaker, turn["content"])
+            last_speaker = speaker
+        for figure, history in ((self.figure1, self.history1), (self.figure2, self.history2)):
+            if figure in summaries:
+                history.set_summary(summaries[figure]["summary"], summaries[figure]["covered"])
+
+        self.dual_journal = SessionJournal(path)
+        self._summarize_context(self.history1)
+        self._summarize_context(self.history2)
+        self.tabs.setCurrentWidget(self.tab2)
+        self.dual_chat_display.append("<p><b>Conversation resumed.</b></p>")
+        if last_speaker == self.figure1:
+            self._send_dual_message(initiator=self.figure2, responder=self.figure1)
+        else:
+            self._send_dual_message(initiator=self.figure1, responder=self.figure2)
+
+    def closeEvent(self, event):
+        if self.export_job is not None:
+            thread, worker, dialog = self.export_job
+            worker.cancelled = True
+            thread.quit()
+            thread.wait()
+        for journal in self.journals():
+            journal.close()
+        for session in self.sessions.values():
+            session.memory.close()
+        self.dual_memory.close()
+        self.executor.shutdown()
+        self.dictionary.close()
+        if self.response_cache is not None:
+            self.response_cache.close()
+        super().closeEvent(event)
+
     def load_dictionary_dialog(self):
         file_dialog = QFileDialog()
         file_path, _ = file_dialog.getOpenFileName(self, "Load Dictionary", "", "Dictionary Files (*.json)")
         if file_path:
             self.current_dict_path = file_path
-            self.categories = self.load_dictionary(self.current_dict_path)
-            self.update_all_figures()
-            self.update_figure_prompts()
+            self.dictionary.close()
+            self.dictionary = self.load_dictionary(self.current_dict_path)
+            self.prefetched_intros = {}
+            self.rebuild_search_index()
 
-            # Update all combo boxes
+            # Update all combo boxes, keeping the selected category where it still exists
             for combo in [self.category_combo, self.category_combo1, self.category_combo2]:
-                current_text = combo.currentText()
-                combo.clear()
-                combo.addItems(sorted(self.categories.keys()))
-                combo.setCurrentText(current_text if current_text in self.categories else list(self.categories.keys())[0] if self.categories else "")
+                self.populate_combo(combo, self.dictionary.category_names(), combo.currentText())
 
             self.current_dict_label.setText(f"Current Dictionary: {os.path.basename(file_path)}")
+            self.start_intro_prefetch()
 
     def output_prompt_template(self):
         options = QFileDialog.Options()
-        file_name, _ = QFileDialog.getSaveFileName(self, "Save Prompt Template", "", "Text Files (*.txt)",
-                                                    options=options)
+        file_name, _ = QFileDialog.getSaveFileName(self, "Save Prompt Template", "",
+                                                   "Text Files (*.txt *.txt.gz)", options=options)
         if file_name:
-            try:
-                with open(file_name, 'w') as f:
-                    for figure, prompt in self.figure_prompts.items():
-                        f.write(f"### {figure} ###\n{prompt}\n\n")
-                QMessageBox.information(self, "Success", "Prompt templates exported successfully!")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to save file: {str(e)}")
+            dictionary_path = self.current_dict_path
+            self.run_export("Export Prompt Templates", "prompt", file_name,
+                            lambda on_progress, should_stop: export_prompts(dictionary_path, file_name,
+                                                                            on_progress=on_progress,
+                                                                            should_stop=should_stop))
+
+    def _export_target(self, title):
+        # Returns the file to write and its format, picked by the dialog's filter
+        file_name, selected = QFileDialog.getSaveFileName(self, title, "", ";;".join(FILE_FILTERS))
+        if not file_name:
+            return None, None
+        fmt = FILE_FILTERS.get(selected) or format_for(file_name)
+        extension = EXTENSIONS[fmt]
+        if not file_name.endswith((extension, extension + ".gz")):
+            file_name += extension
+        return file_name, fmt
+
+    def export_journals(self, title, paths):
+        file_name, fmt = self._export_target(title)
+        if file_name:
+            self.run_export(title, "conversation", file_name,
+                            lambda on_progress, should_stop: export_transcripts(paths, file_name, fmt,
+                                                                                on_progress=on_progress,
+                                                                                should_stop=should_stop))
+
+    def export_conversation(self):
+        session = self.current_session()
+        if session is None or session.journal is None:
+            QMessageBox.information(self, "Nothing to Export", "Start or resume a conversation first.")
+            return
+        self.export_journals("Export Conversation", [session.journal.path])
+
+    def export_sessions(self):
+        directory = QFileDialog.getExistingDirectory(self, "Export Sessions", self.sessions_dir)
+        if directory:
+            self.export_journals("Export Sessions", [directory])
+
+    def run_export(self, title, unit, file_name, export):
+        # One export at a time, on its own thread; the progress dialog only appears for slow ones
+        if self.export_job is not None:
+            QMessageBox.information(self, "Export Running", "Wait for the current export to finish.")
+            return
+        thread = QThread()
+        worker = ExportWorker(export)
+        worker.moveToThread(thread)
+        dialog = QProgressDialog(f"{title}...", "Cancel", 0, 0, self)
+        dialog.setWindowTitle(title)
+        dialog.setMinimumDuration(500)
+        dialog.setAutoClose(False)
+        dialog.canceled.connect(lambda: setattr(worker, "cancelled", True))
+
+        def count(written):
+            return f"{written} {unit}{'' if written == 1 else 's'}"
+
+        def show_progress(done, total, written):
+            dialog.setMaximum(total)
+            dialog.setValue(done)
+            dialog.setLabelText(f"{title}: {count(written)} written")
+
+        worker.progress.connect(show_progress)
+        worker.finished.connect(lambda written: self._export_done(
+            title, f"Exported {count(written)} to {file_name}", None))
+        worker.failed.connect(lambda error: self._export_done(title, None, error))
+        self.export_job = (thread, worker, dialog)
+        thread.start()
+        worker.start.emit()
 
-    def update_all_figures(self):
-        self.all_figures = [figure for figures in self.categories.values() for figure in figures]
+    def _export_done(self, title, message, error):
+        thread, worker, dialog = self.export_job
+        self.export_job = None
+        thread.quit()
+        thread.wait()
+        worker.deleteLater()
+        dialog.canceled.disconnect()
+        dialog.close()
+        dialog.deleteLater()
+        if message:
+            self.statusBar().showMessage(message, 10000)
+        elif error:
+            QMessageBox.critical(self, "Error", f"{title} failed: {error}")
+        else:
+            self.statusBar().showMessage(f"{title} cancelled.", 5000)
 
-    def update_figure_prompts(self):
-        self.figure_prompts = {figure: f"You are now roleplaying as {figure}." for category in self.categories for
-                               figure in self.categories[category]}
+    def populate_combo(self, combo, items, current_text=None):
+        # Fill the first chunk (enough to reach the selection) now and the rest from the event loop
+        filler = self.combo_fillers.pop(combo, None)
+        if filler is not None:
+            filler.stop()
+        combo.view().setUniformItemSizes(True)
+
+        try:
+            selected = items.index(current_text) if current_text else 0
+        except ValueError:
+            selected = 0
+        filled = max(COMBO_CHUNK_SIZE, selected + 1)
+
+        combo.blockSignals(True)
+        combo.clear()
+        combo.addItems(items[:filled])
+        combo.setCurrentIndex(-1)
+        combo.blockSignals(False)
+        combo.setCurrentIndex(selected if items else -1)
+
+        if filled < len(items):
+            filler = QTimer(self)
+            self.combo_fillers[combo] = filler
+
+            def add_chunk():
+                nonlocal filled
+                combo.addItems(items[filled:filled + COMBO_CHUNK_SIZE])
+                filled += COMBO_CHUNK_SIZE
+                if filled >= len(items):
+                    filler.stop()
+                    self.combo_fillers.pop(combo, None)
+
+            filler.timeout.connect(add_chunk)
+            filler.start(0)
+
+    def create_figure_search(self, category_combo, figure_combo):
+        search = QLineEdit()
+        search.setPlaceholderText("Search all figures...")
+        search.setClearButtonEnabled(True)
+        completer = QCompleter(QStringListModel(search), search)
+        # Results arrive ranked from the index, so the completer must not filter or re-sort them
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.setMaxVisibleItems(SEARCH_RESULT_LIMIT)
+        search.setCompleter(completer)
+        matches = {}
+
+        def update_results(text):
+            matches.clear()
+            for figure, category in self.search_index.search(text, SEARCH_RESULT_LIMIT):
+                label = f"{figure}  ({category})" if figure is not None else f"Category: {category}"
+                matches[label] = (figure, category)
+            completer.model().setStringList(list(matches))
+            if matches:
+                completer.complete()
+
+        def select_result(label):
+            if label not in matches:
+                return
+            figure, category = matches[label]
+            category_combo.setCurrentText(category)
+            # Repopulate so the figure is loaded even if it sits past the first chunk
+            self.populate_combo(figure_combo, self.dictionary.figures(category), figure)
+            QTimer.singleShot(0, search.clear)
+
+        search.textEdited.connect(update_results)
+        completer.activated[str].connect(select_result)
+        return search
+
+    def rebuild_search_index(self):
+        # Index the dictionary a chunk at a time so large files don't freeze the window
+        self.search_index = FigureSearchIndex()
+        self.search_builder = self.search_index.build_steps(self.dictionary, SEARCH_BUILD_CHUNK)
+        for search in [self.figure_search, self.figure_search1, self.figure_search2]:
+            search.setPlaceholderText("Indexing figures...")
+        self.search_timer.start(0)
+
+    def _build_search_step(self):
+        if next(self.search_builder, None) is not None:
+            return
+        self.search_timer.stop()
+        self.search_builder = None
+        for search in [self.figure_search, self.figure_search1, self.figure_search2]:
+            search.setPlaceholderText("Search all figures...")
 
     def update_figure_combo(self, category):
-        self.figure_combo.clear()
-        self.figure_combo.addItems(sorted(self.categories.get(category, [])))
+        self.populate_combo(self.figure_combo, self.dictionary.figures(category))
 
     def update_figure_combo1(self, category):
-        self.figure_combo1.clear()
-        self.figure_combo1.addItems(sorted(self.categories.get(category, [])))
+        self.populate_combo(self.figure_combo1, self.dictionary.figures(category))
 
     def update_figure_combo2(self, category):
-        self.figure_combo2.clear()
-        self.figure_combo2.addItems(sorted(self.categories.get(category, [])))
+        self.populate_combo(self.figure_combo2, self.dictionary.figures(category))
 
     def start_conversation(self):
-        selected_figure = self.custom_figure.text().strip() or self.figure_combo.currentText()
-        self.current_figure = selected_figure
-        self.conversation_history = []
-        self.chat_display.clear()
-        self.chat_display.append(f"Starting conversation with {self.current_figure}")
-        self.get_llm_response("Please introduce yourself briefly.")
+        # Every conversation opens in a tab of its own, next to the ones already running
+        figure = self.selected_figure()
+        # Retrieve the figure prompt or use a default
+        figure_prompt = self.dictionary.prompt(figure)
+        history = ContextWindow(figure_prompt, self.context_budget(figure),
+                                {"user": "User", "assistant": figure})
+        journal = self._create_journal("single", {"figure": figure, "system": figure_prompt})
+        session = self.open_session_tab(figure, history, journal)
+        session.display.append_text(f"Starting conversation with {figure}")
+
+        # Use a pre-generated introduction when one is ready; each is used only once
+        intro = self.prefetched_intros.pop(figure, None)
+        if intro is not None:
+            history.append("user", INTRO_PROMPT)
+            self._journal_single_turn(session, "user", INTRO_PROMPT)
+            self._handle_single_response(session, intro, {"started": False, "generation": session.generation,
+                                                          "done": True})
+            return
+        self.get_llm_response(session, INTRO_PROMPT)
+
+    def open_session_tab(self, figure, history, journal=None):
+        display = TranscriptView()
+        session = ChatSession(figure, history, display, journal,
+                              self._memory_for(journal.path if journal is not None else None))
+        self.sessions[display] = session
+        self.session_tabs.setCurrentIndex(self.session_tabs.addTab(display, figure))
+        return session
+
+    def current_session(self):
+        return self.sessions.get(self.session_tabs.currentWidget())
+
+    def close_session(self, index):
+        display = self.session_tabs.widget(index)
+        session = self.sessions.pop(display, None)
+        if session is None:
+            return
+        # Close the session's running requests so the server can move on to the other sessions
+        session.generation += 1
+        self.executor.cancel_group(session.group)
+        self.executor.backends.unpin(session.group)
+        if session.journal is not None:
+            session.journal.close()
+        session.memory.close()
+        self.session_tabs.removeTab(index)
+        display.deleteLater()
+
+    def _update_session_tab(self, session):
+        index = self.session_tabs.indexOf(session.display)
+        if index >= 0:
+            self.session_tabs.setTabText(index, f"{session.figure} …" if session.in_flight else session.figure)
+        self._update_send_button()
+
+    def _update_send_button(self):
+        # A session takes its next message once the reply to the last one is in
+        session = self.current_session()
+        self.send_button.setEnabled(session is None or not session.in_flight)
+
+    def _intro_window(self, figure):
+        window = ContextWindow(self.dictionary.prompt(figure),
+                               self.context_budget(figure), {"user": "User", "assistant": figure})
+        window.append("user", INTRO_PROMPT)
+        return window
+
+    def start_intro_prefetch(self):
+        # Figures in the selected category come first, then the rest of the dictionary
+        self.prefetch_timer.stop()
+        self.prefetch_queue = deque()
+        if not self.prefetch_checkbox.isChecked():
+            return
+
+        seen = set(self.prefetched_intros) | self.prefetch_in_flight
+        candidates = itertools.chain(self.dictionary.figures(self.category_combo.currentText()),
+                                     self.dictionary.iter_figures())
+        for figure in candidates:
+            if figure not in seen:
+                seen.add(figure)
+                self.prefetch_queue.append(figure)
+                if len(self.prefetch_queue) + len(self.prefetched_intros) >= PREFETCH_LIMIT:
+                    break
+        if self.prefetch_queue:
+            self.prefetch_timer.start()
+
+    def cancel_intro_prefetch(self):
+        self.prefetch_timer.stop()
+        self.prefetch_queue = deque()
+        # Free the server for the request the user is about to make
+        self.executor.cancel_group("prefetch")
+        self.prefetch_in_flight = set()
+
+    def _tab_changed(self, index):
+        # Introductions are only useful on the Single Chat tab
+        if self.tabs.widget(index) is self.tab1:
+            self.start_intro_prefetch()
+        else:
+            self.cancel_intro_prefetch()
+
+    def _prefetch_next_intro(self):
+        # Stay out of the way: one prefetch at a time, and only when nothing else is queued or running
+        if self.prefetch_in_flight or self.executor.pending or self.executor.active:
+            return
+        if not self.prefetch_queue:
+            self.prefetch_timer.stop()
+            return
+
+        figure = self.prefetch_queue.popleft()
+        window = self._intro_window(figure)
+        self.prefetch_in_flight.add(figure)
+
+        def store_intro(response):
+            self.prefetch_in_flight.discard(figure)
+            self.prefetched_intros[figure] = response
+
+        model = self.chat_model()
+        builder = self.payload_builder_for(model)
+        job_id = self.executor.submit(builder.build(window),
+                                      on_finished=store_intro,
+                                      on_error=lambda error: self.prefetch_in_flight.discard(figure),
+                                      cache_key=builder.cache_key(window), group="prefetch",
+                                      deadline=self.request_deadline(), model=model, priority=PRIORITY_PREFETCH)
+        if job_id is None:
+            self.prefetch_in_flight.discard(figure)
 
     def start_dual_conversation(self):
         # Get selected figures
@@ -370,22 +2500,42 @@ class LMStudioChat(QMainWindow):
         # Get context
         self.context = self.context_input.toPlainText().strip()
 
+        journal = self._create_journal("dual", {"figure1": self.figure1, "figure2": self.figure2,
+                                                "context": self.context})
+        self._begin_dual_conversation(self.figure1, self.figure2, self.context, journal)
+
+        # Start the conversation with an initial message from figure1
+        self._send_dual_message(initiator=self.figure1, responder=self.figure2)
+
+    def _begin_dual_conversation(self, figure1, figure2, context, journal):
+        self.figure1 = figure1
+        self.figure2 = figure2
+        self.context = context
+        if self.dual_journal is not None:
+            self.dual_journal.close()
+        self.dual_journal = journal
+        self.dual_memory.close()
+        self.dual_memory = self._memory_for(journal.path if journal is not None else None)
+
         # Initialize conversation parameters
+        self._new_dual_generation()
         self.conversation_active = True
-        self.history1 = [{
-            "role": "system",
-            "content": f"You are {self.figure1}. Engage in a natural conversation with {self.figure2} about the following context: {self.context}. "
-                       f"Maintain your perspective and personality. Respond directly to the last message."
-        }]
-        self.history2 = [{
-            "role": "system",
-            "content": f"You are {self.figure2}. Engage in a natural conversation with {self.figure1} about the following context: {self.context}. "
-                       f"Maintain your perspective and personality. Respond directly to the last message."
-        }]
+        self.history1, self.history2 = new_dual_histories(self.figure1, self.figure2, self.context,
+                                                          self.context_budget(self.figure1),
+                                                          self.context_budget(self.figure2))
+        # Each speaker keeps its own server, since each has its own history and may use its own model
+        self.executor.backends.unpin("dual:1")
+        self.executor.backends.unpin("dual:2")
     
-        # Clear the dual conversation log and initialize counter for ordering
-        self.dual_conversation_log = []
-        self.message_counter = 0  # Track message order
+        # The histories' shared store is the conversation log; message order is its sequence
+        self.dual_messages = self.history1.store
+
+        # Fresh pacing state for this conversation
+        self.reveal_timer.stop()
+        self.pending_reveals = deque()
+        self.dual_next_pair = None
+        self.turn_scheduler = TurnScheduler(self.reading_speed_spin.value(), self.fast_mode_checkbox.isChecked())
+        self.pacing_saved_label.setText("")
         
         # Define colors for each speaker
         self.figure1_color = QColor(0, 0, 255)  # Blue for figure1
@@ -394,137 +2544,187 @@ class LMStudioChat(QMainWindow):
         # Clear conversation display and show header
         self.dual_chat_display.clear()
         self.dual_chat_display.append("<h2>Conversation</h2>")
-        self.dual_chat_display.append(f"<b>Context:</b> {self.context}")
+        self.dual_chat_display.append(f"<b>Context:</b> {html_lib.escape(self.context)}")
         self.dual_chat_display.append("<hr>")
 
-        # Start the conversation with an initial message from figure1
-        self._send_dual_message(initiator=self.figure1, responder=self.figure2)
-
     def _send_dual_message(self, initiator, responder):
         if not self.conversation_active:
             return
 
-        # Determine which history to use
-        history = self.history1 if initiator == self.figure1 else self.history2
+        # Determine which history and model to use
+        speaker = 1 if initiator == self.figure1 else 2
+        history = self.history1 if speaker == 1 else self.history2
+        model = self.speaker_model(self.model_combo1 if speaker == 1 else self.model_combo2)
+        builder = self.payload_builder_for(model)
 
-        # Create worker thread for API call
-        thread = QThread()
-        worker = ApiWorker(self.api_url, {
-            "model": "default",
-            "messages": history,
-            "temperature": 0.7,
-            "max_tokens": 500
-        })
-        
-        # Keep reference to avoid garbage collection
-        self.threads.append(thread)
-        self.workers.append(worker)
-        
-        # Move worker to thread
-        worker.moveToThread(thread)
-        
-        # Connect signals
-        thread.started.connect(worker.run)
-        worker.finished.connect(lambda response: self._handle_dual_response(response, initiator, responder, history))
-        worker.error.connect(self.handle_dual_error)
-        worker.finished.connect(thread.quit)
-        worker.error.connect(thread.quit)
-        thread.finished.connect(lambda: self._cleanup_thread(thread, worker))
-        
-        # Start thread
-        thread.start()
+        # Earlier turns relevant to the latest message come along with it, once the store has some
+        generation = self.dual_generation
+        store = self.dual_messages
 
-    def _handle_dual_response(self, response_data, initiator, responder, history):
-        if not self.conversation_active:
+        def submit(recalled):
+            if self.conversation_active and generation == self.dual_generation:
+                self._submit_dual_message(initiator, responder, speaker, history, model, builder, recalled)
+
+        last = len(store) - 1
+        self._recall(self.dual_memory, store.contents[last] if last >= 0 else "", last, history.start,
+                     "dual", submit)
+
+    def _submit_dual_message(self, initiator, responder, speaker, history, model, builder, recalled):
+        # Submit the API call to the shared executor
+        stream = self.dual_stream_checkbox.isChecked()
+        stream_state = {"started": False, "submitted": time.monotonic(), "generation": self.dual_generation}
+        payload = builder.build(history, stream, recalled)
+        job_id = self.executor.submit(payload, stream=stream,
+            on_finished=lambda response: self._handle_dual_response(response, initiator, responder, history,
+                                                                     stream_state),
+            on_error=lambda error: self.handle_dual_error(error, stream_state),
+            on_partial=lambda text: self._handle_dual_partial(text, initiator, stream_state),
+            cache_key=builder.cache_key(history, recalled), pin=self.conversation_pin(f"dual:{speaker}"),
+            group="dual", deadline=self.request_deadline(), model=model)
+        if job_id is None:
+            self.handle_dual_error("Request queue is full. Try again later or raise the queue depth.")
+
+    def _handle_dual_partial(self, text, initiator, stream_state):
+        if not self.conversation_active or stream_state["generation"] != self.dual_generation:
+            return
+
+        # Tokens only stream live when the reader has caught up; otherwise the
+        # whole reply is revealed once its turn comes up
+        if stream_state.get("buffered"):
+            return
+        if not stream_state["started"]:
+            if self.pending_reveals or self.turn_scheduler.reveal_delay() > 0:
+                stream_state["buffered"] = True
+                return
+            stream_state["started"] = True
+            color = self.figure1_color if initiator == self.figure1 else self.figure2_color
+            name = html_lib.escape(initiator)
+            self.dual_chat_display.append(f"<b><font color='{color.name()}'>{name}:</font></b><br>")
+        self.dual_chat_display.append_to_last(text)
+
+    def _handle_dual_response(self, response_data, initiator, responder, history, stream_state):
+        if not self.conversation_active or stream_state["generation"] != self.dual_generation:
             return
         
         llm_response = response_data["choices"][0]["message"]["content"]
         timestamp = time.time()
+        self.record_prompt_cache(response_data)
+        self.turn_scheduler.record_generation(time.monotonic() - stream_state["submitted"])
     
-        # Increment message counter to ensure chronological order
-        self.message_counter += 1
-
-        # Update histories with timestamp
-        history.append({"role": "assistant", "content": llm_response, "timestamp": timestamp})
-        # Add to the other figure's history as a user message
-        (self.history2 if initiator == self.figure1 else self.history1).append(
-            {"role": "user", "content": llm_response, "timestamp": timestamp})
-        
-        # Add to dual conversation log with sequence number for guaranteed ordering
-        self.dual_conversation_log.append({
-            "speaker": initiator,
-            "content": llm_response,
-            "timestamp": timestamp,
-            "sequence": self.message_counter
-        })
-
-        # Format and add the message to the display
-        color = self.figure1_color if initiator == self.figure1 else self.figure2_color
-        formatted_text = f"<p><b><font color='{color.name()}'>{initiator}:</font></b><br>{llm_response}</p>"
+        # Store the reply once; the other figure's history sees it as a user message
+        other_history = self.history2 if initiator == self.figure1 else self.history1
+        commit_dual_turn(history, llm_response, timestamp)
+        self.dual_memory.add(initiator, llm_response)
+        self._summarize_context(history)
+        self._summarize_context(other_history)
+
+        if self.dual_journal is not None:
+            self.dual_journal.append({"type": "turn", "speaker": initiator, "content": llm_response,
+                                      "sequence": len(self.dual_messages), "timestamp": timestamp})
+
+        # Queue the message for display, unless it was already streamed in
+        if stream_state["started"]:
+            self.turn_scheduler.message_shown(llm_response)
+            self._update_pacing_saved()
+        else:
+            self.pending_reveals.append((initiator, llm_response))
+            self._schedule_reveal()
+
+        # Pipeline the next turn right away, staying at most one undisplayed reply ahead
+        if len(self.pending_reveals) <= 1:
+            self._send_dual_message(responder, initiator)
+        else:
+            self.dual_next_pair = (responder, initiator)
+
+    def _display_dual_message(self, speaker, text):
+        color = self.figure1_color if speaker == self.figure1 else self.figure2_color
+        # Model text is escaped the same way append_to_last() escapes streamed tokens
+        text = html_lib.escape(text).replace("\n", "<br>")
+        formatted_text = f"<p><b><font color='{color.name()}'>{html_lib.escape(speaker)}:</font></b><br>{text}</p>"
         self.dual_chat_display.append(formatted_text)
-        self.dual_chat_display.verticalScrollBar().setValue(self.dual_chat_display.verticalScrollBar().maximum())
 
-        # Continue conversation after a brief delay
-        QTimer.singleShot(2500, lambda: self._send_dual_message(responder, initiator))
+    def _schedule_reveal(self):
+        if self.pending_reveals and not self.reveal_timer.isActive():
+            self.reveal_timer.start(int(self.turn_scheduler.reveal_delay() * 1000))
+
+    def _reveal_next_turn(self):
+        if not self.pending_reveals:
+            return
+        speaker, text = self.pending_reveals.popleft()
+        self._display_dual_message(speaker, text)
+        self.turn_scheduler.message_shown(text)
+        self._update_pacing_saved()
+
+        # A turn held back by the lookahead limit can go out now
+        if self.dual_next_pair and len(self.pending_reveals) <= 1:
+            initiator, responder = self.dual_next_pair
+            self.dual_next_pair = None
+            self._send_dual_message(initiator, responder)
+        self._schedule_reveal()
 
-    def _cleanup_thread(self, thread, worker):
-        # Remove references to allow garbage collection
-        if thread in self.threads:
-            self.threads.remove(thread)
-        if worker in self.workers:
-            self.workers.remove(worker)
+    def _update_pacing_saved(self):
+        saved = self.turn_scheduler.saved_seconds()
+        self.pacing_saved_label.setText(f"Saved {saved:.1f}s vs. fixed {self.turn_scheduler.fixed_delay:g}s delay")
 
-    def handle_dual_error(self, error_msg):
-        self.dual_chat_display.append(f"<p style='color: red;'>{error_msg}</p>")
+    def update_turn_pacing(self):
+        self.turn_scheduler.fast_mode = self.fast_mode_checkbox.isChecked()
+        self.turn_scheduler.words_per_minute = self.reading_speed_spin.value()
+        # Re-arm the reveal timer against the new pace
+        self.reveal_timer.stop()
+        self._schedule_reveal()
+
+    def handle_dual_error(self, error_msg, stream_state=None):
+        if stream_state is not None and stream_state["generation"] != self.dual_generation:
+            return
+        self.dual_chat_display.append(f"<p style='color: red;'>{html_lib.escape(error_msg)}</p>")
         self.stop_dual_conversation()
 
+    def _new_dual_generation(self):
+        # Close any request still running for the previous conversation
+        self.executor.cancel_group("dual")
+        self.dual_generation += 1
+
     def stop_dual_conversation(self):
+        self._new_dual_generation()
         self.conversation_active = False
+        # Replies already committed to the log are shown before stopping
+        self.reveal_timer.stop()
+        self.dual_next_pair = None
+        while self.pending_reveals:
+            self._display_dual_message(*self.pending_reveals.popleft())
         self.dual_chat_display.append("<p><b>Conversation stopped.</b></p>")
 
     def save_dual_conversation(self):
-        options = QFileDialog.Options()
-        file_name, _ = QFileDialog.getSaveFileName(self, "Save Conversation", "", "Text Files (*.txt)", options=options)
-        if file_name:
-            try:
-                with open(file_name, 'w', encoding='utf-8') as f:
-                    f.write(f"Conversation between {self.figure1} and {self.figure2}\n")
-                    f.write(f"Context: {self.context}\n\n")
-            
-                    # Sort the conversation log by sequence number
-                    sorted_log = sorted(self.dual_conversation_log, key=lambda x: x.get('sequence', x['timestamp']))
-            
-                    # Write the conversation in chronological order
-                    for entry in sorted_log:
-                        f.write(f"{entry['speaker']}: {entry['content']}\n\n")
-                    
-                QMessageBox.information(self, "Success", "Conversation saved successfully!")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to save conversation: {str(e)}")
+        if self.dual_journal is None:
+            QMessageBox.information(self, "Nothing to Save", "Start or resume a conversation first.")
+            return
+        # Exported from the journal, which is already in chronological order
+        self.export_journals("Save Conversation", [self.dual_journal.path])
 
     def send_message(self):
-        if not self.current_figure:
-            self.chat_display.append("Please select a figure first.")
+        session = self.current_session()
+        if session is None:
+            self.statusBar().showMessage("Please select a figure first.", 5000)
+            return
+        if session.in_flight:
             return
 
         user_message = self.user_input.toPlainText().strip()
         if not user_message:
             return
 
-        self.chat_display.append(f"You: {user_message}")
+        session.display.append_text(f"You: {user_message}")
         self.user_input.clear()
-        self.get_llm_response(user_message)
+        self.get_llm_response(session, user_message)
 
     def load_dictionary(self, path):
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return FigureDictionary.open(path)
         except FileNotFoundError:
             QMessageBox.critical(self, "Error", f"Dictionary file not found at {path}")
-            return {}
         except json.JSONDecodeError:
             QMessageBox.critical(self, "Error", f"Invalid JSON format in dictionary file at {path}")
-            return {}
+        return FigureDictionary.from_categories({})
 
     def save_dictionary(self, path, data):
         try:
@@ -533,65 +2733,91 @@ class LMStudioChat(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to save dictionary file: {str(e)}")
 
-    def get_llm_response(self, prompt):
-        if not self.current_figure:
-            self.chat_display.append("No figure selected. Please select a figure to start a conversation.")
+    def get_llm_response(self, session, prompt):
+        # The prompt joins the history only once its request can be queued, so a full queue
+        # leaves the history, and the turns the prompt would push out of it, as they were
+        if self.executor.queue_full():
+            self._single_queue_full(session)
             return
-    
-        # Retrieve the figure prompt or use a default
-        figure_prompt = self.figure_prompts.get(self.current_figure, f"You are {self.current_figure}.")
-    
-        # System prompt
-        system_prompt = {"role": "system", "content": figure_prompt}
-    
-        # Include the user's prompt
-        user_prompt = {"role": "user", "content": prompt, "timestamp": time.time()}
-    
-        # Append the prompts to the conversation history
-        self.conversation_history.append(user_prompt)
-    
-        # Prepare the messages payload for the API request
-        messages = [system_prompt] + self.conversation_history
-        
-        # Create and run the worker in a separate thread
-        thread = QThread()
-        worker = ApiWorker(self.api_url, {
-            "model": "default", 
-            "messages": messages, 
-            "temperature": 0.7, 
-            "max_tokens": 500
-        })
-        
-        # Keep references
-        self.threads.append(thread)
-        self.workers.append(worker)
-        
-        # Setup the worker
-        worker.moveToThread(thread)
-        thread.started.connect(worker.run)
-        worker.finished.connect(lambda response: self._handle_single_response(response))
-        worker.error.connect(lambda error: self.chat_display.append(error))
-        worker.finished.connect(thread.quit)
-        worker.error.connect(thread.quit)
-        thread.finished.connect(lambda: self._cleanup_thread(thread, worker))
-        
-        # Start thread
-        thread.start()
+        session.in_flight += 1
+        self._update_session_tab(session)
+
+        # Turns that have left the context window can be recalled; the prompt isn't in memory yet
+        generation = session.generation
 
-    def _handle_single_response(self, response_data):
+        def submit(recalled):
+            if generation == session.generation:
+                self._submit_single_message(session, prompt, recalled)
+
+        self._recall(session.memory, prompt, None, len(session.memory) - len(session.history),
+                     session.group, submit)
+
+    def _single_queue_full(self, session):
+        session.display.append_text("Request queue is full. Try again later or raise the queue depth.")
+
+    def _submit_single_message(self, session, prompt, recalled):
+        # Submit the request to the shared executor; sessions take turns in its queue. Recall may
+        # have taken a while, so the queue is checked again before the prompt is added.
+        history = session.history
+        if self.executor.queue_full():
+            session.in_flight -= 1
+            self._update_session_tab(session)
+            self._single_queue_full(session)
+            return
+        history.append("user", prompt)
+        stream = self.stream_checkbox.isChecked()
+        stream_state = {"started": False, "generation": session.generation}
+        model = self.chat_model()
+        builder = self.payload_builder_for(model)
+        payload = builder.build(history, stream, recalled)
+        self.executor.submit(payload, stream=stream,
+            on_finished=lambda response: self._handle_single_response(session, response, stream_state),
+            on_error=lambda error: self._handle_single_error(session, error, stream_state),
+            on_partial=lambda text: self._handle_single_partial(session, text, stream_state),
+            cache_key=builder.cache_key(history, recalled), pin=self.conversation_pin(session.group),
+            group=session.group, deadline=self.request_deadline(), model=model, priority=PRIORITY_CHAT)
+        self._journal_single_turn(session, "user", prompt)
+
+    def _journal_single_turn(self, session, role, content):
+        if session.journal is not None:
+            session.journal.append({"type": "turn", "role": role, "content": content,
+                                    "timestamp": session.history.timestamps[-1]})
+        session.memory.add("User" if role == "user" else session.figure, content)
+
+    def _single_request_done(self, session, stream_state):
+        # Returns whether the reply still belongs to the open session
+        if not stream_state.get("done"):
+            stream_state["done"] = True
+            session.in_flight -= 1
+            self._update_session_tab(session)
+        return stream_state["generation"] == session.generation
+
+    def _handle_single_error(self, session, error, stream_state):
+        if self._single_request_done(session, stream_state):
+            session.display.append_text(error)
+
+    def _handle_single_partial(self, session, text, stream_state):
+        if stream_state["generation"] != session.generation:
+            return
+        if not stream_state["started"]:
+            stream_state["started"] = True
+            session.display.append_text(f"{session.figure}: ")
+        session.display.append_to_last(text)
+
+    def _handle_single_response(self, session, response_data, stream_state):
+        if not self._single_request_done(session, stream_state):
+            return
         llm_response = response_data["choices"][0]["message"]["content"]
-        timestamp = time.time()
+        self.record_prompt_cache(response_data)
         
-        # Append the LLM's response to the conversation history with timestamp
-        self.conversation_history.append({
-            "role": "assistant", 
-            "content": llm_response,
-            "timestamp": timestamp
-        })
+        # Append the LLM's response to the conversation history
+        session.history.append("assistant", llm_response)
+        self._journal_single_turn(session, "assistant", llm_response)
+        self._summarize_context(session.history)
         
-        # Display the response in the chat display
-        self.chat_display.append(f"{self.current_figure}: {llm_response}")
-        self.chat_display.verticalScrollBar().setValue(self.chat_display.verticalScrollBar().maximum())
+        # Display the response in the chat display, unless it was already streamed in
+        if not stream_state["started"]:
+            session.display.append_text(f"{session.figure}: {llm_response}")
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
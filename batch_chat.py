@@ -0,0 +1,147 @@
+import sys
+import json
+import time
+import argparse
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, ALL_COMPLETED, wait
+from chat_core import PayloadBuilder, FigureDictionary, new_dual_histories, commit_dual_turn
+from chat_client import ChatClient
+
+DEFAULT_API_URL = "http://localhost:1234/v1/chat/completions"
+
+# Each worker thread keeps its own client, and with it a keep-alive session
+thread_state = threading.local()
+
+
+def get_client(api_url, builder, timeout):
+    if not hasattr(thread_state, "client"):
+        thread_state.client = ChatClient(api_url, timeout=timeout, builder=builder)
+    return thread_state.client
+
+
+def generate_pairings(dictionary, selected=None, across=False):
+    names = selected or dictionary.category_names()
+    if across:
+        # Every pair of distinct figures drawn from all selected categories
+        figures = sorted({figure for name in names for figure in dictionary.figures(name)})
+        for figure1, figure2 in itertools.combinations(figures, 2):
+            yield "", figure1, figure2
+        return
+
+    for name in names:
+        for figure1, figure2 in itertools.combinations(dictionary.figures(name), 2):
+            yield name, figure1, figure2
+
+
+def read_pairings(path):
+    # One "Figure 1|Figure 2" pairing per line
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                figure1, figure2 = [part.strip() for part in line.split("|", 1)]
+                yield "", figure1, figure2
+
+
+def run_conversation(api_url, builder, category, figure1, figure2, context, turns, budget, timeout):
+    history1, history2 = new_dual_histories(figure1, figure2, context, budget)
+    record = {"category": category, "figure1": figure1, "figure2": figure2, "context": context, "turns": []}
+    started = time.monotonic()
+    speakers = [(history1, history2), (history2, history1)]
+
+    try:
+        for sequence in range(1, turns + 1):
+            history, other_history = speakers[(sequence - 1) % 2]
+            response = get_client(api_url, builder, timeout).complete(history)
+            content = response["choices"][0]["message"]["content"]
+
+            commit_dual_turn(history, content)
+            # No background summaries here; trimmed turns are simply dropped
+            history.take_evicted()
+            other_history.take_evicted()
+    except Exception as e:
+        record["error"] = str(e)
+
+    # Turns are kept once in the histories' shared store until the record is written
+    record["turns"] = [{"speaker": turn["speaker"], "content": turn["content"], "sequence": turn["sequence"]}
+                       for turn in history1.store.records()]
+
+    record["elapsed"] = round(time.monotonic() - started, 3)
+    return record
+
+
+def run_batch(pairings, output, api_url=DEFAULT_API_URL, context="", turns=10, concurrency=4,
+              budget=4096, timeout=300, builder=None, on_record=None):
+    builder = builder or PayloadBuilder()
+    completed = failed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = set()
+
+        def drain(return_when):
+            nonlocal completed, failed, in_flight
+            done, in_flight = wait(in_flight, return_when=return_when)
+            for future in done:
+                record = future.result()
+                # Each conversation is written as soon as it finishes
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                completed += 1
+                failed += "error" in record
+                if on_record:
+                    on_record(record)
+
+        # Pairings are consumed lazily so huge generators never sit in memory
+        for category, figure1, figure2 in pairings:
+            if len(in_flight) >= concurrency:
+                drain(FIRST_COMPLETED)
+            in_flight.add(pool.submit(run_conversation, api_url, builder, category, figure1, figure2,
+                                      context, turns, budget, timeout))
+        if in_flight:
+            drain(ALL_COMPLETED)
+
+    return completed, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run dual conversations headlessly and write them as JSONL.")
+    parser.add_argument("dictionary", help="Dictionary JSON file (category -> list of figures)")
+    parser.add_argument("-o", "--output", default="-", help="Output JSONL file, or - for stdout")
+    parser.add_argument("-c", "--category", action="append", help="Only pair figures from this category "
+                                                                  "(repeatable; default: all categories)")
+    parser.add_argument("--across", action="store_true", help="Pair figures across the selected categories")
+    parser.add_argument("--pairs", help="File with one 'Figure 1|Figure 2' pairing per line")
+    parser.add_argument("--limit", type=int, help="Stop after this many pairings")
+    parser.add_argument("--context", default="", help="Initial context for every conversation")
+    parser.add_argument("--turns", type=int, default=10, help="Messages per conversation")
+    parser.add_argument("--concurrency", type=int, default=4, help="Conversations in flight at once")
+    parser.add_argument("--budget", type=int, default=4096, help="Context budget per figure in tokens")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--url", default=DEFAULT_API_URL, help="Chat completions endpoint")
+    args = parser.parse_args(argv)
+
+    if args.pairs:
+        pairings = read_pairings(args.pairs)
+    else:
+        pairings = generate_pairings(FigureDictionary.open(args.dictionary), args.category, args.across)
+    if args.limit:
+        pairings = itertools.islice(pairings, args.limit)
+
+    def report(record):
+        status = f"failed: {record['error']}" if "error" in record else f"{len(record['turns'])} turns"
+        print(f"{record['figure1']} / {record['figure2']}: {status} ({record['elapsed']}s)", file=sys.stderr)
+
+    output = sys.stdout if args.output == "-" else open(args.output, 'a', encoding='utf-8')
+    try:
+        completed, failed = run_batch(pairings, output, args.url, args.context, args.turns,
+                                      args.concurrency, args.budget, args.timeout, on_record=report)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"Finished {completed} conversations, {failed} failed.", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,374 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import importlib.util
+import requests
+from chat_core import (ContextWindow, PayloadBuilder, FigureDictionary, SessionJournal, new_dual_histories,
+                       commit_dual_turn, percentile)
+from chat_client import StreamAccumulator, iter_chunks
+from chat_export import export_transcripts
+from mock_server import MockServer, WORDS
+
+GUI_MODULE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "LM Studio Chat.py")
+
+# Metrics where a larger value is an improvement; everything else is a time or a size
+HIGHER_IS_BETTER = ("tokens_per_s",)
+
+# Run in a fresh interpreter so nothing is imported beforehand. Prints seconds from the start to
+# chat_core imported, to the GUI module imported, to the window's first paint, and to the end of
+# its deferred startup work (a first run: the dictionary is written, then loaded)
+STARTUP_PROBE = '''
+import os, sys, json, time, importlib.util
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+started = time.perf_counter()
+import chat_core
+core_imported = time.perf_counter()
+spec = importlib.util.spec_from_file_location("lm_studio_chat", sys.argv[1])
+gui = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(gui)
+gui_imported = time.perf_counter()
+app = gui.QApplication([])
+painted = []
+
+class PaintWatcher(gui.QObject):
+    def eventFilter(self, watched, event):
+        if event.type() == event.Paint and not painted:
+            painted.append(time.perf_counter())
+        return False
+
+window = gui.LMStudioChat()
+window.current_dict_path = sys.argv[2]
+watcher = PaintWatcher()
+window.installEventFilter(watcher)
+window.show()
+while not painted or not window.startup_finished:
+    app.processEvents()
+ready = time.perf_counter()
+print(json.dumps({"core_import": core_imported - started, "gui_import": gui_imported - core_imported,
+                  "window": painted[0] - started, "ready": ready - started}))
+window.close()
+'''
+
+
+def summarize(results, name, values, scale=1.0):
+    # p50/p95 of one measurement, stored as flat "name.p50" keys
+    results[f"{name}.p50"] = round(percentile(values, 0.5) * scale, 3)
+    results[f"{name}.p95"] = round(percentile(values, 0.95) * scale, 3)
+
+
+def read_stream(response):
+    # Returns (time to first token, completion tokens reported by the server, reply text)
+    first_token = None
+    accumulator = StreamAccumulator()
+    for chunk in iter_chunks(response):
+        if accumulator.feed(chunk) and first_token is None:
+            first_token = time.monotonic()
+    completion_tokens = accumulator.usage["completion_tokens"] if accumulator.usage else 0
+    return first_token, completion_tokens, "".join(accumulator.parts)
+
+
+def check_reply(content):
+    # The mock replies with words from its list, some of them non-ASCII; anything else was mangled
+    # on the way, most likely decoded with the wrong charset
+    unknown = set(content.split()) - set(WORDS)
+    if unknown:
+        raise ValueError(f"Reply did not come through intact: {sorted(unknown)[:3]}")
+
+
+def bench_http(server, turns, stream, results, prefix):
+    # Raw request path: payload building plus one keep-alive session, no GUI
+    session = requests.Session()
+    builder = PayloadBuilder()
+    window = ContextWindow("You are now roleplaying as Albert Einstein.", 4096,
+                           {"user": "User", "assistant": "Albert Einstein"})
+    build_times, ttfts, totals, overheads, rates = [], [], [], [], []
+    server.reset_stats()
+
+    for turn in range(turns):
+        window.append("user", f"Question number {turn}: what are you working on?")
+        started = time.monotonic()
+        payload = builder.build(window, stream)
+        build_times.append(time.monotonic() - started)
+
+        response = session.post(server.url, data=payload, headers={"Content-Type": "application/json"},
+                                stream=stream)
+        if stream:
+            first_token, completion_tokens, content = read_stream(response)
+            ttfts.append(first_token - started)
+        else:
+            body = response.json()
+            completion_tokens = body["usage"]["completion_tokens"]
+            content = body["choices"][0]["message"]["content"]
+        total = time.monotonic() - started
+        response.close()
+        check_reply(content)
+
+        window.append("assistant", content)
+        window.take_evicted()
+        totals.append(total)
+        overheads.append(total - server.busy_times[-1])
+        rates.append(completion_tokens / total)
+
+    session.close()
+    summarize(results, f"{prefix}.build_ms", build_times, 1000)
+    summarize(results, f"{prefix}.total_ms", totals, 1000)
+    summarize(results, f"{prefix}.overhead_ms", overheads, 1000)
+    if ttfts:
+        summarize(results, f"{prefix}.ttft_ms", ttfts, 1000)
+    results[f"{prefix}.tokens_per_s"] = round(sum(rates) / len(rates), 1)
+
+
+def bench_payloads(turns, results):
+    # Context and payload bookkeeping for a dual conversation, isolated from the network
+    builder = PayloadBuilder()
+    history1, history2 = new_dual_histories("Albert Einstein", "Isaac Newton", "Gravity", 4096)
+    reply = " ".join(["word"] * 60)
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    build_times = []
+    speakers = [(history1, history2), (history2, history1)]
+    for turn in range(turns):
+        history, other_history = speakers[turn % 2]
+        started = time.monotonic()
+        builder.build(history)
+        build_times.append(time.monotonic() - started)
+        commit_dual_turn(history, reply)
+        history.take_evicted()
+        other_history.take_evicted()
+    growth = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(baseline, "filename"))
+    tracemalloc.stop()
+    summarize(results, "core.dual_build_ms", build_times, 1000)
+    results["core.memory_growth_kb"] = round(growth / 1024, 1)
+
+
+def bench_dictionary(figures, results):
+    categories = 100
+    per_category = max(1, figures // categories)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({f"Category {c}": [f"Figure {c}-{i}" for i in range(per_category)]
+                       for c in range(categories)}, f)
+
+        started = time.monotonic()
+        FigureDictionary.open(path).close()
+        results["dictionary.first_load_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+        started = time.monotonic()
+        dictionary = FigureDictionary.open(path)
+        results["dictionary.indexed_load_ms"] = round((time.monotonic() - started) * 1000, 1)
+
+        started = time.monotonic()
+        dictionary.figures("Category 50")
+        results["dictionary.category_ms"] = round((time.monotonic() - started) * 1000, 3)
+        dictionary.close()
+
+
+def bench_export(conversations, turns, results):
+    # Peak memory should stay the same however many conversations are exported
+    reply = " ".join(["word"] * 60)
+    with tempfile.TemporaryDirectory() as directory:
+        sessions = os.path.join(directory, "sessions")
+        for _ in range(conversations):
+            journal = SessionJournal.create(sessions, "dual", {"figure1": "Albert Einstein",
+                                                               "figure2": "Isaac Newton", "context": "Gravity"})
+            for sequence in range(1, turns + 1):
+                journal.append({"type": "turn", "speaker": "Albert Einstein" if sequence % 2 else "Isaac Newton",
+                                "content": reply, "sequence": sequence, "timestamp": time.time()})
+            journal.file.close()
+
+        for fmt, name in (("jsonl", "export.jsonl.gz"), ("openai", "export.openai.jsonl")):
+            tracemalloc.start()
+            started = time.monotonic()
+            export_transcripts([sessions], os.path.join(directory, name), fmt)
+            elapsed = time.monotonic() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[f"export.{fmt}_ms"] = round(elapsed * 1000, 1)
+            results[f"export.{fmt}_peak_kb"] = round(peak / 1024, 1)
+
+
+def load_gui_module():
+    # The GUI script's file name has a space, so it is loaded by path
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    spec = importlib.util.spec_from_file_location("lm_studio_chat", GUI_MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def wait_until(app, condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Benchmark flow did not finish in time")
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def bench_gui(server, turns, stream, results, timeout):
+    gui = load_gui_module()
+    app = gui.QApplication.instance() or gui.QApplication([])
+    with tempfile.TemporaryDirectory() as directory:
+        window = gui.LMStudioChat()
+        window.sessions_dir = directory
+        # Measure steady-state turns: model discovery and the warm-up request finish first
+        warmed = []
+        window.executor.model_warmed.connect(lambda *args: warmed.append(args))
+        window.executor.set_backends([server.url])
+        wait_until(app, lambda: warmed, timeout)
+        window.prefetch_checkbox.setChecked(False)
+        window.cancel_intro_prefetch()
+        window.stream_checkbox.setChecked(stream)
+        window.dual_stream_checkbox.setChecked(stream)
+        window.fast_mode_checkbox.setChecked(True)
+        window.update_turn_pacing()
+
+        # Single chat: the introduction, then one user message per turn
+        server.reset_stats()
+        started = time.monotonic()
+        window.start_conversation()
+        history = window.current_session().history
+        wait_until(app, lambda: len(history) >= 2, timeout)
+        turn_times = []
+        for turn in range(turns):
+            expected = len(history) + 2
+            turn_started = time.monotonic()
+            window.user_input.setPlainText(f"Question number {turn}: what are you working on?")
+            window.send_message()
+            wait_until(app, lambda: len(history) >= expected, timeout)
+            turn_times.append(time.monotonic() - turn_started)
+            check_reply(history.last_message()["content"])
+        elapsed = time.monotonic() - started
+        overheads = [total - busy for total, busy in zip(turn_times, server.busy_times[1:])]
+        summarize(results, "gui.single.turn_ms", turn_times, 1000)
+        summarize(results, "gui.single.overhead_ms", overheads, 1000)
+        results["gui.single.wall_s"] = round(elapsed, 3)
+
+        # Dual chat: run until the requested number of messages has been generated
+        server.reset_stats()
+        tracemalloc.start()
+        baseline = tracemalloc.take_snapshot()
+        started = time.monotonic()
+        window.start_dual_conversation()
+        wait_until(app, lambda: len(window.dual_messages) >= turns, timeout)
+        elapsed = time.monotonic() - started
+        window.stop_dual_conversation()
+        app.processEvents()
+        growth = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(baseline, "filename"))
+        tracemalloc.stop()
+        busy = sum(server.busy_times[:turns])
+        results["gui.dual.turn_ms"] = round(elapsed / turns * 1000, 3)
+        results["gui.dual.overhead_ms"] = round((elapsed - busy) / turns * 1000, 3)
+        results["gui.dual.memory_growth_kb"] = round(growth / 1024, 1)
+
+        window.close()
+        app.processEvents()
+
+
+def bench_startup(runs, results, timeout):
+    samples = {"core_import": [], "gui_import": [], "window": [], "ready": []}
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as directory:
+            output = subprocess.run([sys.executable, "-c", STARTUP_PROBE, GUI_MODULE_PATH,
+                                     os.path.join(directory, "FamousPeople.dict")],
+                                    cwd=os.path.dirname(GUI_MODULE_PATH), capture_output=True, text=True,
+                                    timeout=timeout, check=True).stdout
+        for name, seconds in json.loads(output.strip().splitlines()[-1]).items():
+            samples[name].append(seconds)
+    for name, values in samples.items():
+        summarize(results, f"startup.{name}_ms", values, 1000)
+
+
+def run_benchmarks(args):
+    results = {}
+    server = MockServer(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                        reply_tokens=args.reply_tokens).start()
+    try:
+        bench_http(server, args.turns, False, results, "http.blocking")
+        bench_http(server, args.turns, True, results, "http.stream")
+        bench_payloads(args.turns * 10, results)
+        if not args.no_gui:
+            bench_startup(args.startup_runs, results, args.timeout)
+            bench_gui(server, args.turns, not args.no_stream, results, args.timeout)
+    finally:
+        server.stop()
+    bench_dictionary(args.figures, results)
+    bench_export(args.export_conversations, args.turns * 10, results)
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta):
+    # Returns report lines and the names of metrics that got worse by more than the tolerance;
+    # differences below min_delta are treated as noise
+    lines = []
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if old is None:
+            lines.append(f"{name:40} {value:>12}  (new)")
+            continue
+        change = (value - old) / old if old else 0.0
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = ""
+        if worse > tolerance and abs(value - old) >= min_delta:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        lines.append(f"{name:40} {value:>12}  was {old:>12} ({change:+.0%}){flag}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the request path, GUI flows and dictionary "
+                                                 "loading against a local mock server.")
+    parser.add_argument("--turns", type=int, default=20, help="Turns per measured flow")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock server delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0, help="Mock server generation rate")
+    parser.add_argument("--reply-tokens", type=int, default=40, help="Tokens per mock reply")
+    parser.add_argument("--figures", type=int, default=100000, help="Figures in the generated dictionary")
+    parser.add_argument("--export-conversations", type=int, default=200,
+                        help="Saved sessions generated for the export benchmark")
+    parser.add_argument("--no-gui", action="store_true", help="Skip the headless GUI flows")
+    parser.add_argument("--no-stream", action="store_true", help="Run the GUI flows without streaming")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds allowed per GUI flow")
+    parser.add_argument("--startup-runs", type=int, default=5, help="Fresh interpreters started to time startup")
+    parser.add_argument("--baseline", help="Compare against a baseline JSON file")
+    parser.add_argument("--save-baseline", help="Write the results as a baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Relative slowdown reported as a regression")
+    parser.add_argument("--min-delta", type=float, default=0.5,
+                        help="Smallest absolute change (in the metric's unit) reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        lines, regressions = compare(results, baseline["results"], args.tolerance, args.min_delta)
+    else:
+        lines = [f"{name:40} {value:>12}" for name, value in results.items()]
+    print("\n".join(lines))
+
+    if args.save_baseline:
+        record = {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+                  "platform": platform.platform(), "settings": vars(args), "results": results}
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(record, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    if regressions:
+        print(f"{len(regressions)} metrics regressed beyond {args.tolerance:.0%}.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+import json
+import time
+import socket
+import itertools
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from chat_core import PayloadBuilder, BackendPool, RequestPolicy
+
+# HTTP side of the chat core: talking to OpenAI-compatible servers, with no Qt dependency.
+# It is a module of its own because requests takes longer to import than everything else,
+# so the GUI only loads it on the first thread that sends a request.
+
+# One-token request that makes a server load a model before the first real turn
+WARM_UP_PROMPT = "Hi"
+
+# Seconds the current thread spent opening TCP/TLS connections; reset by the caller per request
+connection_timing = threading.local()
+# Connection each thread is currently using, so another thread can abort it
+active_connections = {}
+
+
+class TimedConnectionMixin:
+    def connect(self):
+        started = time.monotonic()
+        super().connect()
+        connection_timing.seconds = getattr(connection_timing, "seconds", 0.0) + time.monotonic() - started
+
+    def request(self, *args, **kwargs):
+        active_connections[threading.get_ident()] = self
+        return super().request(*args, **kwargs)
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+# Transport adapter whose connections report how long they took to open and can be aborted
+class TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool,
+                                                   "https": TimedHTTPSConnectionPool}
+
+
+def new_session(timed=True):
+    # Keep-alive session; timed ones register their connections so abort_connection() can reach them
+    session = requests.Session()
+    if timed:
+        session.mount("http://", TimedAdapter())
+        session.mount("https://", TimedAdapter())
+    return session
+
+
+def abort_connection(thread_ident):
+    # Shutting the socket down makes the thread's blocked read fail at once, and the server
+    # sees the disconnect and stops generating
+    connection = active_connections.get(thread_ident)
+    if connection is not None and connection.sock is not None:
+        try:
+            connection.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def release_connection():
+    active_connections.pop(threading.get_ident(), None)
+
+
+def retriable(status_code):
+    # Server-side failures may succeed elsewhere; bad requests will fail everywhere
+    return status_code == 429 or status_code >= 500
+
+
+class RequestError(RuntimeError):
+    # retriable: the same request may succeed if sent again, here or to another server
+    def __init__(self, message, retriable=False):
+        super().__init__(message)
+        self.retriable = retriable
+
+
+def post(session, url, payload, stream=False, timeout=None):
+    # Prebuilt bodies from PayloadBuilder are sent byte-for-byte
+    if isinstance(payload, bytes):
+        return session.post(url, data=payload, headers={"Content-Type": "application/json"},
+                            stream=stream, timeout=timeout)
+    if stream:
+        payload = dict(payload, stream=True)
+    return session.post(url, json=payload, stream=stream, timeout=timeout)
+
+
+def iter_chunks(response):
+    # Server-sent events: only "data:" lines carry chunks, and "[DONE]" ends the stream. Lines stay
+    # bytes for json.loads: event streams are always UTF-8, but without a charset in the
+    # Content-Type requests would decode them as ISO-8859-1.
+    for line in response.iter_lines():
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return
+        yield json.loads(data)
+
+
+# Collects a streamed reply into a response shaped like the non-streaming API result
+class StreamAccumulator:
+    def __init__(self):
+        self.parts = []
+        self.usage = None
+        self.timings = None
+
+    def feed(self, chunk):
+        # Returns the chunk's text, if it carries any
+        self.usage = chunk.get("usage") or self.usage
+        self.timings = chunk.get("timings") or self.timings
+        choices = chunk.get("choices") or []
+        token = choices[0].get("delta", {}).get("content") if choices else None
+        if token:
+            self.parts.append(token)
+        return token
+
+    def result(self):
+        result = {"choices": [{"message": {"role": "assistant", "content": "".join(self.parts)}}]}
+        if self.usage:
+            result["usage"] = self.usage
+        if self.timings:
+            result["timings"] = self.timings
+        return result
+
+
+def probe_models(session, models_url, timeout):
+    # Returns (ok, error, model ids) for one server's /v1/models endpoint
+    try:
+        response = session.get(models_url, timeout=timeout)
+        if response.status_code != 200:
+            return False, f"HTTP {response.status_code}", []
+        return True, "", [model["id"] for model in response.json().get("data", []) if "id" in model]
+    except Exception as e:
+        return False, str(e), []
+
+
+def warm_up(session, chat_url, model, timeout):
+    # Returns an error message, empty on success
+    try:
+        response = session.post(chat_url, json={
+            "model": model,
+            "messages": [{"role": "user", "content": WARM_UP_PROMPT}],
+            "temperature": 0,
+            "max_tokens": 1
+        }, timeout=timeout)
+        return "" if response.status_code == 200 else f"HTTP {response.status_code}"
+    except Exception as e:
+        return str(e)
+    finally:
+        release_connection()
+
+
+# Blocking client for scripts: sends a ContextWindow (or any window from chat_core) to a server and
+# appends the reply to it. With several servers, requests are routed and retried the way the GUI's
+# executor does it, by the same BackendPool and RequestPolicy; hedging and queueing stay in the GUI.
+class ChatClient:
+    def __init__(self, url="http://localhost:1234/v1", model="default", timeout=300, builder=None,
+                 policy=None, cache=None):
+        # url: one server or a list of them. cache: optional ResponseCache consulted before sending.
+        self.backends = BackendPool([url] if isinstance(url, str) else url)
+        self.builder = builder or PayloadBuilder(model)
+        self.policy = policy or RequestPolicy(read_timeout=timeout)
+        self.cache = cache
+        self.session = new_session(timed=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def models(self):
+        # Every model listed by any server that answers
+        errors = []
+        for backend in self.backends:
+            ok, error, models = probe_models(self.session, backend.models_url, self.policy.timeout)
+            self.backends.mark_health(backend.base_url, ok, error, models if ok else None)
+            if not ok:
+                errors.append(f"{backend.base_url}: {error}")
+        if len(errors) == len(self.backends):
+            raise RequestError(f"Error: {'; '.join(errors)}")
+        return self.backends.models()
+
+    def complete(self, window, stream=False, on_token=None, recalled=None):
+        # Returns the response body; streamed tokens are passed to on_token as they arrive
+        cache_key = self.builder.cache_key(window, recalled) if self.cache is not None else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                cached["from_cache"] = True
+                if stream and on_token:
+                    on_token(cached["choices"][0]["message"]["content"])
+                return cached
+        payload = self.builder.build(window, stream, recalled)
+        result = self._request("chat/completions", payload, stream, on_token, self.builder.model)
+        if cache_key is not None:
+            self.cache.put(cache_key, result)
+        return result
+
+    def reply(self, window, prompt=None, stream=False, on_token=None):
+        # One turn: the prompt (if any) and the reply are appended to the window
+        if prompt is not None:
+            window.append("user", prompt)
+        content = self.complete(window, stream, on_token)["choices"][0]["message"]["content"]
+        window.append("assistant", content)
+        return content
+
+    def embed(self, texts, model="default"):
+        result = self._request("embeddings", {"model": model, "input": list(texts)}, model=model)
+        return [item["embedding"] for item in sorted(result["data"], key=lambda item: item["index"])]
+
+    def _request(self, endpoint, payload, stream=False, on_token=None, model=None):
+        # Retriable failures before any token was passed on are retried up to policy.max_retries
+        # times: on another healthy server at once, or on the same one after a backoff
+        tried = set()
+        streamed = False
+
+        def forward(token):
+            nonlocal streamed
+            streamed = True
+            on_token(token)
+
+        for attempt in itertools.count():
+            backend = self.backends.acquire(exclude=tried if len(tried) < len(self.backends) else (), model=model)
+            started = time.monotonic()
+            try:
+                result = self._send(backend.url(endpoint), payload, stream, forward if on_token else None)
+            except RequestError as e:
+                self.backends.release(backend, False, error=str(e))
+                if not e.retriable or streamed or attempt >= self.policy.max_retries:
+                    raise
+                tried.add(backend)
+                if not any(b.healthy and b not in tried for b in self.backends):
+                    time.sleep(self.policy.backoff(attempt))
+                continue
+            except BaseException:
+                self.backends.release(backend)
+                raise
+            self.backends.release(backend, True, time.monotonic() - started)
+            return result
+
+    def _send(self, url, payload, stream, on_token):
+        try:
+            with post(self.session, url, payload, stream, self.policy.timeout) as response:
+                if response.status_code != 200:
+                    raise RequestError(f"Error: {response.status_code} - {response.text}",
+                                       retriable(response.status_code))
+                if not stream:
+                    return response.json()
+                accumulator = StreamAccumulator()
+                for chunk in iter_chunks(response):
+                    token = accumulator.feed(chunk)
+                    if token and on_token:
+                        on_token(token)
+                return accumulator.result()
+        except requests.RequestException as e:
+            raise RequestError(f"Request failed: {str(e)}", True) from e
+
+    def close(self):
+        self.session.close()
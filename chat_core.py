@@ -0,0 +1,1380 @@
+import os
+import sys
+import csv
+import json
+import math
+import time
+import random
+import bisect
+import sqlite3
+import struct
+import hashlib
+import heapq
+import itertools
+import unicodedata
+from array import array
+from collections import deque, Counter
+
+# Rough token estimate used for budgeting; avoids needing the model's tokenizer
+def estimate_tokens(text):
+    return len(text) // 4 + 4
+
+# Canonical compact JSON so identical messages always serialize to identical bytes
+def encode_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+# Token budget, running summary and payload encoding shared by every kind of message window.
+# Subclasses keep the messages, call trim() after adding some, and implement evict_oldest()
+# to drop the oldest message and return its token count and encoded form.
+class BudgetedWindow:
+    def __init__(self, system_content, budget=4096, speaker_names=None):
+        self.system_content = system_content
+        self.budget = budget
+        self.speaker_names = speaker_names or {"user": "User", "assistant": "Assistant"}
+        self.encoded_joined = ""
+        self.encoded_system = None
+        self.total_tokens = estimate_tokens(system_content)
+        self.summary = ""
+        self.summary_tokens = 0
+        self.summary_pending = False
+        # Messages evicted so far and not yet summarized; evictions counts every message ever
+        # evicted, and summarized how many of the oldest messages the summary covers
+        self.evicted = []
+        self.evictions = 0
+        self.summarized = 0
+
+    def set_budget(self, budget):
+        self.budget = budget
+        self.trim()
+
+    def trim(self):
+        # Evict the oldest turns, but never the latest one
+        while self.total_tokens + self.summary_tokens > self.budget and len(self) > 1:
+            tokens, encoded = self.evict_oldest()
+            self.total_tokens -= tokens
+            self.evictions += 1
+            if self.encoded_joined is not None:
+                # Cut the message and its comma off the front instead of joining everything again
+                self.encoded_joined = self.encoded_joined[len(encoded) + 1:]
+
+    def _drop_summarized(self):
+        # Messages a restored summary already covers are dropped lazily
+        first = self.evictions - len(self.evicted)
+        if self.summarized > first:
+            del self.evicted[:self.summarized - first]
+
+    def evicted_tokens(self):
+        self._drop_summarized()
+        return sum(estimate_tokens(message["content"]) for message in self.evicted)
+
+    def take_evicted(self, max_tokens=None):
+        # Oldest evicted messages the summary doesn't cover yet. With max_tokens, only as many as
+        # fit (at least one); the rest wait for the next call.
+        self._drop_summarized()
+        count = len(self.evicted)
+        if max_tokens is not None:
+            tokens = 0
+            for count, message in enumerate(self.evicted):
+                tokens += estimate_tokens(message["content"])
+                if count and tokens > max_tokens:
+                    break
+            else:
+                count = len(self.evicted)
+        taken = self.evicted[:count]
+        del self.evicted[:count]
+        return taken
+
+    def set_summary(self, summary, covered=None):
+        # covered: how many of the oldest messages the summary takes in
+        self.summary = summary
+        self.summary_tokens = estimate_tokens(summary) if summary else 0
+        if covered is not None:
+            self.summarized = covered
+        self.encoded_system = None
+        self.trim()
+
+    def transcript(self, messages):
+        return "\n".join(f"{self.speaker_names.get(m['role'], m['role'])}: {m['content']}" for m in messages)
+
+    def system_message(self):
+        system_content = self.system_content
+        if self.summary:
+            system_content += f"\n\nSummary of the earlier conversation: {self.summary}"
+        return {"role": "system", "content": system_content}
+
+    def messages(self):
+        return [self.system_message()] + list(self.history_messages())
+
+    def encoded_messages(self, recalled=None):
+        if self.encoded_system is None:
+            self.encoded_system = encode_json(self.system_message())
+        if self.encoded_joined is None:
+            self.encoded_joined = ",".join(self.encoded_history())
+        if not self.encoded_joined:
+            return self.encoded_system
+        if recalled:
+            # Recalled turns ride along with the latest message, so everything before it is
+            # still sent byte-for-byte as on the previous turn
+            last = self.last_message()
+            head = self.encoded_joined[:-len(encode_json(last))]
+            last = {"role": last["role"], "content": f"{recalled}\n\n{last['content']}"}
+            return f"{self.encoded_system},{head}{encode_json(last)}"
+        return f"{self.encoded_system},{self.encoded_joined}"
+
+    def _append_encoded(self, encoded):
+        # Only the new tail is serialized; the existing prefix is reused as-is
+        if self.encoded_joined is not None:
+            self.encoded_joined = f"{self.encoded_joined},{encoded}" if len(self) > 1 else encoded
+
+
+# Token-budgeted message history that always keeps the system prompt
+class ContextWindow(BudgetedWindow):
+    def __init__(self, system_content, budget=4096, speaker_names=None):
+        super().__init__(system_content, budget, speaker_names)
+        # Wire messages hold only API fields; UI metadata lives in parallel deques
+        self.history = deque()
+        self.timestamps = deque()
+        self.token_counts = deque()
+        self.encoded = deque()
+
+    def __len__(self):
+        return len(self.history)
+
+    def append(self, role, content, timestamp=None):
+        message = {"role": role, "content": content}
+        tokens = estimate_tokens(content)
+        encoded = encode_json(message)
+        self.history.append(message)
+        self.timestamps.append(timestamp if timestamp is not None else time.time())
+        self.token_counts.append(tokens)
+        self.encoded.append(encoded)
+        self._append_encoded(encoded)
+        self.total_tokens += tokens
+        self.trim()
+
+    def pop(self):
+        self.total_tokens -= self.token_counts.pop()
+        self.timestamps.pop()
+        self.encoded.pop()
+        self.encoded_joined = None
+        return self.history.pop()
+
+    def evict_oldest(self):
+        self.timestamps.popleft()
+        self.evicted.append(self.history.popleft())
+        return self.token_counts.popleft(), self.encoded.popleft()
+
+    def history_messages(self):
+        return self.history
+
+    def last_message(self):
+        return self.history[-1]
+
+    def encoded_history(self):
+        return self.encoded
+
+
+# Append-only record of a conversation between several speakers, kept once no matter how many
+# speakers' windows look at it. Columns instead of per-message objects: contents in a list,
+# speaker ids, timestamps and token counts in arrays, speaker names interned.
+class MessageStore:
+    def __init__(self):
+        self.speakers = []
+        self.contents = []
+        self.speaker_ids = array("H")
+        self.timestamps = array("d")
+        self.token_counts = array("I")
+        # JSON-encoded contents, kept only from the oldest message any view still sends
+        self.encoded = deque()
+        self.encoded_start = 0
+        self.views = []
+
+    def __len__(self):
+        return len(self.contents)
+
+    def add_speaker(self, name):
+        # Speakers get their own id even if two share a name
+        self.speakers.append(sys.intern(name))
+        return len(self.speakers) - 1
+
+    def append(self, speaker_id, content, timestamp=None):
+        self.contents.append(content)
+        self.speaker_ids.append(speaker_id)
+        self.timestamps.append(timestamp if timestamp is not None else time.time())
+        self.token_counts.append(estimate_tokens(content))
+        self.encoded.append(encode_json(content))
+        for view in self.views:
+            view.extend()
+        self.release_encoded()
+
+    def speaker(self, index):
+        return self.speakers[self.speaker_ids[index]]
+
+    def encoded_content(self, index):
+        return self.encoded[index - self.encoded_start]
+
+    def release_encoded(self):
+        start = min((view.start for view in self.views), default=len(self))
+        while self.encoded_start < start:
+            self.encoded.popleft()
+            self.encoded_start += 1
+
+    def records(self, start=0):
+        # Messages as plain dicts, built on demand for display, journals and export
+        for index in range(start, len(self)):
+            yield {"speaker": self.speaker(index), "content": self.contents[index],
+                   "timestamp": self.timestamps[index], "sequence": index + 1}
+
+
+# One speaker's token-budgeted view of a MessageStore: the speaker's own messages are
+# "assistant" turns and everyone else's are "user" turns. The view holds no messages, only
+# the range of the store it still sends.
+class SpeakerView(BudgetedWindow):
+    def __init__(self, store, speaker_id, system_content, budget=4096, speaker_names=None):
+        super().__init__(system_content, budget, speaker_names)
+        self.store = store
+        self.speaker_id = speaker_id
+        self.start = 0
+        self.end = 0
+        store.views.append(self)
+        self.extend()
+
+    def __len__(self):
+        return self.end - self.start
+
+    def role(self, index):
+        return "assistant" if self.store.speaker_ids[index] == self.speaker_id else "user"
+
+    def message(self, index):
+        return {"role": self.role(index), "content": self.store.contents[index]}
+
+    def encoded_message(self, index):
+        # Same bytes as encode_json(self.message(index)), without encoding the content again
+        return f'{{"role":"{self.role(index)}","content":{self.store.encoded_content(index)}}}'
+
+    def extend(self):
+        # Takes in messages appended to the store since the last call
+        while self.end < len(self.store):
+            self.end += 1
+            self._append_encoded(self.encoded_message(self.end - 1))
+            self.total_tokens += self.store.token_counts[self.end - 1]
+        self.trim()
+
+    def set_budget(self, budget):
+        super().set_budget(budget)
+        self.store.release_encoded()
+
+    def evict_oldest(self):
+        index = self.start
+        self.evicted.append(self.message(index))
+        self.start += 1
+        return self.store.token_counts[index], self.encoded_message(index)
+
+    def history_messages(self):
+        return (self.message(index) for index in range(self.start, self.end))
+
+    def last_message(self):
+        return self.message(self.end - 1)
+
+    def encoded_history(self):
+        return (self.encoded_message(index) for index in range(self.start, self.end))
+
+
+# Builds request bodies whose bytes only ever grow at the tail, so the server's
+# prompt cache can reuse everything sent on the previous turn
+class PayloadBuilder:
+    def __init__(self, model="default", temperature=0.7, max_tokens=500):
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.headers = {}
+
+    def header(self, stream):
+        if stream not in self.headers:
+            params = {"model": self.model, "temperature": self.temperature,
+                      "max_tokens": self.max_tokens, "stream": stream}
+            if stream:
+                params["stream_options"] = {"include_usage": True}
+            # Drop the closing brace so the messages array can follow the fixed fields
+            self.headers[stream] = encode_json(params)[:-1] + ',"messages":['
+        return self.headers[stream]
+
+    def build(self, window, stream=False, recalled=None):
+        return f"{self.header(stream)}{window.encoded_messages(recalled)}]}}".encode("utf-8")
+
+    def cache_key(self, window, recalled=None):
+        # Everything that determines the completion, but not how it is delivered
+        params = encode_json([self.model, self.temperature, self.max_tokens])
+        return hashlib.sha256(f"{params}{window.encoded_messages(recalled)}".encode("utf-8")).hexdigest()
+
+# Opening message of every single-chat conversation
+INTRO_PROMPT = "Please introduce yourself briefly."
+
+
+SUMMARY_INSTRUCTIONS = ("Summarize the conversation below in a few sentences. "
+                        "Keep names, facts, opinions and anything promised.")
+SUMMARY_MAX_TOKENS = 200
+# Smallest batch of evicted turns sent for summarizing, however tight the budget
+SUMMARY_MIN_CHUNK_TOKENS = 256
+# Evicted turns wait until there are this many tokens of them, so a long conversation sends
+# a summary request every few turns rather than one per turn
+SUMMARY_BATCH_TOKENS = 1024
+
+
+# Request that condenses turns evicted from a window, and the window's earlier summary, into a new summary
+def summary_payload(model, window, evicted):
+    previous = f"Earlier summary: {window.summary}\n\n" if window.summary else ""
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": previous + window.transcript(evicted)}
+        ],
+        "temperature": 0.3,
+        "max_tokens": SUMMARY_MAX_TOKENS
+    }
+
+
+def summary_chunk_tokens(window):
+    # Evicted turns one summary request can take, so it fits the same budget as the conversation
+    available = window.budget - window.summary_tokens - SUMMARY_MAX_TOKENS - estimate_tokens(SUMMARY_INSTRUCTIONS)
+    return max(available, SUMMARY_MIN_CHUNK_TOKENS)
+
+
+def summary_due(window):
+    # Enough evicted turns for a summary request; a chunk's worth at most, under a tight budget
+    return window.evicted_tokens() >= min(SUMMARY_BATCH_TOKENS, summary_chunk_tokens(window))
+
+
+def dual_system_prompt(figure, partner, context):
+    return (f"You are {figure}. Engage in a natural conversation with {partner} about the following context: {context}. "
+            f"Maintain your perspective and personality. Respond directly to the last message.")
+
+# Histories for both speakers of a dual conversation, exactly as the Dual Chat tab builds them.
+# Both are views of one MessageStore (history1.store), which also serves as the conversation log.
+def new_dual_histories(figure1, figure2, context, budget=4096, budget2=None):
+    # budget2 gives the second figure a budget of its own
+    store = MessageStore()
+    history1 = SpeakerView(store, store.add_speaker(figure1), dual_system_prompt(figure1, figure2, context),
+                           budget, {"user": figure2, "assistant": figure1})
+    history2 = SpeakerView(store, store.add_speaker(figure2), dual_system_prompt(figure2, figure1, context),
+                           budget2 or budget, {"user": figure1, "assistant": figure2})
+    return history1, history2
+
+# A committed turn is stored once; the speaker's view sees it as an assistant message and
+# the listener's as a user message
+def commit_dual_turn(speaker_history, content, timestamp=None):
+    speaker_history.store.append(speaker_history.speaker_id, content, timestamp)
+
+# Paces dual-chat turns by reading time instead of a fixed delay between requests,
+# and keeps score against the fixed delay it replaced
+class TurnScheduler:
+    def __init__(self, words_per_minute=400, fast_mode=False, fixed_delay=2.5):
+        self.words_per_minute = words_per_minute
+        self.fast_mode = fast_mode
+        self.fixed_delay = fixed_delay
+        self.started = time.monotonic()
+        self.next_reveal = self.started
+        self.last_shown = self.started
+        self.generation_time = 0.0
+        self.turns = 0
+
+    def reading_time(self, text):
+        if self.fast_mode:
+            return 0.0
+        return len(text.split()) * 60.0 / self.words_per_minute
+
+    def reveal_delay(self, now=None):
+        now = now if now is not None else time.monotonic()
+        if self.fast_mode:
+            return 0.0
+        return max(0.0, self.next_reveal - now)
+
+    def record_generation(self, seconds):
+        self.generation_time += seconds
+
+    def message_shown(self, text, now=None):
+        now = now if now is not None else time.monotonic()
+        self.turns += 1
+        self.last_shown = now
+        self.next_reveal = now + self.reading_time(text)
+
+    def saved_seconds(self):
+        # Time the same turns would have taken with a fixed pause after every response
+        fixed = self.generation_time + self.fixed_delay * max(0, self.turns - 1)
+        return fixed - (self.last_shown - self.started)
+
+# Content-addressed, size-bounded LRU cache of completions persisted in SQLite
+class ResponseCache:
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                        "size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.db.commit()
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        row = self.db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or now - row[1] > self.ttl:
+            if row is not None:
+                self._delete(key)
+            self.misses += 1
+            return None
+
+        self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        self.db.commit()
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, response):
+        encoded = encode_json(response)
+        size = len(encoded.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        self._delete(key)
+        self.db.execute("INSERT INTO responses VALUES (?, ?, ?, ?, ?)", (key, encoded, size, now, now))
+        self.total_bytes += size
+        self._evict()
+        self.db.commit()
+
+    def clear(self):
+        self.db.execute("DELETE FROM responses")
+        self.db.commit()
+        self.total_bytes = 0
+
+    def close(self):
+        self.db.close()
+
+    def _delete(self, key):
+        row = self.db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.total_bytes -= row[0]
+
+    def _evict(self):
+        # Drop least recently used entries until the cache fits again
+        while self.total_bytes > self.max_bytes:
+            row = self.db.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT 1").fetchone()
+            if row is None:
+                break
+            self.db.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            self.total_bytes -= row[1]
+
+# Append-only JSONL record of a session. Every record is flushed to the OS as it
+# is written; fsync is batched by record count and elapsed time.
+class SessionJournal:
+    def __init__(self, path, sync_every=16, sync_interval=2.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self._truncate_partial_line()
+        self.file = open(path, 'a', encoding='utf-8')
+
+    @classmethod
+    def create(cls, directory, kind, header):
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(directory, f"{kind}-{stamp}.jsonl")
+        suffix = 1
+        while os.path.exists(path):
+            suffix += 1
+            path = os.path.join(directory, f"{kind}-{stamp}-{suffix}.jsonl")
+        journal = cls(path)
+        journal.append(dict(header, type="session", kind=kind, created=time.time()))
+        journal.sync()
+        return journal
+
+    def _truncate_partial_line(self):
+        # A crash can leave half a record at the end; cut back to the last complete line
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+            if tail.endswith(b"\n"):
+                return
+            cut = tail.rfind(b"\n")
+            f.truncate(size - len(tail) + cut + 1 if cut >= 0 else 0)
+
+    def append(self, record):
+        self.file.write(encode_json(record) + "\n")
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every:
+            self.sync()
+
+    def sync_if_due(self):
+        if self.unsynced and time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+
+def read_journal(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # Truncated final record from a crash
+                break
+
+
+# Returns the session header and an iterator over its records of the given types
+def open_session(path, types=("turn",)):
+    records = read_journal(path)
+    header = next(records, None)
+    if not header or header.get("type") != "session":
+        raise ValueError(f"{path} is not a session journal")
+    return header, (record for record in records if record.get("type") in types)
+
+# Dictionary written on first run, when there is no FamousPeople.dict yet
+DEFAULT_CATEGORIES = {
+    "Presidents": ["George Washington", "Abraham Lincoln", "Thomas Jefferson", "Franklin D. Roosevelt",
+                    "John F. Kennedy", "Theodore Roosevelt", "Ronald Reagan", "Barack Obama",
+                    "Dwight D. Eisenhower", "Harry S. Truman"],
+    "Scientists": ["Albert Einstein", "Isaac Newton", "Marie Curie", "Nikola Tesla", "Charles Darwin",
+                    "Richard Feynman", "Galileo Galilei", "Stephen Hawking", "Neil deGrasse Tyson",
+                    "Carl Sagan", "Alan Turing", "Rachel Carson", "Rosalind Franklin", "Katherine Johnson",
+                    "James Watson", "Francis Crick", "Jane Goodall"],
+    "Artists": ["Leonardo da Vinci", "Vincent van Gogh", "Frida Kahlo", "Pablo Picasso", "Michelangelo",
+                "Claude Monet", "Salvador Dalí", "Georgia O'Keeffe", "Andy Warhol", "Rembrandt", "Banksy",
+                "Jean-Michel Basquiat"],
+    "Writers": ["William Shakespeare", "Jane Austen", "Mark Twain", "Ernest Hemingway", "Virginia Woolf",
+                "Leo Tolstoy", "Oscar Wilde", "Maya Angelou", "Gabriel García Márquez", "Franz Kafka",
+                "Emily Dickinson", "Edgar Allan Poe", "Toni Morrison", "George Orwell", "J.K. Rowling",
+                "Haruki Murakami"],
+    "Philosophers": ["Socrates", "Plato", "Aristotle", "Confucius", "Friedrich Nietzsche", "René Descartes",
+                    "Immanuel Kant", "Jean-Jacques Rousseau", "John Locke", "Simone de Beauvoir",
+                    "Jean-Paul Sartre", "Karl Marx", "Hannah Arendt", "Bertrand Russell",
+                    "Michel Foucault"],
+    "Inventors": ["Thomas Edison", "Alexander Graham Bell", "Steve Jobs", "Ada Lovelace",
+                "Johannes Gutenberg", "Leonardo da Vinci", "James Watt", "Grace Hopper", "Hedy Lamarr",
+                "Wright Brothers", "Marie Van Brittan Brown"],
+    "Musicians": ["Wolfgang Amadeus Mozart", "Ludwig van Beethoven", "Johann Sebastian Bach",
+                "Freddie Mercury", "John Lennon", "Elvis Presley", "David Bowie", "Bob Dylan",
+                "Michael Jackson", "Prince", "Madonna", "Aretha Franklin", "Nina Simone",
+                "Louis Armstrong", "Bob Marley", "Jimi Hendrix"],
+    "Athletes": ["Muhammad Ali", "Michael Jordan", "Pelé", "Serena Williams", "Babe Ruth", "Usain Bolt",
+                "Wayne Gretzky", "Jesse Owens", "Billie Jean King", "Michael Phelps", "Tiger Woods",
+                "Simone Biles", "Kobe Bryant", "Jackie Robinson", "Wilma Rudolph"],
+    "Political Leaders": ["Mahatma Gandhi", "Winston Churchill", "Nelson Mandela", "Margaret Thatcher",
+                            "Martin Luther King Jr.", "Cleopatra", "Queen Elizabeth I", "Queen Victoria",
+                            "Catherine the Great", "Angela Merkel", "Benazir Bhutto", "Indira Gandhi",
+                            "Golda Meir", "Eleanor Roosevelt"],
+    "Activists": ["Malcolm X", "Rosa Parks", "Emmeline Pankhurst", "Harvey Milk", "Gloria Steinem",
+                "Malala Yousafzai", "Cesar Chavez", "Greta Thunberg", "Susan B. Anthony", "Harriet Tubman",
+                "Helen Keller", "Desmond Tutu", "Rigoberta Menchú", "Betty Friedan"],
+    "Military": ["Napoleon Bonaparte", "Alexander the Great", "Sun Tzu", "Genghis Khan", "Julius Caesar",
+                "Hannibal Barca", "Joan of Arc", "George S. Patton", "Erwin Rommel",
+                "Dwight D. Eisenhower", "Admiral Yi Sun-sin", "Spartacus", "Boudicca", "Sitting Bull"],
+    "Entrepreneurs": ["Henry Ford", "Elon Musk", "Bill Gates", "Andrew Carnegie", "Oprah Winfrey",
+                    "Jeff Bezos", "Warren Buffett", "Steve Jobs", "Richard Branson", "Arianna Huffington",
+                    "Mark Zuckerberg", "Coco Chanel", "Walt Disney", "John D. Rockefeller",
+                    "Madam C.J. Walker"],
+    "Explorers": ["Christopher Columbus", "Marco Polo", "Amelia Earhart", "Neil Armstrong",
+                "Jacques Cousteau", "Roald Amundsen", "Edmund Hillary", "Tenzing Norgay", "Sacagawea",
+                "Ibn Battuta", "Captain James Cook", "Lewis and Clark", "David Livingstone", "Zheng He",
+                "Matthew Henson", "Ernest Shackleton"]
+}
+
+
+# Figure dictionary backed by a precompiled SQLite index stored next to the JSON.
+# Category and figure lists come out of the index pre-sorted, and prompts are only
+# rendered when a figure is actually used.
+class FigureDictionary:
+    INDEX_VERSION = 1
+    INDEX_SUFFIX = ".idx"
+
+    def __init__(self, db):
+        self.db = db
+        self.figure_cache = {}
+        self.category_cache = None
+
+    @classmethod
+    def from_categories(cls, categories):
+        db = sqlite3.connect(":memory:")
+        cls._build(db, categories, {})
+        return cls(db)
+
+    @classmethod
+    def open(cls, path):
+        stat = os.stat(path)
+        source = {"mtime": repr(stat.st_mtime), "size": str(stat.st_size), "version": str(cls.INDEX_VERSION)}
+        index_path = path + cls.INDEX_SUFFIX
+        if os.path.exists(index_path):
+            try:
+                db = sqlite3.connect(index_path)
+                if cls._read_meta(db) == source:
+                    return cls(db)
+                db.close()
+            except sqlite3.DatabaseError:
+                pass
+
+        # Stale, missing or unreadable index: rebuild it from the JSON
+        with open(path, 'r', encoding='utf-8') as f:
+            categories = json.load(f)
+        try:
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            db = sqlite3.connect(index_path)
+            cls._build(db, categories, source)
+        except (OSError, sqlite3.DatabaseError):
+            # Read-only location; keep the index in memory for this run
+            db = sqlite3.connect(":memory:")
+            cls._build(db, categories, source)
+        return cls(db)
+
+    @staticmethod
+    def _read_meta(db):
+        try:
+            return dict(db.execute("SELECT key, value FROM meta").fetchall())
+        except sqlite3.DatabaseError:
+            return None
+
+    @staticmethod
+    def _build(db, categories, source):
+        db.executescript("""
+            DROP TABLE IF EXISTS meta;
+            DROP TABLE IF EXISTS categories;
+            DROP TABLE IF EXISTS figures;
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE categories (position INTEGER PRIMARY KEY, name TEXT NOT NULL);
+            CREATE TABLE figures (category INTEGER NOT NULL, position INTEGER NOT NULL, name TEXT NOT NULL,
+                                  PRIMARY KEY (category, position));
+        """)
+        # Positions follow Python's sort so lists match what sorted() would give
+        names = sorted(categories)
+        db.executemany("INSERT INTO categories VALUES (?, ?)", enumerate(names))
+        for category_id, name in enumerate(names):
+            db.executemany("INSERT INTO figures VALUES (?, ?, ?)",
+                           ((category_id, position, figure)
+                            for position, figure in enumerate(sorted(categories[name]))))
+        db.execute("CREATE INDEX figures_name ON figures (name)")
+        # meta is written last so a half-built index is never mistaken for a valid one
+        db.executemany("INSERT INTO meta VALUES (?, ?)", source.items())
+        db.commit()
+
+    def category_names(self):
+        if self.category_cache is None:
+            self.category_cache = [row[0] for row in self.db.execute("SELECT name FROM categories ORDER BY position")]
+        return self.category_cache
+
+    def __contains__(self, category):
+        return category in self.category_names()
+
+    def __bool__(self):
+        return bool(self.category_names())
+
+    def figures(self, category):
+        figures = self.figure_cache.get(category)
+        if figures is None:
+            figures = [row[0] for row in self.db.execute(
+                "SELECT f.name FROM figures f JOIN categories c ON f.category = c.position "
+                "WHERE c.name = ? ORDER BY f.position", (category,))]
+            # Keep only a handful of category lists around
+            if len(self.figure_cache) >= 8:
+                self.figure_cache.pop(next(iter(self.figure_cache)))
+            self.figure_cache[category] = figures
+        return figures
+
+    def iter_figures(self):
+        for row in self.db.execute("SELECT name FROM figures ORDER BY category, position"):
+            yield row[0]
+
+    def figure_count(self):
+        return self.db.execute("SELECT COUNT(*) FROM figures").fetchone()[0]
+
+    def has_figure(self, figure):
+        return self.db.execute("SELECT 1 FROM figures WHERE name = ? LIMIT 1", (figure,)).fetchone() is not None
+
+    def prompt(self, figure):
+        if self.has_figure(figure):
+            return f"You are now roleplaying as {figure}."
+        return f"You are {figure}."
+
+    def iter_prompts(self):
+        seen = set()
+        for figure in self.iter_figures():
+            if figure not in seen:
+                seen.add(figure)
+                yield figure, f"You are now roleplaying as {figure}."
+
+    def close(self):
+        self.db.close()
+
+
+def normalize_name(text):
+    # Case- and accent-insensitive form used for search ("Pelé" matches "pele")
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def name_trigrams(normalized):
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Typo-tolerant search over figure names and categories. Prefix lookups use a
+# sorted token list and bisect; fuzzy matches come from a trigram index,
+# scanning only the rarest trigrams of the query.
+class FigureSearchIndex:
+    MAX_PREFIX_SCAN = 200
+    MAX_FUZZY_LISTS = 8
+    # Posting list entries counted, and candidates checked against their names, per fuzzy search
+    MAX_FUZZY_SCAN = 3000
+    MAX_FUZZY_VERIFY = 100
+
+    def __init__(self):
+        self.entries = []
+        self.keys = []
+        self.tokens = []
+        self.token_ids = array("I")
+        self.pending_tokens = []
+        self.trigrams = {}
+
+    def add(self, figure, category):
+        # figure is None for an entry that stands for the category itself
+        entry_id = len(self.entries)
+        key = normalize_name(figure if figure is not None else category)
+        self.entries.append((figure, category))
+        self.keys.append(key)
+        self.pending_tokens.append((key, entry_id))
+        for word in key.split()[1:]:
+            self.pending_tokens.append((word, entry_id))
+        for gram in name_trigrams(key):
+            postings = self.trigrams.get(gram)
+            if postings is None:
+                postings = self.trigrams[gram] = array("I")
+            postings.append(entry_id)
+
+    def build_steps(self, dictionary, chunk_size=5000):
+        # Yields after every chunk so a GUI can spread the build over the event loop.
+        # Each chunk's tokens are sorted into a run; the runs are merged a chunk at a time.
+        runs = [list(zip(self.tokens, self.token_ids))]
+        for category in dictionary.category_names():
+            self.add(None, category)
+        count = 0
+        for category in dictionary.category_names():
+            for figure in dictionary.figures(category):
+                self.add(figure, category)
+                count += 1
+                if count % chunk_size == 0:
+                    runs.append(sorted(self.pending_tokens))
+                    self.pending_tokens = []
+                    yield count
+        runs.append(sorted(self.pending_tokens))
+        self.pending_tokens = []
+
+        tokens = []
+        token_ids = array("I")
+        merged = heapq.merge(*runs)
+        while True:
+            step = list(itertools.islice(merged, chunk_size * 10))
+            if not step:
+                break
+            tokens.extend(token for token, _ in step)
+            token_ids.extend(entry_id for _, entry_id in step)
+            yield count
+        self.tokens = tokens
+        self.token_ids = token_ids
+        yield count
+
+    def finish(self):
+        # Makes figures added one by one with add() visible to prefix search
+        if not self.pending_tokens:
+            return
+        merged = sorted(itertools.chain(zip(self.tokens, self.token_ids), self.pending_tokens))
+        self.tokens = [token for token, _ in merged]
+        self.token_ids = array("I", (entry_id for _, entry_id in merged))
+        self.pending_tokens = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, query, limit=20):
+        query = normalize_name(query).strip()
+        if not query:
+            return []
+
+        scores = {}
+        # Whole-name and word prefixes rank above fuzzy matches
+        position = bisect.bisect_left(self.tokens, query)
+        end = min(position + self.MAX_PREFIX_SCAN, len(self.tokens))
+        while position < end and self.tokens[position].startswith(query):
+            entry_id = self.token_ids[position]
+            exact_start = self.keys[entry_id].startswith(query)
+            scores[entry_id] = max(scores.get(entry_id, 0), 3.0 if exact_start else 2.0)
+            position += 1
+
+        if len(scores) < limit:
+            for entry_id, score in self._fuzzy(query):
+                scores.setdefault(entry_id, score)
+
+        ranked = sorted(scores, key=lambda entry_id: (-scores[entry_id],
+                                                      abs(len(self.keys[entry_id]) - len(query)),
+                                                      self.keys[entry_id]))
+        return [self.entries[entry_id] for entry_id in ranked[:limit]]
+
+    def _fuzzy(self, query):
+        # Yields (entry id, score) for names sharing at least half of the query's rarest trigrams.
+        # Candidates come from the rarest posting lists that fit the scan budget; the ones found in
+        # the most lists are then checked against their names, so scores always cover every trigram.
+        grams = sorted((gram for gram in name_trigrams(query) if gram in self.trigrams),
+                       key=lambda gram: len(self.trigrams[gram]))[:self.MAX_FUZZY_LISTS]
+        if not grams:
+            return
+        counts = Counter()
+        scanned = 0
+        for gram in grams:
+            postings = self.trigrams[gram]
+            if scanned and scanned + len(postings) > self.MAX_FUZZY_SCAN:
+                break
+            counts.update(postings[:self.MAX_FUZZY_SCAN])
+            scanned += len(postings)
+        candidates = counts
+        if len(counts) > self.MAX_FUZZY_VERIFY:
+            # Lowest count that fits the budget, found from a histogram so no Python code runs per
+            # entry; entries at that count fill whatever room is left
+            levels = Counter(counts.values())
+            kept = 0
+            for level in sorted(levels, reverse=True):
+                if kept + levels[level] > self.MAX_FUZZY_VERIFY:
+                    break
+                kept += levels[level]
+            candidates = itertools.chain(
+                itertools.compress(counts, map(level.__lt__, counts.values())),
+                itertools.islice(itertools.compress(counts, map(level.__eq__, counts.values())),
+                                 self.MAX_FUZZY_VERIFY - kept))
+        needed = (len(grams) + 1) // 2
+        for entry_id in candidates:
+            padded = f"  {self.keys[entry_id]} "
+            shared = sum(map(padded.__contains__, grams))
+            if shared >= needed:
+                yield entry_id, shared / len(grams)
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile; fraction is between 0 and 1
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+# Rolling per-request timings with totals since start, exportable as CSV or Prometheus text
+class RequestMetrics:
+    FIELDS = ("timestamp", "backend", "status", "error", "stream", "queue_wait", "connect", "ttft", "total",
+              "prompt_tokens", "completion_tokens", "tokens_per_second", "render")
+    # Timing fields summarised as percentiles, with their Prometheus names
+    TIMINGS = (("queue_wait", "queue_wait_seconds"), ("connect", "connect_seconds"),
+               ("ttft", "time_to_first_token_seconds"), ("total", "request_seconds"),
+               ("render", "render_seconds"), ("tokens_per_second", "tokens_per_second"))
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, window=500):
+        self.samples = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        # Requests dropped on purpose (stopped conversations, superseded prefetches); not failures
+        self.cancelled = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.sums = {field: 0.0 for field, _ in self.TIMINGS}
+        self.counts = {field: 0 for field, _ in self.TIMINGS}
+
+    def record(self, sample):
+        sample = dict(sample)
+        sample.setdefault("timestamp", time.time())
+        completion = sample.get("completion_tokens")
+        if completion and sample.get("tokens_per_second") is None:
+            # Generation rate excludes the wait for the first token when it is known
+            generating = sample.get("total", 0) - (sample.get("ttft") or 0)
+            if generating > 0:
+                sample["tokens_per_second"] = completion / generating
+        self.samples.append(sample)
+
+        self.requests += 1
+        self.errors += sample.get("status") == "error"
+        self.cancelled += sample.get("status") == "cancelled"
+        self.prompt_tokens += sample.get("prompt_tokens") or 0
+        self.completion_tokens += completion or 0
+        for field, _ in self.TIMINGS:
+            if sample.get(field) is not None:
+                self.sums[field] += sample[field]
+                self.counts[field] += 1
+        return sample
+
+    def values(self, field):
+        return [sample[field] for sample in self.samples if sample.get(field) is not None]
+
+    def percentiles(self, field, quantiles=QUANTILES):
+        values = self.values(field)
+        return [percentile(values, quantile) if values else None for quantile in quantiles]
+
+    def write_csv(self, f):
+        writer = csv.DictWriter(f, fieldnames=self.FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for sample in self.samples:
+            writer.writerow(sample)
+
+    def prometheus_text(self, prefix="lmstudio_chat"):
+        lines = [f"# TYPE {prefix}_requests_total counter", f"{prefix}_requests_total {self.requests}",
+                 f"# TYPE {prefix}_request_errors_total counter", f"{prefix}_request_errors_total {self.errors}",
+                 f"# TYPE {prefix}_requests_cancelled_total counter",
+                 f"{prefix}_requests_cancelled_total {self.cancelled}",
+                 f"# TYPE {prefix}_prompt_tokens_total counter", f"{prefix}_prompt_tokens_total {self.prompt_tokens}",
+                 f"# TYPE {prefix}_completion_tokens_total counter",
+                 f"{prefix}_completion_tokens_total {self.completion_tokens}"]
+        for field, name in self.TIMINGS:
+            lines.append(f"# TYPE {prefix}_{name} summary")
+            for quantile, value in zip(self.QUANTILES, self.percentiles(field)):
+                if value is not None:
+                    lines.append(f'{prefix}_{name}{{quantile="{quantile}"}} {value:.6f}')
+            lines.append(f"{prefix}_{name}_sum {self.sums[field]:.6f}")
+            lines.append(f"{prefix}_{name}_count {self.counts[field]}")
+        return "\n".join(lines) + "\n"
+
+
+def normalize_base_url(url):
+    # Accepts "http://host:port", ".../v1" or a full ".../v1/chat/completions" endpoint
+    url = url.strip().rstrip("/")
+    for suffix in ("/chat/completions", "/models"):
+        if url.endswith(suffix):
+            url = url[:-len(suffix)]
+    if not url.endswith("/v1"):
+        url += "/v1"
+    return url
+
+
+class Backend:
+    # Circuit breaker: "closed" serves traffic, "open" is skipped until the cooldown has
+    # passed, then "half-open" lets a single trial request through
+    def __init__(self, base_url, failure_threshold=3, cooldown=30.0):
+        self.base_url = normalize_base_url(base_url)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.in_flight = 0
+        self.failures = 0
+        # Exponentially weighted request latency, used to break ties between equally loaded backends
+        self.latency = None
+        self.last_error = ""
+        # Model ids listed by the backend's /v1/models endpoint; empty until the first probe
+        self.models = []
+
+    @property
+    def chat_url(self):
+        return self.url("chat/completions")
+
+    @property
+    def models_url(self):
+        return self.url("models")
+
+    def url(self, endpoint):
+        return f"{self.base_url}/{endpoint}"
+
+    @property
+    def healthy(self):
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half-open"
+        if self.state == "half-open":
+            return self.in_flight == 0
+        return self.state == "closed"
+
+    def serves(self, model):
+        # Unprobed backends are assumed to serve anything; servers that load models on demand may too
+        return model is None or not self.models or model in self.models
+
+    def observe_latency(self, seconds, weight=0.2):
+        self.latency = seconds if self.latency is None else (1 - weight) * self.latency + weight * seconds
+
+    def record_success(self, seconds=None):
+        self.state = "closed"
+        self.failures = 0
+        self.last_error = ""
+        if seconds is not None:
+            self.observe_latency(seconds)
+
+    def record_failure(self, error=""):
+        self.failures += 1
+        self.last_error = error
+        if self.state == "half-open" or self.failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+
+
+# OpenAI-compatible servers that requests are spread across. Backends whose circuit
+# is open are skipped; pinned conversations stay on one backend so its prompt cache
+# keeps matching.
+class BackendPool:
+    def __init__(self, urls):
+        self.backends = [Backend(url) for url in dict.fromkeys(normalize_base_url(url) for url in urls)]
+        if not self.backends:
+            raise ValueError("At least one server URL is required")
+        self.pins = {}
+
+    def __len__(self):
+        return len(self.backends)
+
+    def __iter__(self):
+        return iter(self.backends)
+
+    def healthy(self):
+        return [backend for backend in self.backends if backend.healthy]
+
+    def models(self):
+        # Every model listed by any backend, in discovery order
+        return list(dict.fromkeys(model for backend in self.backends for model in backend.models))
+
+    def acquire(self, pin=None, exclude=(), model=None):
+        pinned = self.pins.get(pin)
+        if pinned is not None and pinned.healthy and pinned not in exclude and pinned.serves(model):
+            backend = pinned
+        else:
+            candidates = [b for b in self.backends if b.healthy and b not in exclude]
+            # Prefer backends that list the model; if none do, any of them may still load it
+            candidates = [b for b in candidates if b.serves(model)] or candidates
+            if not candidates:
+                # Nothing known to be healthy: try whichever failed least rather than refusing outright
+                candidates = [b for b in self.backends if b not in exclude] or self.backends
+                candidates = [min(candidates, key=lambda b: b.failures)]
+            backend = min(candidates, key=lambda b: (b.in_flight, b.latency or 0.0))
+            if pin is not None:
+                self.pins[pin] = backend
+        backend.in_flight += 1
+        return backend
+
+    def release(self, backend, ok=None, seconds=None, error=""):
+        # ok=None releases without judging the backend, e.g. for a cancelled request
+        backend.in_flight = max(0, backend.in_flight - 1)
+        if ok:
+            backend.record_success(seconds)
+        elif ok is not None:
+            backend.record_failure(error)
+
+    def mark_health(self, base_url, ok, error="", models=None):
+        for backend in self.backends:
+            if backend.base_url != base_url:
+                continue
+            if models is not None:
+                backend.models = list(models)
+            if not ok:
+                backend.last_error = error
+                backend.trip()
+            elif backend.state == "open":
+                # A successful probe earns a trial request rather than full traffic
+                backend.state = "half-open"
+
+    def pin(self, pin, backend):
+        self.pins[pin] = backend
+
+    def unpin(self, pin):
+        self.pins.pop(pin, None)
+
+
+# Requests waiting for a worker. Lower priority values go first; within a priority, the flow
+# (one per conversation) served least recently goes next, so a conversation with several
+# queued requests can't hold up the others.
+class FairQueue:
+    def __init__(self):
+        # priority -> {flow: deque of job ids}
+        self.levels = {}
+        self.entries = {}
+        self.turns = itertools.count()
+        self.last_served = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, job_id):
+        return job_id in self.entries
+
+    def push(self, job_id, flow=None, priority=0, front=False):
+        # front=True puts the job at the head of its flow and the flow first in line, e.g. for retries
+        jobs = self.levels.setdefault(priority, {}).setdefault(flow, deque())
+        if front:
+            jobs.appendleft(job_id)
+            self.last_served[flow] = -1
+        else:
+            jobs.append(job_id)
+        self.entries[job_id] = (flow, priority)
+
+    def pop(self):
+        priority = min(self.levels)
+        flows = self.levels[priority]
+        flow = min(flows, key=lambda flow: self.last_served.get(flow, -1))
+        jobs = flows[flow]
+        job_id = jobs.popleft()
+        self.last_served[flow] = next(self.turns)
+        if not jobs:
+            del flows[flow]
+            if not flows:
+                del self.levels[priority]
+        del self.entries[job_id]
+        return job_id
+
+    def remove(self, job_id):
+        flow, priority = self.entries.pop(job_id)
+        flows = self.levels[priority]
+        flows[flow].remove(job_id)
+        if not flows[flow]:
+            del flows[flow]
+            if not flows:
+                del self.levels[priority]
+
+    def clear(self):
+        self.levels = {}
+        self.entries = {}
+
+
+# Timeouts, retries and hedging applied by the request executor
+class RequestPolicy:
+    def __init__(self, connect_timeout=10.0, read_timeout=300.0, max_retries=2, backoff_base=0.5,
+                 backoff_max=8.0, hedge=False, hedge_percentile=0.95, hedge_min_delay=1.0, hedge_min_samples=20):
+        self.connect_timeout = connect_timeout
+        # Longest silence allowed between bytes; blocking requests wait this long for the whole reply
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+
+    @property
+    def timeout(self):
+        return self.connect_timeout, self.read_timeout
+
+    def backoff(self, attempt):
+        # Exponential backoff with full jitter, so retries from many requests spread out
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def hedge_delay(self, samples):
+        # No hedging until there are enough samples to know what "slow" means
+        if not self.hedge or len(samples) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, percentile(samples, self.hedge_percentile))
+
+
+_numpy_module = None
+
+
+def _numpy():
+    # NumPy is optional: imported on first use, and vector search falls back to plain Python without it
+    global _numpy_module
+    if _numpy_module is None:
+        try:
+            import numpy
+            _numpy_module = numpy
+        except ImportError:
+            _numpy_module = False
+    return _numpy_module or None
+
+
+def normalize_vector(vector):
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+# Unit-length embedding vectors keyed by message number, stored contiguously as float32
+# so NumPy can search them without copying
+class VectorIndex:
+    def __init__(self):
+        self.dim = None
+        self.keys = array("I")
+        self.vectors = array("f")
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def add(self, key, vector):
+        vector = normalize_vector(vector)
+        if self.dim is None:
+            self.dim = len(vector)
+        elif len(vector) != self.dim:
+            raise ValueError(f"Expected a {self.dim}-dimensional vector, got {len(vector)}")
+        if key in self.rows:
+            row = self.rows[key]
+            self.vectors[row * self.dim:(row + 1) * self.dim] = array("f", vector)
+            return
+        self.rows[key] = len(self.keys)
+        self.keys.append(key)
+        self.vectors.extend(vector)
+
+    def vector(self, key):
+        row = self.rows[key]
+        return self.vectors[row * self.dim:(row + 1) * self.dim]
+
+    def search(self, query, k, before=None):
+        # The k most similar vectors as (key, cosine similarity), best first; only keys < before count
+        if not self.keys or k <= 0:
+            return []
+        query = normalize_vector(query)
+        np = _numpy()
+        if np is None:
+            dim = self.dim
+            scores = ((sum(a * b for a, b in zip(query, self.vectors[row * dim:(row + 1) * dim])), key)
+                      for row, key in enumerate(self.keys) if before is None or key < before)
+            return [(key, score) for score, key in heapq.nlargest(k, scores)]
+
+        # Views of the arrays' buffers; they must be gone before the arrays grow again
+        keys = np.frombuffer(self.keys, dtype=np.uint32)
+        scores = np.frombuffer(self.vectors, dtype=np.float32).reshape(-1, self.dim) @ np.asarray(query, np.float32)
+        if before is not None:
+            scores[keys >= before] = -np.inf
+        k = min(k, int(np.count_nonzero(scores > -np.inf)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(keys[row]), float(scores[row])) for row in top]
+
+
+# Long-term memory of one conversation: every committed turn gets a key (its position in the
+# conversation) and, once embedded, a vector. Turns that have left the context window are
+# recalled by similarity to the latest message. Vectors are appended to a file next to the
+# session journal, so a resumed session doesn't embed its history again.
+class ConversationMemory:
+    HEADER = b"LMCHATMEM1\n"
+
+    def __init__(self, path=None):
+        self.path = path
+        self.model = None
+        self.index = VectorIndex()
+        self.speakers = []
+        self.texts = []
+        # Keys waiting for an embedding, and keys whose embedding request is running
+        self.pending = deque()
+        self.in_flight = set()
+        # The most recent query embedding; a message that was embedded as a query isn't embedded again
+        self.last_query = None
+        self.loaded = {}
+        self.file = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def load(self):
+        # Reads vectors saved by an earlier run; they are attached as the turns are added again
+        if self.path is None or not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            if f.readline() != self.HEADER:
+                return
+            header = json.loads(f.readline())
+            self.model = header["model"]
+            record = struct.Struct(f"<I{header['dim']}f")
+            data = f.read()
+        # A torn final record from a crash is ignored
+        for offset in range(0, len(data) - record.size + 1, record.size):
+            key, *vector = record.unpack_from(data, offset)
+            self.loaded[key] = vector
+
+    def use_model(self, model):
+        # Vectors from different embedding models can't be compared; switching starts over
+        if model == self.model:
+            return
+        self.model = model
+        self.index = VectorIndex()
+        self.loaded = {}
+        self.last_query = None
+        self.in_flight = set()
+        self.pending = deque(range(len(self.texts)))
+        self.close()
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def add(self, speaker, content):
+        key = len(self.texts)
+        self.speakers.append(sys.intern(speaker))
+        self.texts.append(content)
+        if key in self.loaded:
+            self.index.add(key, self.loaded.pop(key))
+        elif self.last_query is not None and self.last_query[0] == content:
+            self._store(key, self.last_query[1])
+        else:
+            self.pending.append(key)
+        return key
+
+    def take_pending(self, limit):
+        keys = [self.pending.popleft() for _ in range(min(limit, len(self.pending)))]
+        self.in_flight.update(keys)
+        return keys
+
+    def restore(self, keys):
+        # Embedding failed; the keys are tried again with the next batch
+        self.in_flight.difference_update(keys)
+        self.pending.extendleft(reversed([key for key in keys if key < len(self.texts)]))
+
+    def set_vectors(self, keys, vectors):
+        for key, vector in zip(keys, vectors):
+            if key in self.in_flight:
+                self.in_flight.discard(key)
+                self._store(key, vector)
+
+    def remember_query(self, content, vector):
+        self.last_query = (content, vector)
+
+    def _store(self, key, vector):
+        self.index.add(key, vector)
+        if self.path is None:
+            return
+        if self.file is None:
+            new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            self.file = open(self.path, 'ab')
+            if new:
+                self.file.write(self.HEADER)
+                self.file.write(encode_json({"model": self.model, "dim": self.index.dim}).encode("utf-8") + b"\n")
+        self.file.write(struct.pack(f"<I{self.index.dim}f", key, *self.index.vector(key)))
+        self.file.flush()
+
+    def recall(self, query, k, before, max_chars=1000):
+        # Turns before the context window most similar to the query, as text in conversation order
+        found = sorted(key for key, _ in self.index.search(query, k, before))
+        if not found:
+            return None
+        lines = []
+        for key in found:
+            text = self.texts[key]
+            if len(text) > max_chars:
+                text = text[:max_chars].rsplit(" ", 1)[0] + " ..."
+            lines.append(f"{self.speakers[key]}: {text}")
+        return "Earlier in this conversation:\n" + "\n".join(lines)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,293 @@
+import os
+import sys
+import abc
+import gzip
+import argparse
+import itertools
+import html as html_lib
+from chat_core import FigureDictionary, encode_json, open_session, read_journal, dual_system_prompt
+
+# Streaming transcript export. Conversations are read from session journals or batch_chat output
+# one turn at a time and written out as they are read, so memory use doesn't grow with the number
+# or the length of the conversations exported.
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+# One conversation: its header and a way to read its turns. turns() can be called more than once;
+# journal-backed transcripts read the file again each time instead of keeping the turns around.
+class Transcript:
+    def __init__(self, kind, header, turns, source):
+        self.kind = kind
+        self.header = header
+        self._turns = turns
+        self.source = source
+
+    @property
+    def title(self):
+        if self.kind == "single":
+            return f"Conversation with {self.header['figure']}"
+        return f"Conversation between {self.header['figure1']} and {self.header['figure2']}"
+
+    def turns(self):
+        # Turn dicts with "speaker" and "content"; single-chat turns also have "role"
+        turns = self._turns() if callable(self._turns) else self._turns
+        if self.kind != "single":
+            return iter(turns)
+        figure = self.header["figure"]
+        return (dict(turn, speaker="User" if turn["role"] == "user" else figure) for turn in turns)
+
+
+def iter_sources(paths):
+    # Files as given; directories contribute their .jsonl files in name order, which is creation order
+    # for journals
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".jsonl"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def iter_transcripts(path):
+    # A session journal holds one conversation; batch_chat output holds one per line
+    records = read_journal(path)
+    first = next(records, None)
+    if first is None:
+        return
+    if first.get("type") == "session":
+        yield Transcript(first.get("kind", "single"), first, lambda: open_session(path)[1], path)
+        return
+    for record in itertools.chain([first], records):
+        if "turns" in record:
+            yield Transcript("dual", record, record["turns"], path)
+
+
+# A file format: begin() and end() frame the output, write() adds one conversation
+class TranscriptWriter(abc.ABC):
+    def __init__(self, out):
+        self.out = out
+
+    def begin(self):
+        pass
+
+    @abc.abstractmethod
+    def write(self, transcript):
+        pass
+
+    def end(self):
+        pass
+
+
+# Plain text, as "Save Conversation" has always written it
+class TextWriter(TranscriptWriter):
+    def write(self, transcript):
+        self.out.write(f"{transcript.title}\n")
+        if transcript.kind != "single":
+            self.out.write(f"Context: {transcript.header.get('context', '')}\n")
+        self.out.write("\n")
+        for turn in transcript.turns():
+            self.out.write(f"{turn['speaker']}: {turn['content']}\n\n")
+
+
+# One JSON object per conversation, streamed a turn at a time
+class JsonlWriter(TranscriptWriter):
+    FIELDS = ("figure", "system", "figure1", "figure2", "context", "category", "created")
+
+    def write(self, transcript):
+        header = {"kind": transcript.kind, "source": os.path.basename(transcript.source)}
+        header.update((name, transcript.header[name]) for name in self.FIELDS if name in transcript.header)
+        # Drop the closing brace so the turns array can follow the fixed fields
+        self.out.write(encode_json(header)[:-1] + ',"turns":[')
+        separator = ""
+        for turn in transcript.turns():
+            record = {"speaker": turn["speaker"], "content": turn["content"]}
+            if "timestamp" in turn:
+                record["timestamp"] = turn["timestamp"]
+            self.out.write(separator + encode_json(record))
+            separator = ","
+        self.out.write("]}\n")
+
+
+class MarkdownWriter(TranscriptWriter):
+    def write(self, transcript):
+        self.out.write(f"## {transcript.title}\n\n")
+        if transcript.header.get("context"):
+            self.out.write(f"*Context:* {transcript.header['context']}\n\n")
+        for turn in transcript.turns():
+            self.out.write(f"**{turn['speaker']}:** {turn['content']}\n\n")
+        self.out.write("---\n\n")
+
+
+class HtmlWriter(TranscriptWriter):
+    def begin(self):
+        self.out.write("<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>Conversations</title>\n"
+                       "<style>body { font-family: Arial, sans-serif; max-width: 50em; margin: auto; } "
+                       "article { border-bottom: 1px solid #ccc; padding-bottom: 1em; }</style>\n"
+                       "</head>\n<body>\n")
+
+    def write(self, transcript):
+        escape = html_lib.escape
+        self.out.write(f"<article>\n<h2>{escape(transcript.title)}</h2>\n")
+        if transcript.header.get("context"):
+            self.out.write(f"<p><i>Context:</i> {escape(transcript.header['context'])}</p>\n")
+        for turn in transcript.turns():
+            content = escape(turn["content"]).replace("\n", "<br>")
+            self.out.write(f"<p><b>{escape(turn['speaker'])}:</b><br>{content}</p>\n")
+        self.out.write("</article>\n")
+
+    def end(self):
+        self.out.write("</body>\n</html>\n")
+
+
+# OpenAI chat fine-tuning format: one {"messages": [...]} example per line. A dual conversation
+# gives one example per figure, written from that figure's side, as the Dual Chat tab prompts it.
+class OpenAIWriter(TranscriptWriter):
+    def write(self, transcript):
+        header = transcript.header
+        if transcript.kind == "single":
+            self._example(header.get("system", ""), header["figure"], transcript.turns())
+            return
+        for figure, partner in ((header["figure1"], header["figure2"]), (header["figure2"], header["figure1"])):
+            self._example(dual_system_prompt(figure, partner, header.get("context", "")), figure,
+                          transcript.turns())
+
+    def _example(self, system, assistant, turns):
+        # Examples must end with an assistant message, so other messages wait for the next reply.
+        # Nothing is written for a figure that never replied.
+        started = False
+        waiting = []
+        for turn in turns:
+            role = "assistant" if turn["speaker"] == assistant else "user"
+            waiting.append(encode_json({"role": role, "content": turn["content"]}))
+            if role != "assistant":
+                continue
+            if not started:
+                started = True
+                self.out.write('{"messages":[' + encode_json({"role": "system", "content": system}))
+            self.out.write("," + ",".join(waiting))
+            waiting = []
+        if started:
+            self.out.write("]}\n")
+
+
+FORMATS = {"jsonl": JsonlWriter, "markdown": MarkdownWriter, "html": HtmlWriter, "openai": OpenAIWriter,
+           "text": TextWriter}
+
+# Save dialog filters and the format each one selects
+FILE_FILTERS = {
+    "Text Files (*.txt *.txt.gz)": "text",
+    "JSON Lines (*.jsonl *.jsonl.gz)": "jsonl",
+    "Markdown (*.md *.md.gz)": "markdown",
+    "HTML (*.html *.html.gz)": "html",
+    "OpenAI Fine-Tuning Data (*.jsonl *.jsonl.gz)": "openai",
+}
+
+EXTENSIONS = {"text": ".txt", "jsonl": ".jsonl", "markdown": ".md", "html": ".html", "openai": ".jsonl"}
+
+
+def format_for(path):
+    # Guesses the format from the file name; .jsonl means the transcript JSONL, not fine-tuning data
+    name = path[:-3] if path.endswith(".gz") else path
+    for fmt, extension in EXTENSIONS.items():
+        if name.endswith(extension):
+            return fmt
+    return "text"
+
+
+def _open_output(path, compress):
+    # Written under a temporary name and renamed at the end, so a failed or cancelled export
+    # never leaves a truncated file behind
+    partial = path + ".part"
+    if compress:
+        # zlib's usual level: level 9 is several times slower for a few percent smaller files
+        return partial, gzip.open(partial, 'wt', compresslevel=6, encoding='utf-8', newline="\n")
+    return partial, open(partial, 'w', encoding='utf-8', newline="\n")
+
+
+def _write_output(path, compress, write):
+    compress = path.endswith(".gz") if compress is None else compress
+    partial, out = _open_output(path, compress)
+    try:
+        with out:
+            result = write(out)
+        os.replace(partial, path)
+        return result
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+def export_transcripts(paths, output, fmt=None, compress=None, on_progress=None, should_stop=None):
+    # Writes every conversation in the given journals, batch files and directories to one file.
+    # on_progress(files done, files, conversations written) is called after each file; returns
+    # the number of conversations written. Output ending in .gz is compressed unless compress says otherwise.
+    sources = list(iter_sources(paths))
+    writer_class = FORMATS[fmt or format_for(output)]
+
+    def write(out):
+        writer = writer_class(out)
+        writer.begin()
+        written = 0
+        for index, source in enumerate(sources):
+            for transcript in iter_transcripts(source):
+                if should_stop and should_stop():
+                    raise ExportCancelled()
+                writer.write(transcript)
+                written += 1
+            if on_progress:
+                on_progress(index + 1, len(sources), written)
+        writer.end()
+        return written
+
+    return _write_output(output, compress, write)
+
+
+def export_prompts(dictionary_path, output, compress=None, on_progress=None, should_stop=None, chunk=1000):
+    # Every figure's system prompt as "### Figure ###" sections; the dictionary is opened here
+    # so this can run on any thread
+    dictionary = FigureDictionary.open(dictionary_path)
+
+    def write(out):
+        total = dictionary.figure_count()
+        written = 0
+        for figure, prompt in dictionary.iter_prompts():
+            out.write(f"### {figure} ###\n{prompt}\n\n")
+            written += 1
+            if written % chunk == 0:
+                if should_stop and should_stop():
+                    raise ExportCancelled()
+                if on_progress:
+                    on_progress(written, total, written)
+        if on_progress:
+            on_progress(total, total, written)
+        return written
+
+    try:
+        return _write_output(output, compress, write)
+    finally:
+        dictionary.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export saved sessions and batch_chat output to one file.")
+    parser.add_argument("inputs", nargs="+", help="Session journals, batch_chat JSONL files or directories of them")
+    parser.add_argument("-o", "--output", required=True, help="Output file; a .gz suffix compresses it")
+    parser.add_argument("-f", "--format", choices=sorted(FORMATS),
+                        help="Output format (default: from the output file name)")
+    args = parser.parse_args(argv)
+
+    def report(done, total, written):
+        print(f"\r{done}/{total} files, {written} conversations", end="", file=sys.stderr, flush=True)
+
+    written = export_transcripts(args.inputs, args.output, args.format, on_progress=report)
+    print(f"\nExported {written} conversations to {args.output}.", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
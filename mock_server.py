@@ -0,0 +1,239 @@
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from chat_core import estimate_tokens
+
+# Includes accented, non-Latin and astral-plane words, sent as raw UTF-8 the way LM Studio and
+# llama.cpp send them, so clients that decode with the wrong charset are caught
+WORDS = ("the of and to in that it was for on as with his they at be this from have or by one had not "
+         "but what all were when we there can an your which their said if do will each about how up out "
+         "them then she many some so these would other into has more her two like him see time could "
+         "café naïve déjà Dalí Márquez Gödel Curie Ørsted Łódź Пушкин 東京 🙂").split()
+
+
+# Local stand-in for LM Studio's OpenAI-compatible server, used for benchmarks and offline testing.
+# Replies are deterministic filler text generated at a configurable rate.
+class MockServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, tokens_per_second=0.0, reply_tokens=40,
+                 error_rate=0.0, error_status=500, seed=None, models=("default",)):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.models = list(models)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        # Seconds spent producing each successful reply, in completion order
+        self.busy_times = []
+
+        server = self
+
+        class Handler(MockHandler):
+            mock = server
+
+        self.httpd = MockHTTPServer((host, port), Handler)
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def url(self):
+        return f"{self.base_url}/chat/completions"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = 0
+            self.errors = 0
+            self.busy_times = []
+
+    def should_fail(self):
+        with self.lock:
+            self.requests += 1
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+    def record(self, seconds):
+        with self.lock:
+            self.busy_times.append(seconds)
+
+    def reply_words(self, messages):
+        # Seeded by the conversation length so repeated runs produce the same text
+        rng = random.Random(len(messages))
+        return [rng.choice(WORDS) for _ in range(self.reply_tokens)]
+
+    @staticmethod
+    def embed(text, dim=64):
+        # Hashed bag of words: texts sharing words get similar vectors, which is enough to test retrieval
+        vector = [0.0] * dim
+        for word in text.lower().split():
+            digest = hashlib.md5(word.strip(".,!?;:\"'").encode("utf-8")).digest()
+            vector[digest[0] % dim] += 1.0 if digest[1] & 1 else -1.0
+        return vector
+
+    def token_delay(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing keep-alive connections are expected, not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without this, delayed ACKs add ~40 ms per reply
+    disable_nagle_algorithm = True
+    mock = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list",
+                                  "data": [{"id": model, "object": "model"} for model in self.mock.models]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON"}})
+            return
+        if self.path.rstrip("/").endswith("/embeddings"):
+            self._embeddings(payload)
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        started = time.monotonic()
+        if self.mock.latency:
+            time.sleep(self.mock.latency)
+        if self.mock.should_fail():
+            self._send_json(self.mock.error_status, {"error": {"message": "Injected failure"}})
+            return
+
+        messages = payload.get("messages", [])
+        words = self.mock.reply_words(messages)
+        usage = {"prompt_tokens": sum(estimate_tokens(m.get("content", "")) for m in messages),
+                 "completion_tokens": len(words)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if payload.get("stream"):
+            self._stream(payload, words, usage)
+        else:
+            time.sleep(self.mock.token_delay() * len(words))
+            self._send_json(200, {"object": "chat.completion", "model": payload.get("model", "default"),
+                                  "choices": [{"index": 0, "finish_reason": "stop",
+                                               "message": {"role": "assistant", "content": " ".join(words)}}],
+                                  "usage": usage})
+        self.mock.record(time.monotonic() - started)
+
+    def _embeddings(self, payload):
+        inputs = payload.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if self.mock.latency:
+            time.sleep(self.mock.latency)
+        if self.mock.should_fail():
+            self._send_json(self.mock.error_status, {"error": {"message": "Injected failure"}})
+            return
+        tokens = sum(estimate_tokens(text) for text in inputs)
+        self._send_json(200, {"object": "list", "model": payload.get("model", "default"),
+                              "data": [{"object": "embedding", "index": index, "embedding": self.mock.embed(text)}
+                                       for index, text in enumerate(inputs)],
+                              "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    def _stream(self, payload, words, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(body):
+            data = f"data: {body}\n\n".encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        delay = self.mock.token_delay()
+        for index, word in enumerate(words):
+            if delay:
+                time.sleep(delay)
+            token = word if index == 0 else " " + word
+            send_event(json.dumps({"object": "chat.completion.chunk",
+                                   "choices": [{"index": 0, "delta": {"content": token}}]}, ensure_ascii=False))
+        if payload.get("stream_options", {}).get("include_usage"):
+            send_event(json.dumps({"object": "chat.completion.chunk", "choices": [], "usage": usage}))
+        send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a mock OpenAI-compatible chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=1234, help="Port to listen on")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="Generation rate (0 sends the whole reply at once)")
+    parser.add_argument("--reply-tokens", type=int, default=40, help="Tokens per reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures")
+    parser.add_argument("--seed", type=int, help="Seed for error injection")
+    parser.add_argument("--model", action="append", help="Model id listed by /v1/models (repeatable)")
+    args = parser.parse_args(argv)
+
+    server = MockServer(args.host, args.port, args.latency, args.tokens_per_second, args.reply_tokens,
+                        args.error_rate, args.error_status, args.seed, args.model or ("default",))
+    print(f"Mock server listening on {server.url}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
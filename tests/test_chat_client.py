@@ -0,0 +1,33 @@
+import pytest
+
+from chat_client import ChatClient, RequestError
+from chat_core import ContextWindow, RequestPolicy
+from mock_server import MockServer
+
+
+@pytest.fixture
+def servers():
+    failing = MockServer(error_rate=1.0, error_status=503).start()
+    working = MockServer().start()
+    yield failing, working
+    failing.stop()
+    working.stop()
+
+
+def test_failed_requests_move_to_another_server(servers):
+    failing, working = servers
+    with ChatClient([failing.base_url, working.base_url], policy=RequestPolicy(backoff_base=0.01)) as client:
+        for _ in range(4):
+            assert client.reply(ContextWindow("You are Ada Lovelace."), "Hello")
+    # Once the failing server is out of rotation every request goes straight to the other one
+    assert working.requests == 4
+    assert failing.requests == 3
+
+
+def test_retries_give_up_after_the_policy_limit(servers):
+    failing, _ = servers
+    with ChatClient(failing.base_url, policy=RequestPolicy(max_retries=1, backoff_base=0.01)) as client:
+        with pytest.raises(RequestError) as error:
+            client.reply(ContextWindow("You are Ada Lovelace."), "Hello")
+    assert error.value.retriable
+    assert failing.requests == 2
@@ -0,0 +1,150 @@
+import gc
+import random
+import time
+
+import pytest
+
+from chat_core import (BackendPool, ContextWindow, FigureSearchIndex, RequestMetrics, summary_chunk_tokens,
+                       summary_due)
+
+SYNTHETIC_NAMES = 200000
+
+ONSETS = ("", "b", "br", "c", "ch", "d", "f", "g", "gr", "h", "j", "k", "l", "m", "n", "p", "r", "s", "st",
+          "sh", "t", "th", "v", "w", "z")
+VOWELS = ("a", "e", "i", "o", "u", "ai", "ea", "ie", "ou", "y")
+CODAS = ("", "", "n", "r", "l", "s", "t", "m", "nd", "rt", "ck", "ng")
+
+# A slice of the default dictionary, including the names the queries below look for
+FIGURES = {
+    "Scientists": ["Albert Einstein", "Isaac Newton", "Marie Curie", "Nikola Tesla", "Richard Feynman",
+                   "Alan Turing"],
+    "Artists": ["Leonardo da Vinci", "Vincent van Gogh", "Frida Kahlo", "Salvador Dalí"],
+    "Writers": ["William Shakespeare", "Gabriel García Márquez", "Franz Kafka", "Jane Austen"],
+    "Inventors": ["Thomas Edison", "Leonardo da Vinci", "Ada Lovelace", "Grace Hopper"],
+}
+
+# Misspelled queries and the figure each should still find
+TYPOS = {
+    "einstien": "Albert Einstein",
+    "albert einstien": "Albert Einstein",
+    "newtn": "Isaac Newton",
+    "isac newton": "Isaac Newton",
+    "garcia marqez": "Gabriel García Márquez",
+    "richrd feynman": "Richard Feynman",
+    "leonardo da vinchi": "Leonardo da Vinci",
+}
+
+
+def synthetic_names(count, seed=1):
+    rng = random.Random(seed)
+
+    def word():
+        syllables = rng.randint(1, 3)
+        return "".join(rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS)
+                       for _ in range(syllables)).capitalize()
+
+    for _ in range(count):
+        yield " ".join(word() for _ in range(rng.choice((2, 2, 2, 3))))
+
+
+@pytest.fixture(scope="module")
+def index():
+    # The real figures go in halfway, so they are neither the first nor the last postings
+    index = FigureSearchIndex()
+    for number, name in enumerate(synthetic_names(SYNTHETIC_NAMES)):
+        index.add(name, "Synthetic")
+        if number == SYNTHETIC_NAMES // 2:
+            for category, figures in FIGURES.items():
+                for figure in figures:
+                    index.add(figure, category)
+    index.finish()
+    return index
+
+
+@pytest.mark.parametrize("query, figure", TYPOS.items())
+def test_search_finds_misspelled_figures(index, query, figure):
+    assert figure in [name for name, _ in index.search(query)]
+
+
+@pytest.mark.parametrize("query, figure", TYPOS.items())
+def test_search_finds_misspelled_figures_past_the_scan_budget(index, monkeypatch, query, figure):
+    # Stands in for a dictionary so large that only the rarest one or two posting lists fit the budget
+    monkeypatch.setattr(index, "MAX_FUZZY_SCAN", 50)
+    assert figure in [name for name, _ in index.search(query)]
+
+
+def test_search_ranks_exact_prefix_first(index):
+    assert index.search("albert ein")[0] == ("Albert Einstein", "Scientists")
+
+
+def test_search_keystrokes_take_under_a_millisecond(index):
+    keystrokes = [query[:end] for query in TYPOS for end in range(1, len(query) + 1)]
+    best = float("inf")
+    gc.collect()
+    for _ in range(3):
+        started = time.perf_counter()
+        for keystroke in keystrokes:
+            index.search(keystroke)
+        best = min(best, (time.perf_counter() - started) / len(keystrokes))
+    assert best < 0.001
+
+
+def test_evicted_turns_are_summarized_in_chunks_that_fit_the_budget():
+    window = ContextWindow("You are Isaac Newton.", 1000)
+    for number in range(500):
+        window.append("user" if number % 2 == 0 else "assistant", f"Message {number}: " + "apples fall " * 20)
+    backlog = len(window.evicted)
+    taken = []
+    while window.evicted:
+        chunk = window.take_evicted(summary_chunk_tokens(window))
+        assert sum(len(message["content"]) // 4 + 4 for message in chunk) <= summary_chunk_tokens(window)
+        taken.extend(chunk)
+    assert len(taken) == backlog
+    assert taken[0]["content"].startswith("Message 0:")
+
+
+def test_evicted_turns_a_restored_summary_covers_are_skipped():
+    window = ContextWindow("You are Isaac Newton.", 1000)
+    for number in range(100):
+        window.append("user", f"Message {number}: " + "apples fall " * 20)
+    window.set_summary("They talked about apples.", 40)
+    assert window.take_evicted()[0]["content"].startswith("Message 40:")
+
+
+def test_summary_chunks_stay_positive_under_a_tiny_budget():
+    window = ContextWindow("You are Isaac Newton.", 100)
+    window.set_summary("They talked about apples. " * 20)
+    assert summary_chunk_tokens(window) > 0
+
+
+def test_evicted_turns_wait_for_a_batch_before_a_summary_is_due():
+    window = ContextWindow("You are Isaac Newton.", 1000)
+    while window.evictions < 2:
+        window.append("user", "Tell me about gravity. " * 10)
+    assert not summary_due(window)
+    while not summary_due(window):
+        window.append("user", "Tell me about gravity. " * 10)
+    # Under this budget a batch is as much as one summary request can take
+    assert window.evicted_tokens() >= summary_chunk_tokens(window)
+    window.set_summary("They talked about gravity.", window.evictions)
+    assert window.evicted_tokens() == 0
+
+
+def test_metrics_count_cancelled_requests_apart_from_failures():
+    metrics = RequestMetrics()
+    for status in ("ok", "error", "cancelled", "cancelled"):
+        metrics.record({"status": status, "total": 0.5})
+    assert (metrics.requests, metrics.errors, metrics.cancelled) == (4, 1, 2)
+    text = metrics.prometheus_text()
+    assert "lmstudio_chat_request_errors_total 1\n" in text
+    assert "lmstudio_chat_requests_cancelled_total 2\n" in text
+
+
+def test_unpinned_acquire_leaves_the_conversation_pin_alone():
+    pool = BackendPool(["http://a:1234", "http://b:1234"])
+    pinned = pool.acquire("chat")
+    hedge = pool.acquire(None, exclude={pinned})
+    assert hedge is not pinned
+    assert pool.acquire("chat") is pinned
+    pool.pin("chat", hedge)
+    assert pool.acquire("chat") is hedge